@@ -3,27 +3,43 @@ Flask XAI API for Blood Report Analysis
 Provides /api/v1/interpret endpoint that returns medical interpretations
 with SHAP-based explainability for CBC parameters.
 """
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, g
 from flask_cors import CORS
-import joblib
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
 import shap
 import functools
+import atexit
 import hashlib
+import json
 import logging
+import time
 import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# MongoDB cache for XAI results
-from mongo_cache import get_cached_interpretation, set_cached_interpretation
+from model_registry import ModelRegistry
+from explanation_jobs import ExplanationJobs
+from response_cache import ResponseCache
+from tiered_cache import TwoTierCache
+from cache_backends import create_backend
+from cache_warmer import app_sender, load_request_log, synthetic_requests, warm_cache
+from cache_keys import hash_key, round_numbers
+from explainability import (
+    EXPLAIN_LEVELS, EXPLAIN_MODES, PERTURBATION_BASELINES, NativeContributionsUnavailable,
+    class_index_for, level_includes, native_contributions, perturbation_baseline,
+    perturbation_contributions, top_feature_importances
+)
 
 # Import the medical text generator and clinical fallback
 import sys
 sys.path.append(str(Path(__file__).parent))
-from medical_text_generator import generate_interpretation, STATUS_NAMES
-from clinical_rules_fallback import classify_by_threshold, calculate_risk_assessments
+from medical_text_generator import generate_interpretation, generate_shap_explanation, STATUS_NAMES, TEMPLATE_VERSION
+import clinical_rules_fallback
+from clinical_rules_fallback import classify_by_threshold, classify_many, calculate_risk_assessments, reload_risk_rules
+from cohort_risk import assess_cohort, columns_from_records
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
@@ -31,85 +47,183 @@ CORS(app)  # Enable CORS for frontend access
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
-# Simple in-memory cache for responses
-RESPONSE_CACHE = {}
-CACHE_TTL_SECONDS = 300  # 5 minutes
+# In-memory cache for responses: bounded LRU of serialized bodies with TTL expiry
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', 300))  # 5 minutes
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESPONSE_CACHE = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    ttl_seconds=CACHE_TTL_SECONDS
+)
+# Cache keys round numeric inputs to this many decimals (reporting precision)
+CACHE_KEY_DECIMALS = int(os.environ.get('XAI_CACHE_KEY_DECIMALS', 2))
+
+# Persistent cache for XAI results: mongo (default), sqlite, memory or none
+CACHE_BACKEND = create_backend()
+
+# Per-parameter interpretations: in-process L1 in front of the persistent backend (L2), written behind
+INTERPRETATION_CACHE = TwoTierCache(
+    l2_get=lambda key: CACHE_BACKEND.get(key),
+    l2_get_many=lambda keys: CACHE_BACKEND.get_many(keys),
+    l2_bulk_set=lambda items: CACHE_BACKEND.set_many(items),
+    l1=ResponseCache(
+        max_entries=int(os.environ.get('XAI_L1_CACHE_ENTRIES', 4096)),
+        max_bytes=int(os.environ.get('XAI_L1_CACHE_BYTES', 64 * 1024 * 1024)),
+        ttl_seconds=CACHE_TTL_SECONDS
+    ),
+    # Remember L2 misses this long so repeated misses skip the L2 round-trip
+    negative_ttl=float(os.environ.get('XAI_NEGATIVE_CACHE_TTL', 30)),
+    # Pending L2 writes beyond this are dropped (and counted) instead of blocking requests
+    queue_size=int(os.environ.get('XAI_CACHE_WRITE_QUEUE', 1000)),
+    batch_size=int(os.environ.get('XAI_CACHE_WRITE_BATCH', 100))
+)
+atexit.register(lambda: INTERPRETATION_CACHE.flush())
+# Also store each batch response as one report-scoped document (one read to reopen a report)
+REPORT_CACHE_ENABLED = os.environ.get('XAI_REPORT_CACHE', 'false').lower() in ('1', 'true', 'yes')
 
 # Basic auth token (set this securely in production)
 # Use environment variable if provided, fallback to dev-secret-token
 DEV_AUTH_TOKEN = os.environ.get('DEV_AUTH_TOKEN', "dev-secret-token")
+# Separate token for admin endpoints (model reload, cache management); falls back to DEV_AUTH_TOKEN
+ADMIN_AUTH_TOKEN = os.environ.get('ADMIN_AUTH_TOKEN', DEV_AUTH_TOKEN)
+
+# Poll models/ for retrained bundles every N seconds (0 disables the watcher)
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.environ.get('MODEL_RELOAD_INTERVAL_SECONDS', 0))
+
+# Explanation engine used when a request doesn't pass "explain" (native | shap | none)
+DEFAULT_EXPLAIN_MODE = os.environ.get('XAI_DEFAULT_EXPLAIN', 'shap').lower()
+
+# Explanation level when a request sends neither "explainLevel" nor "shap" (none | topk | full | path)
+DEFAULT_EXPLAIN_LEVEL = os.environ.get('XAI_DEFAULT_EXPLAIN_LEVEL', 'path').lower()
+
+# Baseline the XGBoost perturbation explainer sets each feature to (zero | median of the training data)
+PERTURBATION_BASELINE = os.environ.get('XAI_PERTURBATION_BASELINE', 'zero').lower()
+if PERTURBATION_BASELINE not in PERTURBATION_BASELINES:
+    logging.warning(f"Unknown XAI_PERTURBATION_BASELINE '{PERTURBATION_BASELINE}', using 'zero'")
+    PERTURBATION_BASELINE = 'zero'
+
+# Asynchronous explanations: interpret returns status + text immediately and an explanation_id
+# to fetch from /api/v1/explanations/<id>. Requests opt in with "explainAsync"; this is the default.
+ASYNC_EXPLANATIONS = os.environ.get('XAI_ASYNC_EXPLANATIONS', 'false').lower() in ('1', 'true', 'yes')
+EXPLAIN_WORKERS = int(os.environ.get('XAI_EXPLAIN_WORKERS', 2))
+# Queued jobs beyond this are explained inline instead
+EXPLAIN_MAX_PENDING = int(os.environ.get('XAI_EXPLAIN_MAX_PENDING', 64))
+# Upper bound for ?wait= long-polling on the explanation endpoint
+EXPLANATION_MAX_WAIT_SECONDS = 30
+
+# Eagerly load and warm every model before reporting ready (see /ready)
+PRELOAD_MODELS = os.environ.get('XAI_PRELOAD_MODELS', 'true').lower() in ('1', 'true', 'yes')
+PRELOAD_WORKERS = int(os.environ.get('XAI_PRELOAD_WORKERS', 4))
 
 MODELS_DIR = Path(__file__).parent / "models"
 
-# Cache for loaded models
-LOADED_MODELS = {}
+# Each model bundle is loaded once and kept with its metadata
+MODEL_REGISTRY = ModelRegistry(MODELS_DIR)
 
-def get_model(parameter_name):
-    """Load and cache models. Returns (model, reverse_mapping, feature_names) tuple."""
-    # Map normalized parameter names to model filenames
-    # Updated to use LightGBM model filenames (with full parameter names)
-    PARAMETER_MODEL_MAP = {
-        'hemoglobin_g_dL': 'hemoglobin_g_dl',
-        'hemoglobin': 'hemoglobin_g_dl',
-        'wbc_10e9_L': 'wbc_10e9_l',
-        'wbc': 'wbc_10e9_l',
-        'platelet_count': 'platelet_count',
-        'platelet': 'platelet_count',
-        'neutrophils_percent': 'neutrophils_percent',
-        'neutrophil': 'neutrophils_percent',
-        'neutrophils': 'neutrophils_percent',
-        'lymphocytes_percent': 'lymphocytes_percent',
-        'lymphocyte': 'lymphocytes_percent',
-        'lymphocytes': 'lymphocytes_percent',
-        'rdw_percent': 'rdw_percent',
-        'rdw': 'rdw_percent',
-        'monocytes_percent': 'monocytes_percent',
-        'monocyte': 'monocytes_percent',
-        'monocytes': 'monocytes_percent',
-        'eosinophils_percent': 'eosinophils_percent',
-        'eosinophil': 'eosinophils_percent',
-        'eosinophils': 'eosinophils_percent',
-        'basophils_percent': 'basophils_percent',
-        'basophil': 'basophils_percent',
-        'basophils': 'basophils_percent',
-        'rbc_count': 'rbc_count',
-        'rbc': 'rbc_count',
-        'mcv_fL': 'mcv_fl',
-        'mcv': 'mcv_fl',
-        'mch_pg': 'mch_pg',
-        'mch': 'mch_pg',
-        'mchc_g_dL': 'mchc_g_dl',
-        'mchc': 'mchc_g_dl',
-        'hba1c_percent': 'hba1c_percent',
-        'hba1c': 'hba1c_percent',
-        'random_blood_sugar_mg_dL': 'random_blood_sugar_mg_dl',
-        'rbs': 'random_blood_sugar_mg_dl',
-        'esr_mm_hr': 'esr_mm_hr',
-        'esr': 'esr_mm_hr',
-        'crp_mg_L': 'crp_mg_l',
-        'crp': 'crp_mg_l',
-        'serum_creatinine_mg_dL': 'serum_creatinine_mg_dl',
-        'creatinine': 'serum_creatinine_mg_dl',
-    }
+# Cache for SHAP explainers, built once per model version:
+# (model_key, file_hash) -> (strategy_name, explainer)
+LOADED_EXPLAINERS = {}
+# Guards the version check in cache_explainer against the sweep in reload_models
+_explainers_lock = threading.Lock()
+
+
+def explainer_key(record):
+    """Explainers belong to one model version, so a reloaded bundle never reuses a stale one."""
+    return (record.key, record.file_hash)
+
+
+def cache_explainer(record, strategy, explainer, warming=False):
+    """
+    Remember the explainer built for record. Versions a reload already replaced are not
+    cached: a request that still holds the old record would otherwise re-add an entry
+    nothing ever drops. warming=True is for records about to be swapped in.
+    """
+    with _explainers_lock:
+        if warming or MODEL_REGISTRY.current_hash(record.key) == record.file_hash:
+            LOADED_EXPLAINERS[explainer_key(record)] = (strategy, explainer)
+
+
+def drop_stale_explainers():
+    """Drop the explainers of every model version that is no longer served; returns how many."""
+    with _explainers_lock:
+        stale = [key for key in LOADED_EXPLAINERS if MODEL_REGISTRY.current_hash(key[0]) != key[1]]
+        for key in stale:
+            del LOADED_EXPLAINERS[key]
+    return len(stale)
+
+def get_cached_explanation(explanation_id):
+    """A finished asynchronous explanation from the persistent cache, or None."""
+    return CACHE_BACKEND.get(f"explanation:{explanation_id}")
+
+
+def set_cached_explanation(explanation_id, result):
+    # Same key scheme as mongo_cache, so explanations stored before backends existed still resolve
+    CACHE_BACKEND.set(f"explanation:{explanation_id}", result)
+
+# Background explanation workers; finished explanations are also written to the persistent cache
+EXPLANATION_JOBS = ExplanationJobs(
+    max_workers=EXPLAIN_WORKERS,
+    max_pending=EXPLAIN_MAX_PENDING,
+    on_done=lambda explanation_id, result: set_cached_explanation(explanation_id, result)
+)
+
+# Map normalized parameter names to model filenames
+# Updated to use LightGBM model filenames (with full parameter names)
+PARAMETER_MODEL_MAP = {
+    'hemoglobin_g_dL': 'hemoglobin_g_dl',
+    'hemoglobin': 'hemoglobin_g_dl',
+    'wbc_10e9_L': 'wbc_10e9_l',
+    'wbc': 'wbc_10e9_l',
+    'platelet_count': 'platelet_count',
+    'platelet': 'platelet_count',
+    'neutrophils_percent': 'neutrophils_percent',
+    'neutrophil': 'neutrophils_percent',
+    'neutrophils': 'neutrophils_percent',
+    'lymphocytes_percent': 'lymphocytes_percent',
+    'lymphocyte': 'lymphocytes_percent',
+    'lymphocytes': 'lymphocytes_percent',
+    'rdw_percent': 'rdw_percent',
+    'rdw': 'rdw_percent',
+    'monocytes_percent': 'monocytes_percent',
+    'monocyte': 'monocytes_percent',
+    'monocytes': 'monocytes_percent',
+    'eosinophils_percent': 'eosinophils_percent',
+    'eosinophil': 'eosinophils_percent',
+    'eosinophils': 'eosinophils_percent',
+    'basophils_percent': 'basophils_percent',
+    'basophil': 'basophils_percent',
+    'basophils': 'basophils_percent',
+    'rbc_count': 'rbc_count',
+    'rbc': 'rbc_count',
+    'mcv_fL': 'mcv_fl',
+    'mcv': 'mcv_fl',
+    'mch_pg': 'mch_pg',
+    'mch': 'mch_pg',
+    'mchc_g_dL': 'mchc_g_dl',
+    'mchc': 'mchc_g_dl',
+    'hba1c_percent': 'hba1c_percent',
+    'hba1c': 'hba1c_percent',
+    'random_blood_sugar_mg_dL': 'random_blood_sugar_mg_dl',
+    'rbs': 'random_blood_sugar_mg_dl',
+    'esr_mm_hr': 'esr_mm_hr',
+    'esr': 'esr_mm_hr',
+    'crp_mg_L': 'crp_mg_l',
+    'crp': 'crp_mg_l',
+    'serum_creatinine_mg_dL': 'serum_creatinine_mg_dl',
+    'creatinine': 'serum_creatinine_mg_dl',
+}
+
+
+def resolve_model_key(parameter_name):
+    """Return the model file key (models/<key>_model.joblib) for a parameter name."""
     key = parameter_name.lower() if parameter_name else ''
-    model_key = PARAMETER_MODEL_MAP.get(key, key)
-    if model_key not in LOADED_MODELS:
-        model_path = MODELS_DIR / f"{model_key}_model.joblib"
-        if not model_path.exists():
-            return None, None, None
-        
-        # Load model - could be just model or dict with model + mapping + feature_names
-        model_data = joblib.load(model_path)
-        if isinstance(model_data, dict) and 'model' in model_data:
-            LOADED_MODELS[model_key] = (
-                model_data['model'], 
-                model_data.get('reverse_mapping'),
-                model_data.get('feature_names')  # NEW: Load saved feature names
-            )
-        else:
-            LOADED_MODELS[model_key] = (model_data, None, None)
-    
-    return LOADED_MODELS[model_key]
+    return PARAMETER_MODEL_MAP.get(key, key)
+
+
+def get_model(parameter_name):
+    """Return the ModelRecord for a parameter from the registry, or None if no model exists."""
+    return MODEL_REGISTRY.get(resolve_model_key(parameter_name))
 
 
 def normalize_parameter_name(param):
@@ -199,13 +313,21 @@ def normalize_parameter_name(param):
         return 'cortisol_pm_mcg_dL'
     
     # Fallback: try exact match to known model files
-    for name in LOADED_MODELS.keys():
+    for name in MODEL_REGISTRY.loaded_keys():
         if name in s:
             return name
     
     # Return cleaned parameter name
     return s.replace(' ', '_')
 
+REGIONS = ['North', 'South', 'East', 'West', 'Central', 'Urban', 'Rural', 'Unknown']
+
+# Blood parameters used as model features
+BLOOD_FEATURES = ['hemoglobin_g_dL', 'wbc_10e9_L', 'platelet_count', 'rdw_percent',
+                  'neutrophils_percent', 'lymphocytes_percent', 'monocytes_percent',
+                  'eosinophils_percent', 'basophils_percent', 'rbc_count', 'mcv_fL',
+                  'mch_pg', 'mchc_g_dL', 'neutrophils_abs', 'lymphocytes_abs', 'monocytes_abs']
+
 def preprocess_input(data):
     """Convert API input to model features."""
     # Extract key features from request
@@ -222,7 +344,7 @@ def preprocess_input(data):
     
     # Region encoding (default to Unknown)
     region = data.get('region', 'Unknown')
-    for r in ['North', 'South', 'East', 'West', 'Central', 'Urban', 'Rural', 'Unknown']:
+    for r in REGIONS:
         features[f'region_{r}'] = 1 if region == r else 0
     
     # Age group encoding
@@ -243,10 +365,7 @@ def preprocess_input(data):
     print("==============================================================")
     
     # Other parameters - try otherParameters first, then fall back to top-level data
-    for param in ['hemoglobin_g_dL', 'wbc_10e9_L', 'platelet_count', 'rdw_percent',
-                  'neutrophils_percent', 'lymphocytes_percent', 'monocytes_percent',
-                  'eosinophils_percent', 'basophils_percent', 'rbc_count', 'mcv_fL',
-                  'mch_pg', 'mchc_g_dL', 'neutrophils_abs', 'lymphocytes_abs', 'monocytes_abs']:
+    for param in BLOOD_FEATURES:
         # Try otherParameters first, then top-level data, then default to 0
         raw_param_value = other_params.get(param, data.get(param, 0))
         try:
@@ -283,592 +402,1607 @@ def preprocess_input(data):
     
     return features
 
+
+def _to_float_array(values, default):
+    """Convert a list of raw request values to float64, using default for unparseable entries."""
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v)
+        except (ValueError, TypeError):
+            out[i] = default
+    return out
+
+
+def preprocess_batch(records):
+    """
+    Vectorized preprocess_input for many patient records.
+    Returns a DataFrame with one feature row per record (same columns as preprocess_input).
+    """
+    n = len(records)
+    others = [r.get('otherParameters') if isinstance(r.get('otherParameters'), dict) else {} for r in records]
+    columns = {}
+
+    age = _to_float_array([r.get('patientAge', 50) for r in records], 50.0)
+    columns['patientAge'] = age
+    columns['diabetic'] = np.array([1 if r.get('diabetic', False) else 0 for r in records], dtype=np.int8)
+    columns['pregnant'] = np.array([1 if r.get('pregnant', False) else 0 for r in records], dtype=np.int8)
+
+    # Gender / region one-hot encoding (match preprocessing)
+    gender = np.array([r.get('patientGender', 'Male') for r in records], dtype=object)
+    for g in ['Female', 'Male', 'Other']:
+        columns[f'gender_{g}'] = (gender == g).astype(np.int8)
+    region = np.array([r.get('region', 'Unknown') for r in records], dtype=object)
+    for r in REGIONS:
+        columns[f'region_{r}'] = (region == r).astype(np.int8)
+
+    # Age group encoding
+    columns['age_young'] = (age < 30).astype(np.int8)
+    columns['age_middle'] = ((age >= 30) & (age < 50)).astype(np.int8)
+    columns['age_senior'] = ((age >= 50) & (age < 65)).astype(np.int8)
+    columns['age_elderly'] = (age >= 65).astype(np.int8)
+
+    # Other parameters - otherParameters first, then top-level record, then 0
+    for param in BLOOD_FEATURES:
+        columns[param] = _to_float_array([o.get(param, r.get(param, 0)) for o, r in zip(others, records)], 0.0)
+
+    zeros = np.zeros(n, dtype=np.int8)
+    for col in ['hemoglobin_g_dL_zscore', 'wbc_10e9_L_zscore', 'platelet_count_zscore']:
+        columns[col] = zeros
+
+    # NLR ratio
+    lymph = columns['lymphocytes_abs']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns['nlr'] = np.where(lymph > 0, columns['neutrophils_abs'] / np.where(lymph > 0, lymph, 1.0), 0.0)
+
+    for col in ['hemoglobin_g_dL_outlier', 'wbc_10e9_L_outlier', 'platelet_count_outlier']:
+        columns[col] = zeros
+
+    columns['patientWeight_kg'] = _to_float_array([r.get('patientWeight_kg', 70) for r in records], 70.0)
+    columns['neutrophil_lymphocyte_ratio'] = columns['nlr']
+
+    return pd.DataFrame(columns)
+
+def warm_model(record):
+    """
+    Prepare a freshly loaded model for traffic: pre-build its SHAP TreeExplainer and
+    run one dummy prediction so lazy initialisation happens off the request path.
+    """
+    # XGBoost bundles use alternative explainability (no SHAP), nothing to pre-build
+    if record.is_lightgbm and explainer_key(record) not in LOADED_EXPLAINERS:
+        cache_explainer(record, 'TreeExplainer_LightGBM', shap.TreeExplainer(record.model), warming=True)
+    expected_features = resolve_feature_names(record.model, record.feature_names, [])
+    if len(expected_features):
+        record.model.predict_proba(pd.DataFrame(np.zeros((1, len(expected_features))), columns=list(expected_features)))
+
+
+# Warm-up state reported by /ready
+WARMUP_STATE = {'status': 'pending', 'models': {}, 'errors': {}, 'seconds': None}
+WARMUP_DONE = threading.Event()
+_warmup_lock = threading.Lock()
+
+
+def _preload_one(key):
+    start = time.perf_counter()
+    record = MODEL_REGISTRY.get(key)
+    loaded = time.perf_counter()
+    warm_model(record)
+    done = time.perf_counter()
+    timing = {
+        'load_seconds': round(loaded - start, 3),
+        'warm_seconds': round(done - loaded, 3),
+        'explainer': explainer_key(record) in LOADED_EXPLAINERS,
+    }
+    logging.info(f"Preloaded model '{key}' in {done - start:.2f}s (load {timing['load_seconds']:.2f}s, warm {timing['warm_seconds']:.2f}s)")
+    return timing
+
+
+def preload_models(max_workers=PRELOAD_WORKERS):
+    """
+    Load every models/*_model.joblib bundle in a thread pool, build its explainer and run
+    one dummy prediction, then mark the service ready. Failed models are logged and left
+    to lazy loading / clinical fallback.
+    """
+    WARMUP_STATE['status'] = 'warming'
+    started = time.perf_counter()
+    keys = MODEL_REGISTRY.available_keys()
+    if keys:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys))), thread_name_prefix="preload") as pool:
+            futures = {pool.submit(_preload_one, key): key for key in keys}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    WARMUP_STATE['models'][key] = future.result()
+                except Exception as e:
+                    logging.warning(f"Could not preload model '{key}': {e}")
+                    WARMUP_STATE['errors'][key] = str(e)
+    WARMUP_STATE['seconds'] = round(time.perf_counter() - started, 3)
+    WARMUP_STATE['status'] = 'ready'
+    WARMUP_DONE.set()
+    logging.info(f"Warm-up finished: {len(WARMUP_STATE['models'])} models ready, "
+                 f"{len(WARMUP_STATE['errors'])} failed in {WARMUP_STATE['seconds']:.2f}s")
+
+
+def start_warmup(background=True):
+    """
+    Start the warm-up phase once per process. Call from the server entry point (or a
+    WSGI post-fork hook); /ready also triggers it lazily so every worker warms itself.
+    """
+    # Open this worker's own cache backend connection without waiting for it
+    CACHE_BACKEND.start()
+    start_cache_prewarm()
+    with _warmup_lock:
+        if WARMUP_STATE['status'] != 'pending':
+            return
+        if not PRELOAD_MODELS:
+            WARMUP_STATE['status'] = 'ready'
+            WARMUP_DONE.set()
+            return
+        WARMUP_STATE['status'] = 'warming'
+    if background:
+        threading.Thread(target=preload_models, name="model-preload", daemon=True).start()
+    else:
+        preload_models()
+
+
+# Cache pre-warming: replay a request log (path) or "synthetic" reports after warm-up
+CACHE_PREWARM = os.environ.get('XAI_CACHE_PREWARM', '').strip()
+CACHE_PREWARM_LIMIT = int(os.environ.get('XAI_CACHE_PREWARM_LIMIT', 200))
+CACHE_PREWARM_CONCURRENCY = int(os.environ.get('XAI_CACHE_PREWARM_CONCURRENCY', 1))
+CACHE_PREWARM_RATE = float(os.environ.get('XAI_CACHE_PREWARM_RATE', 5))
+PREWARM_STATE = {'status': 'disabled' if not CACHE_PREWARM else 'pending', 'source': CACHE_PREWARM or None}
+_prewarm_lock = threading.Lock()
+
+
+def prewarm_cache():
+    """Fill the caches from CACHE_PREWARM once models are warm (runs in its own thread)."""
+    WARMUP_DONE.wait()
+    CACHE_BACKEND.wait_until_ready()
+    PREWARM_STATE['status'] = 'running'
+    try:
+        if CACHE_PREWARM.lower() == 'synthetic':
+            requests_iter = synthetic_requests(CACHE_PREWARM_LIMIT)
+        else:
+            requests_iter = load_request_log(CACHE_PREWARM, CACHE_PREWARM_LIMIT)
+        stats = warm_cache(requests_iter, app_sender(app, DEV_AUTH_TOKEN),
+                           concurrency=CACHE_PREWARM_CONCURRENCY, rate=CACHE_PREWARM_RATE)
+        PREWARM_STATE.update(stats, status='done')
+        logging.info(f"Cache pre-warm finished: {stats}")
+    except Exception as e:
+        logging.exception("Cache pre-warm failed")
+        PREWARM_STATE.update(status='error', error=str(e))
+
+
+def start_cache_prewarm():
+    """Start pre-warming once per process when XAI_CACHE_PREWARM is set."""
+    with _prewarm_lock:
+        if PREWARM_STATE['status'] != 'pending':
+            return
+        PREWARM_STATE['status'] = 'waiting'
+    threading.Thread(target=prewarm_cache, name="cache-prewarm", daemon=True).start()
+
+
+def reload_models():
+    """
+    Swap in retrained bundles from models/ without a restart.
+    New versions are loaded and warmed before the swap; explainers of replaced versions
+    (and of versions warmed but never swapped in) are dropped.
+    """
+    swapped = MODEL_REGISTRY.reload_changed(warm=warm_model)
+    drop_stale_explainers()
+    return [
+        {"model": new.key, "previousHash": old.file_hash, "hash": new.file_hash}
+        for old, new in swapped
+    ]
+
+
+def _watch_models(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_models()
+        except Exception:
+            logging.exception("Model watcher failed to reload models")
+        try:
+            reload_risk_rules()
+        except Exception:
+            logging.exception("Model watcher failed to reload risk rules")
+
+
+def start_model_watcher(interval=MODEL_RELOAD_INTERVAL_SECONDS):
+    """Start the background thread that hot-reloads changed model bundles and risk rules."""
+    if interval <= 0:
+        return None
+    watcher = threading.Thread(target=_watch_models, args=(interval,), name="model-watcher", daemon=True)
+    watcher.start()
+    logging.info(f"Watching {MODELS_DIR} for retrained models every {interval:g}s")
+    return watcher
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
     return jsonify({"status": "healthy", "service": "XAI Blood Report Analysis"})
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness check: 200 only once models and explainers are warm, 503 while warming."""
+    start_warmup()
+    body = {
+        "status": WARMUP_STATE['status'],
+        "models": len(WARMUP_STATE['models']),
+        "errors": WARMUP_STATE['errors'],
+        "seconds": WARMUP_STATE['seconds'],
+    }
+    if not WARMUP_DONE.is_set():
+        return jsonify(body), 503
+    return jsonify(body)
+
+def _check_bearer_token(expected_token):
+    """Validate the request's Bearer token. Returns an error response, or None when authorized."""
+    auth_header = request.headers.get('Authorization', '')
+    # Developer debug logging (masked) to help troubleshoot auth issues in dev
+    try:
+        if auth_header:
+            # mask token for logs
+            if auth_header.startswith('Bearer '):
+                _token = auth_header.split(' ', 1)[1]
+                masked = _token if len(_token) <= 8 else (_token[:4] + '...' + _token[-2:])
+                logging.info(f"Authorization header received (masked token): {masked} (len={len(_token)})")
+            else:
+                logging.info(f"Authorization header received (not Bearer): {auth_header}")
+        else:
+            logging.info("No Authorization header received")
+    except Exception:
+        logging.debug("Failed to log Authorization header", exc_info=True)
+
+    if not auth_header.startswith('Bearer '):
+        return make_response(jsonify({"error": "Missing or invalid Authorization header"}), 401)
+    # Normalize token: strip whitespace and surrounding quotes to handle clients that add them
+    token = auth_header.split(' ', 1)[1].strip()
+    if (token.startswith('"') and token.endswith('"')) or (token.startswith("'") and token.endswith("'")):
+        token = token[1:-1]
+    # Compare normalized token
+    if token != expected_token:
+        logging.warning(f"Authorization failed: invalid token provided (len_received={len(token)}, len_expected={len(expected_token)})")
+        return make_response(jsonify({"error": "Invalid API token"}), 403)
+    return None
+
 def require_auth(f):
     @functools.wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        # Developer debug logging (masked) to help troubleshoot auth issues in dev
-        try:
-            if auth_header:
-                # mask token for logs
-                if auth_header.startswith('Bearer '):
-                    _token = auth_header.split(' ', 1)[1]
-                    masked = _token if len(_token) <= 8 else (_token[:4] + '...' + _token[-2:])
-                    logging.info(f"Authorization header received (masked token): {masked} (len={len(_token)})")
-                else:
-                    logging.info(f"Authorization header received (not Bearer): {auth_header}")
-            else:
-                logging.info("No Authorization header received")
-        except Exception:
-            logging.debug("Failed to log Authorization header", exc_info=True)
-
-        if not auth_header.startswith('Bearer '):
-            return make_response(jsonify({"error": "Missing or invalid Authorization header"}), 401)
-        # Normalize token: strip whitespace and surrounding quotes to handle clients that add them
-        token = auth_header.split(' ', 1)[1].strip()
-        if (token.startswith('"') and token.endswith('"')) or (token.startswith("'") and token.endswith("'")):
-            token = token[1:-1]
-        # Compare normalized token
-        if token != DEV_AUTH_TOKEN:
-            logging.warning(f"Authorization failed: invalid token provided (len_received={len(token)}, len_expected={len(DEV_AUTH_TOKEN)})")
-            return make_response(jsonify({"error": "Invalid API token"}), 403)
+        error = _check_bearer_token(DEV_AUTH_TOKEN)
+        if error is not None:
+            return error
         return f(*args, **kwargs)
     return decorated
 
-def cache_response(f):
+def require_admin(f):
     @functools.wraps(f)
     def decorated(*args, **kwargs):
+        error = _check_bearer_token(ADMIN_AUTH_TOKEN)
+        if error is not None:
+            return error
+        return f(*args, **kwargs)
+    return decorated
+
+def cache_response(key_func=None, stale=None):
+    """
+    Cache 200 responses of a JSON endpoint in RESPONSE_CACHE.
+
+    key_func(payload) returns the canonical request key (None disables caching for
+    that request); by default the canonical JSON of the whole body is used.
+    stale(body) may reject a stored body, which is then recomputed and replaced.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                payload = request.get_json(silent=True)
+                request_key = key_func(payload) if key_func else hash_key({'body': payload})
+            except Exception as e:
+                logging.warning(f"Could not build cache key for {request.path}: {e}")
+                request_key = None
+            cache_key = hash_key({'path': request.path, 'request': request_key}) if request_key else None
+            if cache_key:
+                body = RESPONSE_CACHE.get(cache_key)
+                if body is not None and not (stale and stale(body)):
+                    logging.info(f"Cache hit for {request.path}")
+                    return app.response_class(body, status=200, mimetype='application/json')
+            # Normalizes (body, status) tuples too, so the status code is always known
+            response = make_response(f(*args, **kwargs))
+
+            # Only cache successful (200) responses to avoid persisting error states
+            if cache_key and response.status_code == 200:
+                RESPONSE_CACHE.set(cache_key, response.get_data())
+            return response
+        return decorated
+    return decorator
+
+# Map frontend clinical status strings to numeric codes for template lookup
+STATUS_MAPPING = {
+    'normal': 0,
+    'low': 1,
+    'high': 2,
+    'critical': 3
+}
+
+# Define low-accuracy models that should prefer clinical rules
+LOW_ACCURACY_MODELS = ['wbc_10e9_L', 'platelet_count', 'rdw_percent']
+
+
+def extract_parameter(data):
+    """Robustly extract the parameter name from a request, fallback to 'hemoglobin' if missing or empty."""
+    parameter = None
+    for key in ['parameter', 'parameter_name', 'parameterName']:
+        value = data.get(key)
+        if value is not None and str(value).strip() != '':
+            parameter = value
+            break
+    if not parameter:
+        logging.warning("No parameter provided, defaulting to 'hemoglobin'")
+        parameter = 'hemoglobin'
+    return parameter
+
+
+def parse_value(raw_value):
+    """Convert value to float to ensure numeric comparisons work."""
+    try:
+        return float(raw_value)
+    except (ValueError, TypeError):
+        logging.warning(f"Could not convert value '{raw_value}' to float, defaulting to 0")
+        return 0.0
+
+
+def resolve_feature_names(model, saved_feature_names, available_features):
+    """Return the feature order the model expects, preferring names saved in the bundle."""
+    # Use saved feature names from model if available
+    if saved_feature_names:
+        expected_features = saved_feature_names
+        logging.info(f"Using {len(expected_features)} saved feature names from model")
+    else:
+        # Fallback: try to get from model itself
         try:
-            cache_key = hashlib.sha256((request.path + str(request.json)).encode()).hexdigest()
-        except Exception:
-            cache_key = None
-        if cache_key and cache_key in RESPONSE_CACHE:
-            entry = RESPONSE_CACHE[cache_key]
-            if (pd.Timestamp.now() - entry['time']).total_seconds() < CACHE_TTL_SECONDS:
-                logging.info(f"Cache hit for {request.path}")
-                return make_response(entry['response'])
-            else:
-                del RESPONSE_CACHE[cache_key]
-        response = f(*args, **kwargs)
-        # Determine HTTP status code for the response to avoid caching errors
-        status_code = None
-        try:
-            if hasattr(response, 'status_code'):
-                status_code = response.status_code
-            elif isinstance(response, tuple):
-                # (body, status) or (body, status, headers)
-                if len(response) > 1 and isinstance(response[1], int):
-                    status_code = response[1]
-                else:
-                    status_code = 200
-            else:
-                status_code = 200
+            expected_features = model.get_booster().feature_names
         except Exception:
-            status_code = None
+            expected_features = model.feature_names_in_ if hasattr(model, 'feature_names_in_') else list(available_features)
+        logging.warning(f"No saved feature names, using {len(expected_features)} features from model")
+    return expected_features
 
-        # Only cache successful (200) responses to avoid persisting error states
-        if cache_key and status_code == 200:
-            RESPONSE_CACHE[cache_key] = {'response': response, 'time': pd.Timestamp.now()}
-        return response
-    return decorated
 
-@app.route('/api/v1/interpret', methods=['POST'])
-@require_auth
-@cache_response
-def interpret():
-    payload = request.get_json()
-    # Check MongoDB cache first
-    cached = get_cached_interpretation(payload)
-    if cached:
-        return jsonify(cached)
-    try:
-        data = payload
-        print("==============================================================")
-        logging.info(f"Raw data received from frontend: {data}")
-        print("==============================================================")
+def predict_with_model(record, features_dict):
+    """
+    Run the ML model on a single preprocessed feature row.
 
-        # Use parameter name from request, fallback to 'hemoglobin' only if missing or empty
-        # Robustly extract parameter, fallback to 'hemoglobin' if missing or empty
-        parameter = None
-        for key in ['parameter', 'parameter_name', 'parameterName']:
-            value = data.get(key)
-            if value is not None and str(value).strip() != '':
-                parameter = value
-                break
-        if not parameter:
-            logging.warning("No parameter provided, defaulting to 'hemoglobin'")
-            parameter = 'hemoglobin'
-        
-        # Convert value to float to ensure numeric comparisons work
-        raw_value = data.get('value', 0)
+    Returns:
+        (X, prediction, confidence) where X is the feature DataFrame fed to the model
+    """
+    model = record.model
+    reverse_mapping = record.reverse_mapping
+    expected_features = resolve_feature_names(model, record.feature_names, features_dict.keys())
+
+    # Convert to DataFrame matching training features
+    feature_df = pd.DataFrame([features_dict])
+    # Reindex to match model's features, fill missing with 0
+    X = feature_df.reindex(columns=expected_features, fill_value=0)
+    logging.info(f"Feature vector shape: {X.shape} (expected: {len(expected_features)} features)")
+    # Predict
+    prediction_mapped = model.predict(X)[0]
+
+    # Map back to original class if needed (for RBS/HbA1c with classes [0,2,3])
+    if reverse_mapping:
+        prediction = reverse_mapping[int(prediction_mapped)]
+        logging.info(f"Mapped prediction: {prediction_mapped} -> {prediction}")
+    else:
+        prediction = prediction_mapped
+
+    proba = model.predict_proba(X)[0]
+    confidence = float(proba[int(prediction_mapped)])  # Use mapped class for probability
+    print("=============================================================")
+    logging.info(f"Model prediction: class={prediction}, confidence={confidence}")
+    print("==============================================================")
+    return X, prediction, confidence
+
+
+def parse_explain_mode(value):
+    """Map the request's "explain" field to one of EXPLAIN_MODES."""
+    if value is None or value is True:
+        return DEFAULT_EXPLAIN_MODE
+    if value is False:
+        return 'none'
+    mode = str(value).strip().lower()
+    if mode not in EXPLAIN_MODES:
+        logging.warning(f"Unknown explain mode '{value}', using '{DEFAULT_EXPLAIN_MODE}'")
+        return DEFAULT_EXPLAIN_MODE
+    return mode
+
+
+def parse_explain_level(data):
+    """
+    Explanation level for a request, one of EXPLAIN_LEVELS.
+
+    "explainLevel" takes precedence; otherwise the frontend's "shap" flag is honoured
+    (true -> full, false -> none, or a level name).
+    """
+    value = data.get('explainLevel', data.get('shap'))
+    if value is None:
+        return DEFAULT_EXPLAIN_LEVEL
+    if value is True:
+        return 'full'
+    if value is False:
+        return 'none'
+    level = str(value).strip().lower()
+    if level not in EXPLAIN_LEVELS:
+        logging.warning(f"Unknown explanation level '{value}', using '{DEFAULT_EXPLAIN_LEVEL}'")
+        return DEFAULT_EXPLAIN_LEVEL
+    return level
+
+
+def empty_explanation(feature_names, method):
+    """Explanation payload when no explainability is computed."""
+    return {
+        'feature_importances': [],
+        'shap_values': None,
+        'feature_names': list(feature_names),
+        'shap_error': None,
+        'individual_contributions': {},
+        'decision_path': {},
+        'method': method,
+    }
+
+
+def explain_prediction(record, X, prediction, mode=None, level=None):
+    """
+    Explain a single model prediction with the requested engine, up to the requested level.
+
+    'native' uses the booster's own TreeSHAP contributions (prediction cost, no shap
+    explainer) and falls back to 'shap' for models without a native API; 'none' (or
+    level 'none') skips explainability entirely.
+    """
+    mode = mode or DEFAULT_EXPLAIN_MODE
+    level = level or DEFAULT_EXPLAIN_LEVEL
+    if mode == 'none' or level == 'none':
+        return empty_explanation(X.columns, 'none')
+    if mode == 'native':
         try:
-            value = float(raw_value)
-        except (ValueError, TypeError):
-            logging.warning(f"Could not convert value '{raw_value}' to float, defaulting to 0")
-            value = 0.0
-        
-        print("==============================================================")
-        logging.info(f"Received parameter: '{parameter}', value: {value}")
-        print("==============================================================")
-        print("==============================================================")
-        logging.info(f"Interpret request for parameter='{parameter}' (value={value}) | payload keys: {list(data.keys())}")
-        print("==============================================================")
-        if parameter == 'hemoglobin':
-            logging.warning("Parameter defaulted to 'hemoglobin'. Check if frontend is sending the correct parameter name.")
-        # Normalize parameter name from frontend labels to model keys
-        normalized_param = normalize_parameter_name(parameter)
-        logging.info(f"Normalized parameter name: '{parameter}' -> '{normalized_param}'")
-        
-        # Try loading model first
-        # Load model
-        model, reverse_mapping, saved_feature_names = get_model(normalized_param)
-        
-        # Check if this is a LightGBM model (SHAP-compatible)
-        is_lightgbm = False
+            return _explain_native(record, X, prediction, level)
+        except NativeContributionsUnavailable as e:
+            logging.info(f"{e} - falling back to SHAP")
+        except Exception as e:
+            logging.warning(f"Native contributions failed for '{record.key}': {e} - falling back to SHAP")
+    return _explain_with_shap(record, X, prediction, level)
+
+
+def _explain_native(record, X, prediction, level='path'):
+    """Exact TreeSHAP values for the predicted class straight from the booster."""
+    contributions = native_contributions(record.model, X)
+    row = contributions[0, class_index_for(record, prediction)]
+    class_shap = row[:-1]
+    feature_names = list(X.columns)
+    logging.info(f"Computed native tree contributions for {len(feature_names)} features")
+    decision_path_info = {}
+    if level_includes(level, 'path'):
+        decision_path_info = {
+            'contributions': {fname: float(c) for fname, c in zip(feature_names, class_shap)},
+            'bias': float(row[-1]),
+            'method': 'native pred_contrib'
+        }
+    return {
+        'feature_importances': top_feature_importances(feature_names, class_shap),
+        'shap_values': class_shap.tolist(),
+        'feature_names': feature_names,
+        'shap_error': None,
+        'individual_contributions': {},
+        'decision_path': decision_path_info,
+        'method': 'native',
+    }
+
+
+def _perturbation_contributions(record, X, prediction, feature_names):
+    """Change in the predicted class probability when each feature is set to its baseline."""
+    baseline = perturbation_baseline(record, feature_names, PERTURBATION_BASELINE)
+    # Whole perturbation matrix scored in one predict_proba call
+    contributions = perturbation_contributions(record.model, X, class_index_for(record, prediction), baseline)
+    return {feature: float(c) for feature, c in zip(feature_names, contributions)}
+
+
+def _explain_with_shap(record, X, prediction, level='path'):
+    """
+    Compute explainability output for a single model prediction with the shap library.
+
+    The successful SHAP explainer is cached in LOADED_EXPLAINERS and reused by
+    later requests for the same model. Work only needed above the requested level
+    (perturbation contributions, the decision path) is skipped.
+
+    Returns:
+        dict with feature_importances, shap_values, feature_names, shap_error,
+        individual_contributions and decision_path
+    """
+    model = record.model
+    is_lightgbm = record.is_lightgbm
+    model_key = record.key
+    feature_names = list(X.columns)
+    individual_contributions = {}  # Store per-feature contributions for this prediction
+    decision_path_info = {}  # Store decision tree path information
+
+    # Prefer TreeExplainer for tree-based models (XGBoost, LightGBM, RandomForest, etc.)
+    try:
+        from xgboost import XGBClassifier, XGBRegressor
+        is_tree = isinstance(model, (XGBClassifier, XGBRegressor))
+    except ImportError:
+        is_tree = False
+    # Check for LightGBM models
+    if not is_tree and is_lightgbm:
         try:
-            model_path = MODELS_DIR / f"{normalized_param}_model.joblib"
-            if model_path.exists():
-                model_data_check = joblib.load(model_path)
-                if isinstance(model_data_check, dict):
-                    is_lightgbm = model_data_check.get('model_type') == 'LightGBM'
-        except:
-            pass
-        
-        logging.info(f"Model type: {'LightGBM (SHAP-compatible)' if is_lightgbm else 'XGBoost (using alternative explainability)'}")
-        use_clinical_fallback = False
-        
-        # Define low-accuracy models that should prefer clinical rules
-        LOW_ACCURACY_MODELS = ['wbc_10e9_L', 'platelet_count', 'rdw_percent']
-        prefer_clinical = normalized_param in LOW_ACCURACY_MODELS
-        
-        if model is None or prefer_clinical:
-            if model is None:
-                logging.warning(f"Model for parameter '{normalized_param}' not found, using clinical rules fallback")
-            else:
-                logging.warning(f"Model for parameter '{normalized_param}' has low accuracy ({normalized_param}), preferring clinical rules")
-            use_clinical_fallback = True
-            # We'll use clinical rules instead of returning 404
-        
-        # Preprocess input for both model and clinical fallback
-        features_dict = preprocess_input(data)
-        print("==============================================================")
-        logging.info(f"Features sent for analysis: {features_dict}")
-        print("==============================================================")
-        
-        # Determine prediction using model or clinical rules
-        if use_clinical_fallback:
-            # Use clinical rules for classification
-            gender = data.get('patientGender', 'Male')
-            age = data.get('patientAge', 50)
-            try:
-                prediction, status_label = classify_by_threshold(value, normalized_param, gender, age)
-                confidence = 0.95  # Clinical rules have high confidence
-                logging.info(f"Clinical fallback classification: class={prediction}, status={status_label}")
-            except Exception as e:
-                logging.error(f"Clinical fallback failed: {e}")
-                return jsonify({"error": f"No model or clinical rule available for '{normalized_param}'", "original_parameter": parameter}), 404
-        else:
-            # Use ML model for prediction
-            print("==============================================================")
-            logging.info(f"Model loaded for: '{normalized_param}' (original: '{parameter}')")
-            print("==============================================================")
-            
-            # Use saved feature names from model if available
-            if saved_feature_names:
-                expected_features = saved_feature_names
-                logging.info(f"Using {len(expected_features)} saved feature names from model")
-            else:
-                # Fallback: try to get from model itself
-                try:
-                    expected_features = model.get_booster().feature_names
-                except Exception:
-                    expected_features = model.feature_names_in_ if hasattr(model, 'feature_names_in_') else list(features_dict.keys())
-                logging.warning(f"No saved feature names, using {len(expected_features)} features from model")
-            
-            # Convert to DataFrame matching training features
-            feature_df = pd.DataFrame([features_dict])
-            # Reindex to match model's features, fill missing with 0
-            X = feature_df.reindex(columns=expected_features, fill_value=0)
-            logging.info(f"Feature vector shape: {X.shape} (expected: {len(expected_features)} features)")
-            # Predict
-            prediction_mapped = model.predict(X)[0]
-            
-            # Map back to original class if needed (for RBS/HbA1c with classes [0,2,3])
-            if reverse_mapping:
-                prediction = reverse_mapping[int(prediction_mapped)]
-                logging.info(f"Mapped prediction: {prediction_mapped} -> {prediction}")
-            else:
-                prediction = prediction_mapped
-            
-            proba = model.predict_proba(X)[0]
-            confidence = float(proba[int(prediction_mapped)])  # Use mapped class for probability
-            print("=============================================================")
-            logging.info(f"Model prediction: class={prediction}, confidence={confidence}")
-            print("==============================================================")
-        # ==========================================
-        # EXPLAINABILITY WITHOUT SHAP
-        # ==========================================
-        feature_importances = []
-        shap_vals = None
-        feature_names = list(features_dict.keys()) if use_clinical_fallback else list(X.columns)
-        shap_error = None
-        individual_contributions = {}  # Store per-feature contributions for this prediction
-        decision_path_info = {}  # Store decision tree path information
-        
-        if use_clinical_fallback:
-            logging.info("Skipping explainability computation (clinical fallback mode)")
-            feature_importances = []  # Clinical rules don't have feature importances
-        else:
-            # Prefer TreeExplainer for tree-based models (XGBoost, LightGBM, RandomForest, etc.)
-            explainer = None
-            explainer_type = None
-            shap_error = None
-            try:
-                from xgboost import XGBClassifier, XGBRegressor
-                is_tree = isinstance(model, (XGBClassifier, XGBRegressor))
-            except ImportError:
-                is_tree = False
-            # Check for LightGBM models
-            if not is_tree and is_lightgbm:
-                try:
-                    from lightgbm import LGBMClassifier, LGBMRegressor
-                    is_tree = isinstance(model, (LGBMClassifier, LGBMRegressor))
-                except ImportError:
-                    is_tree = False
-            # Also check for scikit-learn RandomForest, ExtraTrees, etc.
-            if not is_tree:
-                from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier, ExtraTreesRegressor
-                is_tree = isinstance(model, (RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier, ExtraTreesRegressor))
-            # Try multiple explainer strategies to maximize compatibility with different model wrappers
+            from lightgbm import LGBMClassifier, LGBMRegressor
+            is_tree = isinstance(model, (LGBMClassifier, LGBMRegressor))
+        except ImportError:
+            is_tree = False
+    # Also check for scikit-learn RandomForest, ExtraTrees, etc.
+    if not is_tree:
+        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier, ExtraTreesRegressor
+        is_tree = isinstance(model, (RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier, ExtraTreesRegressor))
+    # Try multiple explainer strategies to maximize compatibility with different model wrappers
+    shap_values = None
+    shap_error = None
+    explainer = None
+    explainer_type = None
+    attempts = []
+    try:
+        # For XGBoost models (not LightGBM), skip SHAP due to base_score bug
+        # For LightGBM models, SHAP works perfectly!
+        if hasattr(model, 'get_booster') and not is_lightgbm:
+            logging.info("XGBoost model detected - using advanced explainability methods (no SHAP)")
             shap_values = None
-            shap_error = None
+            shap_error = "XGBoost base_score incompatibility - using alternative explainability"
             explainer = None
             explainer_type = None
-            attempts = []
+
+            # ==========================================
+            # METHOD 1: Global Feature Importance (Model-wide)
+            # ==========================================
+            global_importances = model.feature_importances_
+
+            # ==========================================
+            # METHOD 2: Decision Path Analysis (Tree-based)
+            # ==========================================
             try:
-                # For XGBoost models (not LightGBM), skip SHAP due to base_score bug
-                # For LightGBM models, SHAP works perfectly!
-                if hasattr(model, 'get_booster') and not is_lightgbm:
-                    logging.info("XGBoost model detected - using advanced explainability methods (no SHAP)")
-                    shap_values = None
-                    shap_error = "XGBoost base_score incompatibility - using alternative explainability"
-                    explainer = None
-                    explainer_type = None
-                    
-                    # ==========================================
-                    # METHOD 1: Global Feature Importance (Model-wide)
-                    # ==========================================
-                    global_importances = model.feature_importances_
-                    
-                    # ==========================================
-                    # METHOD 2: Local Feature Contribution (This Prediction)
-                    # Using predict_proba to see how features affected THIS prediction
-                    # ==========================================
-                    try:
-                        # Get base prediction (using median of training data as baseline)
-                        X_baseline = X.copy()
-                        for col in X_baseline.columns:
-                            X_baseline[col] = 0  # Use zero as baseline (neutral state)
-                        
-                        # Get prediction probabilities for actual vs baseline
-                        proba_actual = model.predict_proba(X)[0]
-                        proba_baseline = model.predict_proba(X_baseline)[0]
-                        
-                        # Calculate contribution: how much each feature changed the prediction
-                        # We'll use a simple perturbation method: set each feature to baseline one at a time
-                        for i, feature in enumerate(feature_names):
-                            X_perturbed = X.copy()
-                            X_perturbed.iloc[0, i] = 0  # Set this feature to baseline
-                            proba_perturbed = model.predict_proba(X_perturbed)[0]
-                            
-                            # Contribution = change in predicted class probability
-                            contribution = proba_actual[prediction] - proba_perturbed[prediction]
-                            individual_contributions[feature] = float(contribution)
-                        
-                        logging.info(f"Computed individual feature contributions for {len(individual_contributions)} features")
-                    except Exception as e:
-                        logging.warning(f"Could not compute individual contributions: {e}")
-                        individual_contributions = {}
-                    
-                    # ==========================================
-                    # METHOD 3: Decision Path Analysis (Tree-based)
-                    # ==========================================
-                    try:
-                        booster = model.get_booster()
-                        # Get prediction contributions using XGBoost's built-in method
-                        # This shows how each feature contributed to moving the prediction from base_score
-                        contributions = model.predict(X, pred_contribs=True)
-                        
-                        if contributions is not None and len(contributions) > 0:
-                            # pred_contribs returns [feature_contributions..., bias]
-                            # Last value is the bias term
-                            feature_contribs = contributions[0][:-1]  # Exclude bias
-                            
-                            # Store top contributing features
-                            contrib_dict = {}
-                            for fname, contrib in zip(feature_names, feature_contribs):
-                                contrib_dict[fname] = float(contrib)
-                            
-                            decision_path_info = {
-                                'contributions': contrib_dict,
-                                'bias': float(contributions[0][-1]) if len(contributions[0]) > len(feature_names) else 0.0,
-                                'method': 'XGBoost pred_contribs'
-                            }
-                            logging.info(f"✅ Computed XGBoost prediction contributions (tree path analysis)")
-                        
-                    except Exception as e:
-                        logging.warning(f"Could not compute decision path: {e}")
-                    
-                    # Break out of SHAP computation
-                    attempts = []
-                
-                # For LightGBM models, SHAP TreeExplainer works perfectly!
-                elif is_lightgbm and is_tree:
-                    logging.info("LightGBM model detected - using SHAP TreeExplainer")
-                    attempts.append(('TreeExplainer_LightGBM', lambda: shap.TreeExplainer(model)))
-                
-                # For non-XGBoost models, try explainers
-                # Explainer using predict_proba if available
-                if hasattr(model, 'predict_proba') and len(attempts) > 0:
-                    attempts.append(('PredictProbaExplainer', lambda: shap.Explainer(lambda d: model.predict_proba(d), X[:10] if len(X) >= 10 else X)))
-                # Generic explainer using model object
-                if len(attempts) > 0:
-                    attempts.append(('GenericExplainer', lambda: shap.Explainer(model, X[:10] if len(X) >= 10 else X)))
+                booster = model.get_booster()
+                # Get prediction contributions using XGBoost's built-in method
+                # This shows how each feature contributed to moving the prediction from base_score
+                contributions = model.predict(X, pred_contribs=True)
+
+                if contributions is not None and len(contributions) > 0:
+                    # pred_contribs returns [feature_contributions..., bias]
+                    # Last value is the bias term
+                    feature_contribs = contributions[0][:-1]  # Exclude bias
+
+                    # Store top contributing features
+                    contrib_dict = {}
+                    for fname, contrib in zip(feature_names, feature_contribs):
+                        contrib_dict[fname] = float(contrib)
+
+                    decision_path_info = {
+                        'contributions': contrib_dict,
+                        'bias': float(contributions[0][-1]) if len(contributions[0]) > len(feature_names) else 0.0,
+                        'method': 'XGBoost pred_contribs'
+                    }
+                    logging.info(f"✅ Computed XGBoost prediction contributions (tree path analysis)")
+
             except Exception as e:
-                logging.warning(f"Error preparing SHAP explainer attempts: {e}")
+                logging.warning(f"Could not compute decision path: {e}")
 
-            for name, ctor in attempts:
+            # ==========================================
+            # METHOD 3: Local Feature Contribution (This Prediction)
+            # Using predict_proba to see how features affected THIS prediction.
+            # Only when the caller wants full vectors, or as the importance source
+            # when the decision path is unavailable.
+            # ==========================================
+            if level_includes(level, 'full') or not decision_path_info.get('contributions'):
                 try:
-                    logging.info(f"Attempting SHAP explainer: {name}")
-                    explainer_candidate = ctor()
-                    # compute shap values
-                    cand_vals = None
-                    try:
-                        cand_vals = explainer_candidate(X)
-                    except Exception as e:
-                        logging.warning(f"Explainer {name} failed to compute SHAP: {e}")
-                        logging.debug(traceback.format_exc())
-                        continue
-                    
-                    # Handle both Explanation objects (.values) and raw numpy arrays (LightGBM)
-                    if hasattr(cand_vals, 'values'):
-                        vals = cand_vals.values
-                    elif isinstance(cand_vals, np.ndarray):
-                        vals = cand_vals
-                    else:
-                        vals = None
-                    
-                    if vals is None:
-                        logging.info(f"Explainer {name} returned no values")
-                        continue
-                    vals_np = np.array(vals)
-                    logging.info(f"Explainer {name} returned SHAP values shape: {vals_np.shape}")
-                    # accept this explainer if it produced a non-empty values array
-                    if vals_np.size > 0:
-                        explainer = explainer_candidate
-                        explainer_type = name
-                        shap_values = cand_vals
-                        break
+                    individual_contributions = _perturbation_contributions(record, X, prediction, feature_names)
+                    logging.info(f"Computed individual feature contributions for {len(individual_contributions)} features")
                 except Exception as e:
-                    logging.warning(f"SHAP attempt {name} raised: {e}")
-                    logging.debug(traceback.format_exc())
+                    logging.warning(f"Could not compute individual contributions: {e}")
+                    individual_contributions = {}
+
+            # Break out of SHAP computation
+            attempts = []
+
+        # For LightGBM models, SHAP TreeExplainer works perfectly!
+        elif is_lightgbm and is_tree:
+            logging.info("LightGBM model detected - using SHAP TreeExplainer")
+            attempts.append(('TreeExplainer_LightGBM', lambda: shap.TreeExplainer(model)))
 
-            if explainer is None or shap_values is None:
-                shap_error = "All SHAP explainer attempts failed or returned no values"
-                logging.warning(shap_error)
+        # For non-XGBoost models, try explainers
+        # Explainer using predict_proba if available
+        if hasattr(model, 'predict_proba') and len(attempts) > 0:
+            attempts.append(('PredictProbaExplainer', lambda: shap.Explainer(lambda d: model.predict_proba(d), X[:10] if len(X) >= 10 else X)))
+        # Generic explainer using model object
+        if len(attempts) > 0:
+            attempts.append(('GenericExplainer', lambda: shap.Explainer(model, X[:10] if len(X) >= 10 else X)))
+    except Exception as e:
+        logging.warning(f"Error preparing SHAP explainer attempts: {e}")
+
+    # Reuse the explainer strategy that already worked for this model and skip the other attempts
+    cached_explainer = LOADED_EXPLAINERS.get(explainer_key(record)) if attempts else None
+    if cached_explainer:
+        attempts = [(cached_explainer[0], lambda: cached_explainer[1])]
+
+    for name, ctor in attempts:
+        try:
+            logging.info(f"Attempting SHAP explainer: {name}")
+            explainer_candidate = ctor()
+            # compute shap values
+            cand_vals = None
+            try:
+                cand_vals = explainer_candidate(X)
+            except Exception as e:
+                logging.warning(f"Explainer {name} failed to compute SHAP: {e}")
+                logging.debug(traceback.format_exc())
+                continue
+
+            # Handle both Explanation objects (.values) and raw numpy arrays (LightGBM)
+            if hasattr(cand_vals, 'values'):
+                vals = cand_vals.values
+            elif isinstance(cand_vals, np.ndarray):
+                vals = cand_vals
+            else:
+                vals = None
+
+            if vals is None:
+                logging.info(f"Explainer {name} returned no values")
+                continue
+            vals_np = np.array(vals)
+            logging.info(f"Explainer {name} returned SHAP values shape: {vals_np.shape}")
+            # accept this explainer if it produced a non-empty values array
+            if vals_np.size > 0:
+                explainer = explainer_candidate
+                explainer_type = name
+                shap_values = cand_vals
+                break
+        except Exception as e:
+            logging.warning(f"SHAP attempt {name} raised: {e}")
+            logging.debug(traceback.format_exc())
+
+    if explainer is None or shap_values is None:
+        shap_error = "All SHAP explainer attempts failed or returned no values"
+        logging.warning(shap_error)
+        if cached_explainer:
+            # Cached explainer stopped working (e.g. model changed); rebuild on next request
+            LOADED_EXPLAINERS.pop(explainer_key(record), None)
+    elif not cached_explainer:
+        cache_explainer(record, explainer_type, explainer)
+        logging.info(f"Cached SHAP explainer '{explainer_type}' for model '{model_key}'")
 
+    feature_importances = []
+    shap_vals = None
+
+    # Normalize shap values to a 1-D array for the sample and predicted class
+    if shap_values is not None:
+        try:
+            # Handle both Explanation objects (.values) and raw numpy arrays
+            if hasattr(shap_values, 'values'):
+                vals_array = np.array(shap_values.values)
+            else:
+                vals_array = np.array(shap_values)
+            n_feat = len(feature_names)
+
+            # Debug: log the shape we received
+            logging.info(f"SHAP raw shape: {vals_array.shape}, n_features expected: {n_feat}, prediction class: {prediction}")
+
+            # Handle different possible SHAP shapes robustly
+            if vals_array.ndim == 1:
+                class_shap = vals_array
+            elif vals_array.ndim == 2:
+                if vals_array.shape[1] == n_feat:
+                    class_shap = vals_array[0]
+                elif vals_array.shape[0] == n_feat:
+                    class_shap = vals_array[:, 0]
+                else:
+                    raise ValueError(f'Unexpected 2D SHAP shape: {vals_array.shape}')
+            elif vals_array.ndim == 3:
+                # Shape is (n_samples, n_features, n_classes) or (n_samples, n_classes, n_features)
+                if vals_array.shape[2] == n_feat:
+                    # Shape: (1, n_classes, n_features) - extract features for predicted class
+                    class_shap = vals_array[0, int(prediction), :]
+                elif vals_array.shape[1] == n_feat:
+                    # Shape: (1, n_features, n_classes) - extract features for predicted class
+                    class_shap = vals_array[0, :, int(prediction)]
+                else:
+                    raise ValueError(f'Unexpected 3D SHAP shape: {vals_array.shape}')
+            else:
+                raise ValueError(f'Unsupported SHAP values ndim: {vals_array.ndim}')
+
+            shap_vals = class_shap.tolist()
+
+            # Debug: log raw SHAP values with more detail
+            print("==============================================================")
+            logging.info(f"✅ SHAP VALUES COMPUTED SUCCESSFULLY")
+            print("==============================================================")
+            logging.info(f"Raw SHAP values (first 10): {class_shap[:10]}")
+            logging.info(f"SHAP value range: min={class_shap.min():.6f}, max={class_shap.max():.6f}")
+            print("==============================================================")
+            logging.info(f"Top SHAP contributors:")
+
+            # Create feature importances with detailed logging
+            temp_importances = []
+            for fname, impact in zip(feature_names, class_shap):
+                if abs(impact) > 0.01:
+                    temp_importances.append({
+                        "feature": fname,
+                        "impact": float(impact),
+                        "direction": "increases" if impact > 0 else "decreases"
+                    })
+
+            # Sort and take top 5
+            feature_importances = sorted(temp_importances, key=lambda x: abs(x['impact']), reverse=True)[:5]
+
+            # Log each top contributor
+            for i, fi in enumerate(feature_importances, 1):
+                logging.info(f"  {i}. {fi['feature']}: {fi['impact']:.4f} ({fi['direction']} prediction)")
+
+            print("==============================================================")
+            logging.info(f"Feature importances found: {len(feature_importances)} (after filtering > 0.01)")
+            print("==============================================================")
+
+        except Exception as inner_e:
+            shap_error = f"SHAP parse error: {inner_e}\n{traceback.format_exc()}"
+            logging.warning(shap_error)
             feature_importances = []
             shap_vals = None
 
-            # Normalize shap values to a 1-D array for the sample and predicted class
-            if shap_values is not None:
-                try:
-                    # Handle both Explanation objects (.values) and raw numpy arrays
-                    if hasattr(shap_values, 'values'):
-                        vals_array = np.array(shap_values.values)
-                    else:
-                        vals_array = np.array(shap_values)
-                    n_feat = len(feature_names)
-                    
-                    # Debug: log the shape we received
-                    logging.info(f"SHAP raw shape: {vals_array.shape}, n_features expected: {n_feat}, prediction class: {prediction}")
-
-                    # Handle different possible SHAP shapes robustly
-                    if vals_array.ndim == 1:
-                        class_shap = vals_array
-                    elif vals_array.ndim == 2:
-                        if vals_array.shape[1] == n_feat:
-                            class_shap = vals_array[0]
-                        elif vals_array.shape[0] == n_feat:
-                            class_shap = vals_array[:, 0]
-                        else:
-                            raise ValueError(f'Unexpected 2D SHAP shape: {vals_array.shape}')
-                    elif vals_array.ndim == 3:
-                        # Shape is (n_samples, n_features, n_classes) or (n_samples, n_classes, n_features)
-                        if vals_array.shape[2] == n_feat:
-                            # Shape: (1, n_classes, n_features) - extract features for predicted class
-                            class_shap = vals_array[0, int(prediction), :]
-                        elif vals_array.shape[1] == n_feat:
-                            # Shape: (1, n_features, n_classes) - extract features for predicted class
-                            class_shap = vals_array[0, :, int(prediction)]
-                        else:
-                            raise ValueError(f'Unexpected 3D SHAP shape: {vals_array.shape}')
-                    else:
-                        raise ValueError(f'Unsupported SHAP values ndim: {vals_array.ndim}')
-
-                    shap_vals = class_shap.tolist()
-                    
-                    # Debug: log raw SHAP values with more detail
-                    print("==============================================================")
-                    logging.info(f"✅ SHAP VALUES COMPUTED SUCCESSFULLY")
-                    print("==============================================================")
-                    logging.info(f"Raw SHAP values (first 10): {class_shap[:10]}")
-                    logging.info(f"SHAP value range: min={class_shap.min():.6f}, max={class_shap.max():.6f}")
-                    print("==============================================================")
-                    logging.info(f"Top SHAP contributors:")
-                    
-                    # Create feature importances with detailed logging
-                    temp_importances = []
-                    for fname, impact in zip(feature_names, class_shap):
-                        if abs(impact) > 0.01:
-                            temp_importances.append({
-                                "feature": fname,
-                                "impact": float(impact),
-                                "direction": "increases" if impact > 0 else "decreases"
-                            })
-                    
-                    # Sort and take top 5
-                    feature_importances = sorted(temp_importances, key=lambda x: abs(x['impact']), reverse=True)[:5]
-                    
-                    # Log each top contributor
-                    for i, fi in enumerate(feature_importances, 1):
-                        logging.info(f"  {i}. {fi['feature']}: {fi['impact']:.4f} ({fi['direction']} prediction)")
-                    
-                    print("==============================================================")
-                    logging.info(f"Feature importances found: {len(feature_importances)} (after filtering > 0.01)")
-                    print("==============================================================")
-                    
-                except Exception as inner_e:
-                    shap_error = f"SHAP parse error: {inner_e}\n{traceback.format_exc()}"
-                    logging.warning(shap_error)
-                    feature_importances = []
-                    shap_vals = None
-            
-            # Fallback: if SHAP returns all zeros or failed, use our enhanced explainability methods
-            if len(feature_importances) == 0:
-                logging.info("Using alternative explainability methods (no SHAP)")
-                
-                # Priority 1: Use decision path contributions (tree-specific, most accurate)
-                if decision_path_info.get('contributions'):
-                    logging.info("Using XGBoost prediction contributions (tree path analysis)")
-                    for fname, contrib in decision_path_info['contributions'].items():
-                        if abs(contrib) > 0.001:  # Lower threshold for contributions
-                            feature_importances.append({
-                                "feature": fname,
-                                "impact": float(contrib),
-                                "direction": "increases" if contrib > 0 else "decreases",
-                                "method": "tree_path"
-                            })
-                    feature_importances = sorted(feature_importances, key=lambda x: abs(x['impact']), reverse=True)[:10]
-                
-                # Priority 2: Use individual contributions (perturbation-based)
-                elif individual_contributions:
-                    logging.info("Using individual feature contributions (perturbation method)")
-                    for fname, contrib in individual_contributions.items():
-                        if abs(contrib) > 0.01:
-                            feature_importances.append({
-                                "feature": fname,
-                                "impact": float(contrib),
-                                "direction": "increases" if contrib > 0 else "decreases",
-                                "method": "perturbation"
-                            })
-                    feature_importances = sorted(feature_importances, key=lambda x: abs(x['impact']), reverse=True)[:10]
-                
-                # Priority 3: Use global feature importances (model-wide)
-                elif hasattr(model, 'feature_importances_'):
-                    logging.info("Using model global feature importances")
-                    model_importances = model.feature_importances_
-                    for fname, importance in zip(feature_names, model_importances):
-                        if importance > 0.01:
-                            feature_importances.append({
-                                "feature": fname,
-                                "impact": float(importance),
-                                "direction": "importance",
-                                "method": "global"
-                            })
-                    feature_importances = sorted(feature_importances, key=lambda x: abs(x['impact']), reverse=True)[:10]
-                
-                logging.info(f"✅ Extracted {len(feature_importances)} feature importances using alternative methods")
-        
-        # Use frontend's clinical status if available, otherwise use model prediction
-        # Frontend status is based on reference ranges and is more clinically accurate
-        frontend_status = data.get('status', '').lower() if data.get('status') else None
-        
-        # Map frontend status to numeric codes for template lookup
-        status_mapping = {
-            'normal': 0,
-            'low': 1,
-            'high': 2,
-            'critical': 3
-        }
-        
-        # Determine the status to use for interpretation
-        final_status = int(prediction)  # Default to model prediction
-        
-        if frontend_status:
-            if frontend_status == 'abnormal':
-                # Frontend says abnormal but didn't specify low/high
-                # Try to determine from reference range and value
-                ref_range = data.get('reference_range', '')
-                try:
-                    # Try to parse reference range to determine if value is low or high
-                    # Common formats: "12.0 - 15.0", "12-15", "Female: 12.0 - 15.0"
-                    import re
-                    range_match = re.search(r'(\d+\.?\d*)\s*-\s*(\d+\.?\d*)', str(ref_range))
-                    if range_match:
-                        min_val = float(range_match.group(1))
-                        max_val = float(range_match.group(2))
-                        if value < min_val:
-                            final_status = 1  # Low
-                            logging.info(f"Frontend 'abnormal' + value {value} < min {min_val} → Low (1)")
-                        elif value > max_val:
-                            final_status = 2  # High
-                            logging.info(f"Frontend 'abnormal' + value {value} > max {max_val} → High (2)")
-                        else:
-                            # Value in range but marked abnormal - trust model
-                            logging.info(f"Frontend 'abnormal' but value {value} in range [{min_val}-{max_val}] - using model prediction: {final_status}")
+    # Fallback: if SHAP returns all zeros or failed, use our enhanced explainability methods
+    if len(feature_importances) == 0:
+        logging.info("Using alternative explainability methods (no SHAP)")
+
+        # Priority 1: Use decision path contributions (tree-specific, most accurate)
+        if decision_path_info.get('contributions'):
+            logging.info("Using XGBoost prediction contributions (tree path analysis)")
+            for fname, contrib in decision_path_info['contributions'].items():
+                if abs(contrib) > 0.001:  # Lower threshold for contributions
+                    feature_importances.append({
+                        "feature": fname,
+                        "impact": float(contrib),
+                        "direction": "increases" if contrib > 0 else "decreases",
+                        "method": "tree_path"
+                    })
+            feature_importances = sorted(feature_importances, key=lambda x: abs(x['impact']), reverse=True)[:10]
+
+        # Priority 2: Use individual contributions (perturbation-based)
+        elif individual_contributions:
+            logging.info("Using individual feature contributions (perturbation method)")
+            for fname, contrib in individual_contributions.items():
+                if abs(contrib) > 0.01:
+                    feature_importances.append({
+                        "feature": fname,
+                        "impact": float(contrib),
+                        "direction": "increases" if contrib > 0 else "decreases",
+                        "method": "perturbation"
+                    })
+            feature_importances = sorted(feature_importances, key=lambda x: abs(x['impact']), reverse=True)[:10]
+
+        # Priority 3: Use global feature importances (model-wide)
+        elif hasattr(model, 'feature_importances_'):
+            logging.info("Using model global feature importances")
+            model_importances = model.feature_importances_
+            for fname, importance in zip(feature_names, model_importances):
+                if importance > 0.01:
+                    feature_importances.append({
+                        "feature": fname,
+                        "impact": float(importance),
+                        "direction": "importance",
+                        "method": "global"
+                    })
+            feature_importances = sorted(feature_importances, key=lambda x: abs(x['impact']), reverse=True)[:10]
+
+        logging.info(f"✅ Extracted {len(feature_importances)} feature importances using alternative methods")
+
+    if not level_includes(level, 'full'):
+        individual_contributions = {}
+    if not level_includes(level, 'path'):
+        decision_path_info = {}
+
+    return {
+        'feature_importances': feature_importances,
+        'shap_values': shap_vals,
+        'feature_names': feature_names,
+        'shap_error': shap_error,
+        'individual_contributions': individual_contributions,
+        'decision_path': decision_path_info,
+        'method': 'shap',
+    }
+
+
+def explanation_fields(explanation, level):
+    """Top-level response fields carrying an explanation, trimmed to the requested level."""
+    # SHAP values and feature names for frontend visualization (full level and above)
+    show_vectors = level_includes(level, 'full')
+    fields = {
+        "shap_values": explanation['shap_values'] if show_vectors else None,
+        "feature_names": explanation['feature_names'] if show_vectors else None,
+    }
+    # Add enhanced explainability information
+    if explanation['decision_path']:
+        fields["decision_path"] = explanation['decision_path']
+    if explanation['individual_contributions']:
+        # Send top 10 individual contributions
+        top_contributions = sorted(explanation['individual_contributions'].items(), key=lambda x: abs(x[1]), reverse=True)[:10]
+        fields["individual_contributions"] = dict(top_contributions)
+    # Developer debug: include shap error details when computation failed (may be None)
+    fields["shap_error"] = explanation['shap_error']
+    fields["explanation_method"] = explanation['method']
+    fields["explanation_level"] = level
+    return fields
+
+
+def parse_explain_async(data):
+    value = data.get('explainAsync', ASYNC_EXPLANATIONS)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def explanation_id_for(record, X, prediction, mode, level):
+    """
+    Deterministic id for an explanation: same model version, feature row and options give
+    the same id, so repeated requests share one job and one cached result.
+    """
+    ident = {
+        'model': record.key,
+        'hash': record.file_hash,
+        'row': [float(v) for v in X.iloc[0].tolist()],
+        'prediction': int(prediction),
+        'mode': mode,
+        'level': level,
+    }
+    return hashlib.sha256(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def run_explanation_job(record, X, prediction, mode, level):
+    """Body of an asynchronous explanation: the fields a synchronous response would carry."""
+    explanation = explain_prediction(record, X, prediction, mode=mode, level=level)
+    feature_importances = explanation['feature_importances']
+    return {
+        "featureImportances": feature_importances,
+        "shapExplanation": generate_shap_explanation(feature_importances) if feature_importances else "",
+        **explanation_fields(explanation, level),
+    }
+
+
+def submit_explanation(record, X, prediction, mode, level):
+    """
+    Queue an explanation on the background pool.
+
+    Returns the explanation_id, or None when the queue is full and the caller
+    should explain inline.
+    """
+    explanation_id = explanation_id_for(record, X, prediction, mode, level)
+    if EXPLANATION_JOBS.get(explanation_id) is None and get_cached_explanation(explanation_id) is not None:
+        return explanation_id
+    if EXPLANATION_JOBS.submit(explanation_id, lambda: run_explanation_job(record, X, prediction, mode, level)):
+        return explanation_id
+    return None
+
+
+def explanation_lost(interpretation):
+    """
+    True when a cached interpretation points at an async explanation that failed, or
+    expired from memory without being persisted. Serving it again would hand out an
+    explanation_id nobody is computing, so the caller recomputes the interpretation,
+    which resubmits the job.
+    """
+    explanation_id = interpretation.get('explanation_id') if isinstance(interpretation, dict) else None
+    if not explanation_id:
+        return False
+    job = EXPLANATION_JOBS.get(explanation_id)
+    if job is not None:
+        return job.status == 'error'
+    return get_cached_explanation(explanation_id) is None
+
+
+def response_explanation_lost(body):
+    """explanation_lost for a stored interpret or batch response body."""
+    if b'"explanation_id"' not in body:
+        return False
+    document = json.loads(body)
+    return any(explanation_lost(item) for item in document.get('interpretations', [document]))
+
+
+def resolve_final_status(data, value, prediction):
+    """
+    Use frontend's clinical status if available, otherwise use model prediction.
+    Frontend status is based on reference ranges and is more clinically accurate.
+    """
+    frontend_status = data.get('status', '').lower() if data.get('status') else None
+
+    # Determine the status to use for interpretation
+    final_status = int(prediction)  # Default to model prediction
+
+    if frontend_status:
+        if frontend_status == 'abnormal':
+            # Frontend says abnormal but didn't specify low/high
+            # Try to determine from reference range and value
+            ref_range = data.get('reference_range', '')
+            try:
+                # Try to parse reference range to determine if value is low or high
+                # Common formats: "12.0 - 15.0", "12-15", "Female: 12.0 - 15.0"
+                import re
+                range_match = re.search(r'(\d+\.?\d*)\s*-\s*(\d+\.?\d*)', str(ref_range))
+                if range_match:
+                    min_val = float(range_match.group(1))
+                    max_val = float(range_match.group(2))
+                    if value < min_val:
+                        final_status = 1  # Low
+                        logging.info(f"Frontend 'abnormal' + value {value} < min {min_val} → Low (1)")
+                    elif value > max_val:
+                        final_status = 2  # High
+                        logging.info(f"Frontend 'abnormal' + value {value} > max {max_val} → High (2)")
                     else:
-                        logging.info(f"Frontend 'abnormal' but couldn't parse reference range '{ref_range}' - using model prediction: {final_status}")
-                except Exception as e:
-                    logging.warning(f"Error parsing reference range: {e} - using model prediction: {final_status}")
-            elif frontend_status in status_mapping:
-                # Frontend specified exact status (normal/low/high/critical)
-                final_status = status_mapping[frontend_status]
-                if final_status != int(prediction):
-                    logging.warning(f"Frontend clinical status '{frontend_status}' ({final_status}) differs from model prediction ({int(prediction)}) - USING CLINICAL STATUS")
+                        # Value in range but marked abnormal - trust model
+                        logging.info(f"Frontend 'abnormal' but value {value} in range [{min_val}-{max_val}] - using model prediction: {final_status}")
                 else:
-                    logging.info(f"Frontend status '{frontend_status}' matches model prediction: {final_status}")
+                    logging.info(f"Frontend 'abnormal' but couldn't parse reference range '{ref_range}' - using model prediction: {final_status}")
+            except Exception as e:
+                logging.warning(f"Error parsing reference range: {e} - using model prediction: {final_status}")
+        elif frontend_status in STATUS_MAPPING:
+            # Frontend specified exact status (normal/low/high/critical)
+            final_status = STATUS_MAPPING[frontend_status]
+            if final_status != int(prediction):
+                logging.warning(f"Frontend clinical status '{frontend_status}' ({final_status}) differs from model prediction ({int(prediction)}) - USING CLINICAL STATUS")
             else:
-                logging.info(f"Unknown frontend status '{frontend_status}' - using model prediction: {final_status}")
+                logging.info(f"Frontend status '{frontend_status}' matches model prediction: {final_status}")
         else:
-            logging.info(f"No frontend status - using model prediction: {final_status}")
-        
-        # Generate medical text with patient data for risk assessments
-        # IMPORTANT: Use normalized_param for template lookup
-        interpretation = generate_interpretation(
-            parameter_name=normalized_param,  # Use normalized name for template matching
-            value=value,
-            prediction_status=final_status,
-            confidence=confidence,
-            feature_importances=feature_importances,
-            patient_data=data  # Pass full patient data for risk assessment
-        )
-        # Add SHAP values and feature names for frontend visualization
-        interpretation["shap_values"] = shap_vals
-        interpretation["feature_names"] = feature_names
-        # Add enhanced explainability information
-        if decision_path_info:
-            interpretation["decision_path"] = decision_path_info
-        if individual_contributions:
-            # Send top 10 individual contributions
-            top_contributions = sorted(individual_contributions.items(), key=lambda x: abs(x[1]), reverse=True)[:10]
-            interpretation["individual_contributions"] = dict(top_contributions)
-        # Developer debug: include shap error details when computation failed (may be None)
-        interpretation["shap_error"] = shap_error
+            logging.info(f"Unknown frontend status '{frontend_status}' - using model prediction: {final_status}")
+    else:
+        logging.info(f"No frontend status - using model prediction: {final_status}")
+    return final_status
+
+
+def interpret_parameter(data, features_dict=None, risk_assessments=None, model_results=None):
+    """
+    Build the interpretation for a single parameter request.
+
+    Args:
+        data: request payload for one parameter (patient profile + parameter/value/status)
+        features_dict: preprocessed feature row; computed from data when omitted
+        risk_assessments: precomputed risk assessments; computed from data when omitted
+        model_results: optional dict shared across calls with the same feature row, used to
+            reuse the prediction and explainability output per model
+
+    Returns:
+        (body, status_code)
+    """
+    parameter = extract_parameter(data)
+    value = parse_value(data.get('value', 0))
+    explain_mode = parse_explain_mode(data.get('explain'))
+    explain_level = parse_explain_level(data)
+    explain_async = parse_explain_async(data)
+
+    print("==============================================================")
+    logging.info(f"Received parameter: '{parameter}', value: {value}")
+    print("==============================================================")
+    print("==============================================================")
+    logging.info(f"Interpret request for parameter='{parameter}' (value={value}) | payload keys: {list(data.keys())}")
+    print("==============================================================")
+    if parameter == 'hemoglobin':
+        logging.warning("Parameter defaulted to 'hemoglobin'. Check if frontend is sending the correct parameter name.")
+    # Normalize parameter name from frontend labels to model keys
+    normalized_param = normalize_parameter_name(parameter)
+    logging.info(f"Normalized parameter name: '{parameter}' -> '{normalized_param}'")
+
+    # Load model (bundle and metadata come from the registry, loaded once per process)
+    record = get_model(normalized_param)
+    model = record.model if record else None
+    is_lightgbm = record.is_lightgbm if record else False
+
+    logging.info(f"Model type: {'LightGBM (SHAP-compatible)' if is_lightgbm else 'XGBoost (using alternative explainability)'}")
+    use_clinical_fallback = False
+
+    prefer_clinical = normalized_param in LOW_ACCURACY_MODELS
+
+    if model is None or prefer_clinical:
+        if model is None:
+            logging.warning(f"Model for parameter '{normalized_param}' not found, using clinical rules fallback")
+        else:
+            logging.warning(f"Model for parameter '{normalized_param}' has low accuracy ({normalized_param}), preferring clinical rules")
+        use_clinical_fallback = True
+        # We'll use clinical rules instead of returning 404
+
+    # Preprocess input for both model and clinical fallback
+    if features_dict is None:
+        features_dict = preprocess_input(data)
+    print("==============================================================")
+    logging.info(f"Features sent for analysis: {features_dict}")
+    print("==============================================================")
+
+    # Determine prediction using model or clinical rules
+    if use_clinical_fallback:
+        # Use clinical rules for classification
+        gender = data.get('patientGender', 'Male')
+        age = data.get('patientAge', 50)
+        try:
+            prediction, status_label = classify_by_threshold(
+                value, normalized_param, gender, age, data.get('pregnant', False), data.get('diabetic', False))
+            confidence = 0.95  # Clinical rules have high confidence
+            logging.info(f"Clinical fallback classification: class={prediction}, status={status_label}")
+        except Exception as e:
+            logging.error(f"Clinical fallback failed: {e}")
+            return {"error": f"No model or clinical rule available for '{normalized_param}'", "original_parameter": parameter}, 404
+        logging.info("Skipping explainability computation (clinical fallback mode)")
+        # Clinical rules don't have feature importances
+        explanation = empty_explanation(features_dict.keys(), 'clinical_rules')
+    else:
+        # Prediction and explanation depend only on the model and the feature row,
+        # so parameters sharing a model within one report reuse the same result
+        result_key = (normalized_param, explain_mode, explain_level, explain_async)
+        if model_results is not None and result_key in model_results:
+            logging.info(f"Reusing prediction for model '{normalized_param}' from this report")
+            prediction, confidence, explanation = model_results[result_key]
+        else:
+            # Use ML model for prediction
+            print("==============================================================")
+            logging.info(f"Model loaded for: '{normalized_param}' (original: '{parameter}')")
+            print("==============================================================")
+            X, prediction, confidence = predict_with_model(record, features_dict)
+            explanation_id = None
+            if explain_async and explain_mode != 'none' and explain_level != 'none':
+                explanation_id = submit_explanation(record, X, prediction, explain_mode, explain_level)
+            if explanation_id:
+                # Status and text go out now; the explanation is fetched later by id
+                explanation = empty_explanation(X.columns, 'pending')
+                explanation['explanation_id'] = explanation_id
+            else:
+                explanation = explain_prediction(record, X, prediction, mode=explain_mode, level=explain_level)
+            if model_results is not None:
+                model_results[result_key] = (prediction, confidence, explanation)
+
+    final_status = resolve_final_status(data, value, prediction)
+
+    # Generate medical text with patient data for risk assessments
+    # IMPORTANT: Use normalized_param for template lookup
+    interpretation = generate_interpretation(
+        parameter_name=normalized_param,  # Use normalized name for template matching
+        value=value,
+        prediction_status=final_status,
+        confidence=confidence,
+        feature_importances=explanation['feature_importances'],
+        patient_data=data,  # Pass full patient data for risk assessment
+        risk_assessments=risk_assessments
+    )
+    interpretation.update(explanation_fields(explanation, explain_level))
+    if explanation.get('explanation_id'):
+        interpretation["explanation_id"] = explanation['explanation_id']
+        interpretation["explanation_url"] = f"/api/v1/explanations/{explanation['explanation_id']}"
+    print("==============================================================")
+    logging.info(f"Output returned from XAI: {interpretation}")
+    print("==============================================================")
+    return interpretation, 200
+
+
+def interpretation_cache_fields(data, features_dict=None):
+    """
+    Canonical form of a single-parameter request for caching.
+
+    Keeps only the inputs that can change the interpretation: the normalized
+    parameter, its value, the status inputs, the resolved explanation options, the
+    fields risk assessments read, and either the selected model's feature values or
+    the demographics used by the clinical rules. Numbers are rounded to
+    CACHE_KEY_DECIMALS, so equivalent requests share one entry in every tier.
+
+    The model bundle hash, template version and risk rules version are part of the
+    key: after a model reload, a template change or a rules reload, older entries are
+    simply never matched again.
+    """
+    parameter = normalize_parameter_name(extract_parameter(data))
+    status = str(data.get('status') or '').strip().lower()
+    rules = clinical_rules_fallback.RISK_RULES
+    fields = {
+        'parameter': parameter,
+        'value': parse_value(data.get('value', 0)),
+        'status': status or None,
+        # The reference range is only consulted for an unspecific "abnormal" status
+        'reference_range': str(data.get('reference_range', '')).strip() if status == 'abnormal' else None,
+        'explain': [parse_explain_mode(data.get('explain')), parse_explain_level(data), parse_explain_async(data)],
+        'risk': {k: data[k] for k in rules.inputs if k in data},
+        'riskRulesVersion': rules.version,
+        'templateVersion': TEMPLATE_VERSION,
+    }
+    record = get_model(parameter)
+    if record is None or parameter in LOW_ACCURACY_MODELS:
+        fields['modelVersion'] = 'clinical_rules'
+        fields['clinical'] = [data.get('patientGender', 'Male'), data.get('patientAge', 50),
+                              bool(data.get('pregnant', False)), bool(data.get('diabetic', False))]
+    else:
+        fields['modelVersion'] = record.file_hash
+        # Only the features this model reads; other lab values don't change its output
+        if features_dict is None:
+            features_dict = preprocess_input(data)
+        names = resolve_feature_names(record.model, record.feature_names, features_dict.keys())
+        fields['features'] = {name: features_dict.get(name, 0) for name in names}
+    return round_numbers(fields, CACHE_KEY_DECIMALS)
+
+
+def interpretation_cache_entry(data, features_dict=None):
+    """
+    (key, meta) for a single-parameter request: the key shared by the response cache
+    and the persistent cache, and the version tags stored alongside the persistent entry.
+    """
+    fields = interpretation_cache_fields(data, features_dict)
+    meta = {name: fields[name] for name in ('parameter', 'modelVersion', 'templateVersion')}
+    return hash_key(fields), meta
+
+
+def interpretation_cache_key(data, features_dict=None):
+    """Cache key of a single-parameter request, shared by the response cache and the persistent cache."""
+    return interpretation_cache_entry(data, features_dict)[0]
+
+
+def interpret_request_entry(payload):
+    """
+    (cache_key, cache_meta, features_dict) of an /interpret request, built once per
+    request and kept on flask.g, so the response cache key and interpret() share one
+    preprocess_input call. features_dict is None when the key doesn't need the feature
+    row (clinical rules parameters); interpret_parameter computes it on a miss.
+    """
+    if 'interpret_entry' not in g:
+        parameter = normalize_parameter_name(extract_parameter(payload))
+        uses_model = get_model(parameter) is not None and parameter not in LOW_ACCURACY_MODELS
+        features_dict = preprocess_input(payload) if uses_model else None
+        g.interpret_entry = (*interpretation_cache_entry(payload, features_dict), features_dict)
+    return g.interpret_entry
+
+
+def interpret_response_key(payload):
+    """Response cache key of an /interpret request (None for bodies that aren't objects)."""
+    return interpret_request_entry(payload)[0] if isinstance(payload, dict) else None
+
+
+@app.route('/api/v1/interpret', methods=['POST'])
+@require_auth
+@cache_response(interpret_response_key, stale=response_explanation_lost)
+def interpret():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    cache_key, cache_meta, features_dict = interpret_request_entry(payload)
+    # Check the interpretation cache (L1, then the persistent backend) first
+    cached = INTERPRETATION_CACHE.get(cache_key, label=cache_meta['parameter'])
+    if cached and not explanation_lost(cached):
+        return jsonify(cached)
+    try:
         print("==============================================================")
-        logging.info(f"Output returned from XAI: {interpretation}")
+        logging.info(f"Raw data received from frontend: {payload}")
         print("==============================================================")
-        set_cached_interpretation(payload, interpretation)
+        interpretation, status_code = interpret_parameter(payload, features_dict=features_dict)
+        if status_code != 200:
+            return jsonify(interpretation), status_code
+        INTERPRETATION_CACHE.set(cache_key, interpretation, meta=cache_meta)
         return jsonify(interpretation)
     except Exception as e:
         logging.exception("Error in interpret")
         return jsonify({"error": str(e)}), 500
 
+
+# Per-parameter keys in a batch entry; everything else in the report is the shared patient profile
+BATCH_PARAMETER_KEYS = ('parameter', 'parameter_name', 'parameterName', 'value', 'status', 'reference_range')
+# Explanation options may be set for the whole report and overridden per entry
+BATCH_OVERRIDE_KEYS = ('shap', 'explainLevel', 'explain', 'explainAsync')
+
+
+def split_batch_payload(payload):
+    """
+    Split a batch request into the shared patient profile and one request dict per entry.
+    Entries that are not objects come back as None.
+    """
+    profile = {k: v for k, v in payload.items() if k != 'parameters' and k not in BATCH_PARAMETER_KEYS}
+    requests_data = []
+    for entry in payload.get('parameters') or []:
+        if not isinstance(entry, dict):
+            requests_data.append(None)
+            continue
+        data = dict(profile)
+        data.update({k: v for k, v in entry.items() if k in BATCH_PARAMETER_KEYS or k in BATCH_OVERRIDE_KEYS})
+        requests_data.append(data)
+    return profile, requests_data
+
+
+def batch_entry_keys(requests_data, features_dict):
+    """(label, key, meta) for every batch entry; None for entries that are not objects."""
+    return [
+        (extract_parameter(data), *interpretation_cache_entry(data, features_dict)) if data is not None else None
+        for data in requests_data
+    ]
+
+
+def report_fingerprint(entry_keys):
+    """Identity of a whole report: every entry's label and canonical key, in order."""
+    # Entries echo their original parameter label, so it is part of the fingerprint
+    return hash_key({'batch': [[entry[0], entry[1]] if entry is not None else None for entry in entry_keys]})
+
+
+def batch_request_entry(payload):
+    """
+    (profile, requests_data, features_dict, entry_keys) of a batch request, built once
+    per request and kept on flask.g for the response cache key and interpret_batch().
+    """
+    if 'batch_entry' not in g:
+        profile, requests_data = split_batch_payload(payload)
+        features_dict = preprocess_input(profile)
+        g.batch_entry = (profile, requests_data, features_dict, batch_entry_keys(requests_data, features_dict))
+    return g.batch_entry
+
+
+def batch_cache_key(payload):
+    """Response cache key of a batch request (its report fingerprint)."""
+    if not isinstance(payload, dict) or not isinstance(payload.get('parameters'), list):
+        return None
+    return report_fingerprint(batch_request_entry(payload)[3])
+
+
+@app.route('/api/v1/interpret/batch', methods=['POST'])
+@require_auth
+@cache_response(batch_cache_key, stale=response_explanation_lost)
+def interpret_batch():
+    """
+    Interpret a whole report in one request.
+
+    Expects the patient profile (patientAge, patientGender, diabetic, pregnant,
+    otherParameters, ...) at the top level and a 'parameters' list of
+    {parameter, value, status, reference_range} entries; "shap", "explainLevel",
+    "explain" and "explainAsync" apply to the whole report and can be overridden per
+    entry. The feature row and risk assessments are computed once per report, each
+    model runs once, and cached entries are fetched with a single bulk lookup. With
+    REPORT_CACHE_ENABLED the whole response is also stored as one report-scoped
+    document, so reopening a report costs one cache read.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    entries = payload.get('parameters')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "'parameters' must be a non-empty list"}), 400
+    try:
+        # Shared across every parameter of the report
+        profile, requests_data, features_dict, entry_keys = batch_request_entry(payload)
+
+        report_key = f"report:{report_fingerprint(entry_keys)}" if REPORT_CACHE_ENABLED else None
+        if report_key:
+            cached_report = INTERPRETATION_CACHE.get(report_key, label='report')
+            if cached_report and not any(explanation_lost(item) for item in cached_report['interpretations']):
+                return jsonify(cached_report)
+
+        risk_assessments = calculate_risk_assessments(profile)
+        model_results = {}
+        # One round-trip for every entry the in-process tier doesn't have
+        cached_entries = INTERPRETATION_CACHE.get_many(
+            [entry[1] for entry in entry_keys if entry is not None],
+            labels={entry[1]: entry[2]['parameter'] for entry in entry_keys if entry is not None}
+        )
+
+        results = []
+        for data, entry in zip(requests_data, entry_keys):
+            if data is None:
+                results.append({"error": "Each parameter entry must be an object"})
+                continue
+            parameter, cache_key, cache_meta = entry
+
+            cached = cached_entries.get(cache_key)
+            if cached and not explanation_lost(cached):
+                interpretation = cached
+            else:
+                try:
+                    interpretation, status_code = interpret_parameter(
+                        data,
+                        features_dict=features_dict,
+                        risk_assessments=risk_assessments,
+                        model_results=model_results
+                    )
+                except Exception as e:
+                    logging.exception(f"Error interpreting '{parameter}' in batch")
+                    interpretation, status_code = {"error": str(e)}, 500
+                if status_code == 200:
+                    INTERPRETATION_CACHE.set(cache_key, interpretation, meta=cache_meta)
+            # Risk assessments are reported once for the whole report
+            interpretation.pop('riskAssessments', None)
+            interpretation['parameter'] = parameter
+            results.append(interpretation)
+
+        body = {
+            "count": len(results),
+            "interpretations": results,
+            "riskAssessments": risk_assessments
+        }
+        if report_key and not any('error' in item for item in results):
+            INTERPRETATION_CACHE.set(report_key, body, meta={
+                'parameter': 'report',
+                'modelVersion': sorted({entry[2]['modelVersion'] for entry in entry_keys if entry is not None}),
+                'templateVersion': TEMPLATE_VERSION,
+            })
+        return jsonify(body)
+    except Exception as e:
+        logging.exception("Error in interpret_batch")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/explanations/<explanation_id>', methods=['GET'])
+@require_auth
+def get_explanation(explanation_id):
+    """
+    Fetch an asynchronous explanation by the explanation_id returned from interpret.
+
+    200 with the explanation once done, 202 while it is still being computed, 500 if
+    the job failed, 404 if unknown (expired from memory and not in the cache). In the
+    last two cases re-requesting the interpretation resubmits the job.
+    ?wait=<seconds> long-polls up to EXPLANATION_MAX_WAIT_SECONDS for a pending job.
+    """
+    try:
+        wait = min(float(request.args.get('wait', 0)), EXPLANATION_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "'wait' must be a number of seconds"}), 400
+
+    job = EXPLANATION_JOBS.get(explanation_id, wait=max(wait, 0))
+    if job is not None and job.status == 'pending':
+        return jsonify({"explanation_id": explanation_id, "status": "pending"}), 202
+    if job is not None and job.status == 'error':
+        return jsonify({"explanation_id": explanation_id, "status": "error", "error": job.error}), 500
+    result = job.result if job is not None else get_cached_explanation(explanation_id)
+    if result is None:
+        return jsonify({"error": "Unknown or expired explanation_id", "explanation_id": explanation_id}), 404
+    return jsonify({"explanation_id": explanation_id, "status": "done", "explanation": result})
+
+
+def _cohort_row_contributions(record, X, class_index, mode):
+    """Per-row contributions of every feature to each row's predicted class, for the whole matrix at once."""
+    n_rows, n_feat = X.shape
+    rows = np.arange(n_rows)
+    # XGBoost bundles are explained with pred_contribs in the single-parameter path too;
+    # it is the same TreeSHAP without building an explainer
+    if mode == 'native' or not record.is_lightgbm:
+        try:
+            return native_contributions(record.model, X)[rows, class_index, :-1]
+        except NativeContributionsUnavailable as e:
+            logging.info(f"{e} - falling back to SHAP")
+
+    cached = LOADED_EXPLAINERS.get(explainer_key(record))
+    if cached and isinstance(cached[1], shap.TreeExplainer):
+        explainer = cached[1]
+    else:
+        explainer = shap.TreeExplainer(record.model)
+        cache_explainer(record, 'TreeExplainer_LightGBM' if record.is_lightgbm else 'TreeExplainer', explainer)
+    vals = explainer.shap_values(X)
+    if isinstance(vals, list):
+        # Older shap returns one (n_samples, n_features) array per class
+        vals = np.stack(vals, axis=-1)
+    vals = np.asarray(vals)
+    if vals.ndim == 2:
+        return vals
+    elif vals.ndim == 3 and vals.shape[1] == n_feat:
+        return vals[rows, :, class_index]
+    elif vals.ndim == 3 and vals.shape[2] == n_feat:
+        return vals[rows, class_index, :]
+    raise ValueError(f'Unexpected SHAP shape: {vals.shape}')
+
+
+def _cohort_top_features(record, X, class_index, mode, top_k=5):
+    """Top_k contributors per row of a cohort feature matrix."""
+    row_vals = _cohort_row_contributions(record, X, class_index, mode)
+    feature_names = list(X.columns)
+    top = np.argsort(-np.abs(row_vals), axis=1)[:, :top_k]
+    return [
+        [{"feature": feature_names[j], "impact": float(row_vals[i, j])} for j in top[i]]
+        for i in range(len(row_vals))
+    ]
+
+
+def score_cohort_parameter(parameter, frame, records, explain='none'):
+    """
+    Score one parameter for every row of a preprocessed cohort frame.
+
+    The whole cohort goes through a single predict_proba call; parameters without a
+    usable model are classified in one vectorized pass over the clinical rules.
+    """
+    normalized_param = normalize_parameter_name(parameter)
+    record = get_model(normalized_param)
+    n = len(frame)
+
+    if record is None or normalized_param in LOW_ACCURACY_MODELS:
+        values = _to_float_array([
+            (r.get('otherParameters') or {}).get(normalized_param, r.get(normalized_param, 0)) for r in records
+        ], 0.0)
+        statuses, _ = classify_many(
+            values, normalized_param,
+            [r.get('patientGender', 'Male') for r in records],
+            _to_float_array([r.get('patientAge', 50) for r in records], 50.0),
+            [bool(r.get('pregnant', False)) for r in records],
+            [bool(r.get('diabetic', False)) for r in records],
+        )
+        return {
+            "normalizedParameter": normalized_param,
+            "source": "clinical_rules",
+            "statuses": statuses.tolist(),
+            "confidences": [0.95] * n,
+        }
+
+    model = record.model
+    reverse_mapping = record.reverse_mapping
+    expected_features = resolve_feature_names(model, record.feature_names, frame.columns)
+    X = frame.reindex(columns=expected_features, fill_value=0)
+    proba = model.predict_proba(X)
+    mapped = proba.argmax(axis=1)
+    confidences = proba[np.arange(n), mapped]
+    if reverse_mapping:
+        # Map back to original classes (e.g. RBS/HbA1c with classes [0,2,3])
+        lookup = np.array([reverse_mapping[i] for i in range(proba.shape[1])])
+        statuses = lookup[mapped]
+    else:
+        statuses = mapped
+
+    result = {
+        "normalizedParameter": normalized_param,
+        "source": "model",
+        "statuses": statuses.astype(int).tolist(),
+        "confidences": np.round(confidences, 4).tolist(),
+    }
+    if explain != 'none':
+        try:
+            result["explanations"] = _cohort_top_features(record, X, mapped, explain)
+        except Exception as e:
+            logging.warning(f"Cohort SHAP failed for '{normalized_param}': {e}")
+            result["explanations"] = None
+            result["shap_error"] = str(e)
+    return result
+
+
+@app.route('/api/v1/score/cohort', methods=['POST'])
+@require_auth
+def score_cohort():
+    """
+    Bulk-score many patient records.
+
+    Expects {"records": [{patientAge, patientGender, otherParameters, ...}, ...],
+    "parameters": ["hemoglobin", ...], "explain": "none" | "native" | "shap"}. Returns compact per-row
+    status codes and confidences for each parameter.
+
+    With "risk": true the response also carries each record's risk assessments as level
+    codes and factor bitmasks (decoded by the "codebook" sent with them); "risk": "text" renders them in
+    full, as /interpret/batch does.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    records = payload.get('records')
+    parameters = payload.get('parameters') or ([payload['parameter']] if payload.get('parameter') else [])
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        return jsonify({"error": "'records' must be a non-empty list of objects"}), 400
+    risk = payload.get('risk', False)
+    if not isinstance(parameters, list) or not (parameters or risk):
+        return jsonify({"error": "'parameters' must be a non-empty list"}), 400
+    try:
+        frame = preprocess_batch(records)
+        explain = parse_explain_mode(payload.get('explain', False))
+        results = {}
+        for parameter in parameters:
+            results[str(parameter)] = score_cohort_parameter(parameter, frame, records, explain=explain)
+        logging.info(f"Scored cohort of {len(records)} records for {len(parameters)} parameters")
+        response = {
+            "count": len(records),
+            "statusNames": STATUS_NAMES,
+            "results": results
+        }
+        if risk:
+            assessments = assess_cohort(columns_from_records(records))
+            if risk == 'text':
+                response["risk"] = assessments.render_all()
+            else:
+                response["risk"] = {**assessments.to_compact(), "codebook": assessments.rules.codebook()}
+        return jsonify(response)
+    except Exception as e:
+        logging.exception("Error in score_cohort")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/admin/models', methods=['GET'])
+@require_admin
+def list_models():
+    """List loaded model versions."""
+    return jsonify({"models": [
+        {
+            "model": r.key,
+            "modelType": r.model_type,
+            "hash": r.file_hash,
+            "mtime": r.mtime,
+            "features": len(r.feature_names or []),
+            "explainer": (LOADED_EXPLAINERS.get(explainer_key(r)) or (None,))[0],
+        }
+        for r in sorted(MODEL_REGISTRY.records(), key=lambda r: r.key)
+    ]})
+
+
+@app.route('/api/v1/admin/cache', methods=['GET'])
+@require_admin
+def cache_stats():
+    """
+    Per-tier counters and sizes: the response cache, the interpretation cache (L1 plus
+    L2 hit ratio and write-behind queue), the persistent backend, and the parameters
+    with the highest miss rate (?top=N, default 10).
+    """
+    try:
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        return jsonify({"error": "'top' must be an integer"}), 400
+    return jsonify({
+        "responseCache": RESPONSE_CACHE.stats(),
+        "interpretationCache": INTERPRETATION_CACHE.stats(),
+        "backend": CACHE_BACKEND.stats(),
+        "parameters": INTERPRETATION_CACHE.label_stats(top=max(top, 0)),
+        "prewarm": PREWARM_STATE,
+    })
+
+
+@app.route('/api/v1/admin/cache/invalidate', methods=['POST'])
+@require_admin
+def invalidate_cache():
+    """
+    Remove persistent cache entries matching every given criterion: "parameter",
+    "modelVersion" and/or "olderThanSeconds"; {"all": true} clears everything.
+    This worker's in-process caches are cleared too; other workers' expire within their TTL.
+    Answers 503 when the persistent backend couldn't be touched.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    parameter = payload.get('parameter')
+    model_version = payload.get('modelVersion')
+    older_than = payload.get('olderThanSeconds')
+    if parameter is not None:
+        parameter = normalize_parameter_name(parameter)
+    if older_than is not None and (isinstance(older_than, bool) or not isinstance(older_than, (int, float)) or older_than < 0):
+        return jsonify({"error": "'olderThanSeconds' must be a non-negative number"}), 400
+    if payload.get('all') is not True and parameter is None and model_version is None and older_than is None:
+        return jsonify({"error": "Give 'parameter', 'modelVersion' or 'olderThanSeconds', or 'all': true"}), 400
+    # Queued writes must land before the delete, or they would resurrect entries
+    INTERPRETATION_CACHE.flush()
+    try:
+        removed = CACHE_BACKEND.invalidate(parameter, model_version, older_than)
+    except Exception as e:
+        logging.exception("Error invalidating cache")
+        return jsonify({"error": str(e)}), 500
+    body = {
+        "removed": removed,
+        "interpretationCacheCleared": INTERPRETATION_CACHE.clear_l1(),
+        "responseCacheCleared": RESPONSE_CACHE.clear(),
+    }
+    if removed is None:
+        # Only this worker's in-process caches were cleared
+        body["error"] = f"Persistent cache '{CACHE_BACKEND.name}' was not invalidated (unavailable or disabled)"
+        return jsonify(body), 503
+    return jsonify(body)
+
+
+@app.route('/api/v1/admin/models/reload', methods=['POST'])
+@require_admin
+def reload_models_endpoint():
+    """Hot-reload retrained model bundles (load + warm off the request path, then atomic swap)."""
+    try:
+        reloaded = reload_models()
+        return jsonify({"reloaded": reloaded, "count": len(reloaded)})
+    except Exception as e:
+        logging.exception("Error reloading models")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/admin/risk-rules/reload', methods=['POST'])
+@require_admin
+def reload_risk_rules_endpoint():
+    """Recompile data/risk_rules.json if it changed; a file that fails to compile keeps the current rules."""
+    try:
+        reloaded = reload_risk_rules()
+        return jsonify({"reloaded": reloaded is not None, "version": clinical_rules_fallback.RISK_RULES.version})
+    except Exception as e:
+        logging.exception("Error reloading risk rules")
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
     print("Starting Flask XAI API...")
     print(f"Models directory: {MODELS_DIR}")
@@ -883,5 +2017,10 @@ if __name__ == '__main__':
     else:
         print("  ⚠️  No models found!")
     print("=" * 25 + "\n")
+
+    # Load and warm every model in the background; /ready reports 503 until done
+    start_warmup()
+
+    start_model_watcher()
     
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,329 @@
+"""
+Persistent (L2) cache backends for the XAI service
+One small interface with in-process, SQLite and MongoDB implementations, selected with
+XAI_CACHE_BACKEND. Every backend supports bulk get/set of (key, value, meta) entries and
+expires entries ttl_seconds after they were written.
+"""
+from collections import OrderedDict
+from pathlib import Path
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from cache_codec import CacheCodecError, decode, encode
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('mongo', 'sqlite', 'memory', 'none')
+DEFAULT_SQLITE_PATH = Path(__file__).parent / "cache" / "xai_cache.sqlite3"
+
+
+class CacheBackend:
+    """
+    Base class and the 'none' backend: stores nothing.
+
+    get_many(keys) returns {key: value} for the keys found; set_many(items) stores
+    (key, value, meta) triples, where meta carries the parameter / modelVersion /
+    templateVersion tags. set_many raises on failure so the write-behind queue can
+    count it; reads return misses instead.
+    """
+    name = 'none'
+
+    def start(self):
+        """Per-process setup; call after a prefork server has forked. Must not block."""
+
+    def wait_until_ready(self, timeout=10.0):
+        """Block until the backend can serve requests (or timeout); returns whether it can."""
+        return True
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        return {}
+
+    def set(self, key, value, meta=None):
+        self.set_many([(key, value, meta)])
+
+    def set_many(self, items):
+        pass
+
+    def clear(self):
+        """Remove every entry; returns the number removed (None if nothing could be touched)."""
+        return None
+
+    def invalidate(self, parameter=None, model_version=None, older_than_seconds=None):
+        """
+        Remove the entries matching every given criterion. A model version also matches
+        report entries that include it. Returns the number removed, or None when no
+        persistent store could be touched (the 'none' backend, or an unreachable one).
+        """
+        return None
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+def _model_versions(meta):
+    version = (meta or {}).get('modelVersion')
+    return version if isinstance(version, (list, tuple)) else (version,)
+
+
+def _decoded(blob, key):
+    try:
+        return decode(blob)
+    except (CacheCodecError, ValueError) as e:
+        logger.debug(f"Ignoring cache entry {key[:16]}: {e}")
+        return None
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Process-local backend: LRU-bounded dict of encoded entries. Useful for tests and
+    single-process runs; nothing survives a restart or is shared between workers.
+    """
+    name = 'memory'
+
+    def __init__(self, ttl_seconds=7 * 24 * 3600, max_entries=100_000, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (blob, meta, created_at)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        oldest = self._clock() - self.ttl_seconds
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] < oldest:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[0]
+        return {key: value for key, blob in found.items() if (value := _decoded(blob, key)) is not None}
+
+    def set_many(self, items):
+        now = self._clock()
+        encoded = [(key, encode(value), meta) for key, value, meta in items]
+        with self._lock:
+            for key, blob, meta in encoded:
+                self._entries.pop(key, None)
+                self._entries[key] = (blob, dict(meta or {}), now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def invalidate(self, parameter=None, model_version=None, older_than_seconds=None):
+        cutoff = None if older_than_seconds is None else self._clock() - older_than_seconds
+        with self._lock:
+            doomed = [
+                key for key, (_, meta, created_at) in self._entries.items()
+                if (parameter is None or meta.get('parameter') == parameter)
+                and (model_version is None or model_version in _model_versions(meta))
+                and (cutoff is None or created_at < cutoff)
+            ]
+            for key in doomed:
+                del self._entries[key]
+        return len(doomed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'bytes': sum(len(blob) for blob, _, _ in self._entries.values()),
+            }
+
+
+_SQLITE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        entry BLOB NOT NULL,
+        parameter TEXT,
+        model_version TEXT,
+        template_version TEXT,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS cache_entries_created_at ON cache_entries (created_at)",
+    "CREATE INDEX IF NOT EXISTS cache_entries_parameter_model ON cache_entries (parameter, model_version)",
+)
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on old builds
+_SQLITE_CHUNK = 500
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Single-file backend shared by every worker process on the host.
+
+    The database runs in WAL mode, so readers never block the (single) writer and
+    workers see each other's entries immediately. Each thread of each process opens
+    its own connection. Expired rows are filtered out on read and deleted at most
+    every purge_interval seconds during writes.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, ttl_seconds=7 * 24 * 3600,
+                 busy_timeout=5.0, purge_interval=300, clock=time.time):
+        self.path = str(path)
+        self.ttl_seconds = ttl_seconds
+        self.busy_timeout = busy_timeout
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # Never reuse a connection inherited across fork
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            for statement in _SQLITE_SCHEMA:
+                conn.execute(statement)
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def start(self):
+        self._conn()
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        oldest = self._clock() - self.ttl_seconds
+        found = {}
+        try:
+            conn = self._conn()
+            for i in range(0, len(keys), _SQLITE_CHUNK):
+                chunk = keys[i:i + _SQLITE_CHUNK]
+                rows = conn.execute(
+                    f"SELECT key, entry FROM cache_entries WHERE key IN ({','.join('?' * len(chunk))})"
+                    " AND created_at >= ?", (*chunk, oldest))
+                for key, blob in rows:
+                    if (value := _decoded(blob, key)) is not None:
+                        found[key] = value
+        except sqlite3.Error as e:
+            logger.error(f"Error retrieving from SQLite cache: {e}")
+        return found
+
+    def set_many(self, items):
+        now = self._clock()
+        rows = []
+        for key, value, meta in items:
+            meta = meta or {}
+            model_version = meta.get('modelVersion')
+            if isinstance(model_version, (list, tuple)):
+                model_version = ','.join(map(str, model_version))
+            rows.append((key, encode(value), meta.get('parameter'), model_version,
+                         meta.get('templateVersion'), now))
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache_entries"
+                " (key, entry, parameter, model_version, template_version, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows)
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                conn.execute("DELETE FROM cache_entries WHERE created_at < ?", (now - self.ttl_seconds,))
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            return conn.execute("DELETE FROM cache_entries").rowcount
+
+    def invalidate(self, parameter=None, model_version=None, older_than_seconds=None):
+        conditions, params = [], []
+        if parameter is not None:
+            conditions.append("parameter = ?")
+            params.append(parameter)
+        if model_version is not None:
+            # Report entries store their model versions comma-separated
+            conditions.append("instr(',' || model_version || ',', ?) > 0")
+            params.append(f",{model_version},")
+        if older_than_seconds is not None:
+            conditions.append("created_at < ?")
+            params.append(self._clock() - older_than_seconds)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self._conn()
+        with conn:
+            return conn.execute(f"DELETE FROM cache_entries{where}", params).rowcount
+
+    def stats(self):
+        stats = {'backend': self.name, 'path': self.path}
+        try:
+            count, size = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(entry)), 0) FROM cache_entries").fetchone()
+            stats.update(entries=count, bytes=size)
+        except sqlite3.Error as e:
+            stats['error'] = str(e)
+        return stats
+
+
+class MongoBackend(CacheBackend):
+    """MongoDB backend (see mongo_cache): lazy background connection behind a circuit breaker."""
+    name = 'mongo'
+
+    def __init__(self):
+        # Imported here so deployments on other backends don't need pymongo
+        import mongo_cache
+        self._mongo = mongo_cache
+
+    def start(self):
+        self._mongo.connect_in_background()
+
+    def wait_until_ready(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not self._mongo.is_available():
+            if time.monotonic() >= deadline:
+                return False
+            self._mongo.connect_in_background()
+            time.sleep(0.1)
+        return True
+
+    def get(self, key):
+        return self._mongo.get_cached_interpretation(key)
+
+    def get_many(self, keys):
+        return self._mongo.get_cached_interpretations(keys)
+
+    def set_many(self, items):
+        self._mongo.bulk_set_cached_interpretations(items)
+
+    def clear(self):
+        return self._mongo.invalidate_entries()
+
+    def invalidate(self, parameter=None, model_version=None, older_than_seconds=None):
+        return self._mongo.invalidate_entries(parameter, model_version, older_than_seconds)
+
+    def stats(self):
+        return {'backend': self.name, **self._mongo.connection_stats(), **self._mongo.collection_stats()}
+
+
+def create_backend(name=None):
+    """Build the backend named by `name` or XAI_CACHE_BACKEND (default 'mongo')."""
+    name = (name or os.environ.get('XAI_CACHE_BACKEND', 'mongo')).lower()
+    if name not in BACKENDS:
+        logger.warning(f"Unknown XAI_CACHE_BACKEND '{name}', using 'mongo'")
+        name = 'mongo'
+    ttl_seconds = int(os.environ.get('XAI_CACHE_BACKEND_TTL_SECONDS', 7 * 24 * 3600))
+    if name == 'sqlite':
+        return SQLiteBackend(os.environ.get('XAI_SQLITE_CACHE_PATH', DEFAULT_SQLITE_PATH), ttl_seconds)
+    if name == 'memory':
+        return MemoryBackend(ttl_seconds)
+    if name == 'none':
+        return CacheBackend()
+    return MongoBackend()
@@ -0,0 +1,109 @@
+"""
+Compact encoding of cached interpretations
+Template prose (intro, explanations, causes, recommendations, risk-assessment text) is
+identical for every patient with the same parameter and status, so stored entries
+reference it by ID from a shared text table and keep only the patient-specific parts;
+the result is zlib-compressed. decode() reassembles the exact original document.
+"""
+import hashlib
+import json
+import zlib
+
+from medical_text_generator import TEMPLATES, TEMPLATE_VERSION
+
+try:
+    from medical_text_templates_comprehensive import COMPREHENSIVE_TEMPLATES
+except ImportError:
+    COMPREHENSIVE_TEMPLATES = {}
+
+try:
+    from clinical_rules_fallback import RISK_RULES
+except ImportError:
+    RISK_RULES = None
+
+CODEC_VERSION = 1
+# Strings starting with this are references into TEXT_TABLE; a literal string that
+# starts with it is stored with the marker doubled
+_REF = "\x00"
+_HEADER_LENGTH = 13  # version byte + 12-char table id
+
+
+class CacheCodecError(ValueError):
+    """Entry was written by another codec or text table version."""
+
+
+def _collect_strings(value, out):
+    if isinstance(value, str):
+        out.append(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_strings(item, out)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _collect_strings(item, out)
+
+
+def build_text_table():
+    """
+    Every template string plus the literal risk-assessment prose of the risk rules
+    loaded at import, in a stable order. Only strings long enough to be worth a
+    reference are kept.
+    """
+    strings = []
+    _collect_strings(TEMPLATES, strings)
+    _collect_strings(COMPREHENSIVE_TEMPLATES, strings)
+    if RISK_RULES is not None:
+        _collect_strings(RISK_RULES.texts(), strings)
+    return tuple(dict.fromkeys(s for s in strings if len(s) > 8))
+
+
+TEXT_TABLE = build_text_table()
+TEXT_INDEX = {text: i for i, text in enumerate(TEXT_TABLE)}
+# Entries are only decoded against the exact table they were encoded with
+TABLE_ID = hashlib.sha256(
+    json.dumps([TEMPLATE_VERSION, TEXT_TABLE]).encode("utf-8")
+).hexdigest()[:12].encode("ascii")
+
+
+def _intern(value):
+    if isinstance(value, str):
+        index = TEXT_INDEX.get(value)
+        if index is not None:
+            return f"{_REF}{index:x}"
+        return _REF + value if value.startswith(_REF) else value
+    if isinstance(value, dict):
+        return {k: _intern(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_intern(v) for v in value]
+    return value
+
+
+def _expand(value):
+    if isinstance(value, str):
+        if not value.startswith(_REF):
+            return value
+        if value.startswith(_REF * 2):
+            return value[1:]
+        try:
+            return TEXT_TABLE[int(value[1:], 16)]
+        except (ValueError, IndexError):
+            raise CacheCodecError(f"Unknown text reference {value[1:]!r}")
+    if isinstance(value, dict):
+        return {k: _expand(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand(v) for v in value]
+    return value
+
+
+def encode(document) -> bytes:
+    """Header (codec version + table id) followed by the zlib-compressed, interned JSON."""
+    body = json.dumps(_intern(document), separators=(",", ":")).encode("utf-8")
+    return bytes([CODEC_VERSION]) + TABLE_ID + zlib.compress(body, 6)
+
+
+def decode(blob: bytes):
+    """Inverse of encode(). Raises CacheCodecError for entries from another version."""
+    blob = bytes(blob)
+    if len(blob) < _HEADER_LENGTH or blob[0] != CODEC_VERSION or blob[1:_HEADER_LENGTH] != TABLE_ID:
+        raise CacheCodecError("Cache entry was encoded with a different codec or text table")
+    return _expand(json.loads(zlib.decompress(blob[_HEADER_LENGTH:])))
@@ -0,0 +1,44 @@
+"""
+Canonical cache keys for the XAI service
+Requests are reduced to the inputs that can change their output, rounded and
+serialized deterministically, then hashed the same way for every cache tier.
+"""
+from hashlib import sha256
+import json
+import math
+
+# Bump when the canonical form changes so old entries are never matched
+KEY_VERSION = 1
+
+
+def round_numbers(obj, decimals):
+    """Round every float in a nested dict/list structure; booleans, ints and strings are kept."""
+    if isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return str(obj)
+        rounded = round(obj, decimals)
+        # Integral floats and ints must produce the same key (11.0 vs 11)
+        return int(rounded) if rounded.is_integer() else rounded
+    if isinstance(obj, bool) or obj is None or isinstance(obj, str):
+        return obj
+    if isinstance(obj, int):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): round_numbers(v, decimals) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [round_numbers(v, decimals) for v in obj]
+    try:
+        # numpy scalars and other numeric types
+        return round_numbers(float(obj), decimals)
+    except (TypeError, ValueError):
+        return str(obj)
+
+
+def canonical_json(obj):
+    """Deterministic JSON: sorted keys, no whitespace."""
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def hash_key(fields):
+    """sha256 of the canonical form of fields."""
+    return sha256(canonical_json({'v': KEY_VERSION, **fields}).encode("utf-8")).hexdigest()
@@ -0,0 +1,254 @@
+"""
+Cache pre-warming for the XAI service
+Replays a captured request log, or synthetic reports drawn from the training data
+distribution in data/, through the interpretation endpoints so the in-process and
+persistent caches are filled before live traffic arrives. Concurrency and request
+rate are bounded so warming never starves live requests.
+
+Run: python cache_warmer.py --log captured_requests.jsonl
+     python cache_warmer.py --synthetic 500 --concurrency 2 --rate 20
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent / "data"
+INTERPRET_PATH = '/api/v1/interpret'
+BATCH_PATH = '/api/v1/interpret/batch'
+WARMABLE_PATHS = (INTERPRET_PATH, BATCH_PATH)
+
+# Demographics and risk-factor columns of the training data (never lab values)
+PROFILE_COLUMNS = ('patientAge', 'patientGender', 'diabetic', 'pregnant', 'region', 'smoking')
+# The profile fields the frontend sends (services/xaiService.js); anything else would
+# change the cache key of a synthetic request
+FRONTEND_PROFILE_FIELDS = ('patientAge', 'patientGender', 'diabetic', 'pregnant')
+# Explanation options of frontend requests; part of the canonical cache key
+FRONTEND_OPTIONS = {'shap': True}
+
+
+def load_request_log(path, limit=None):
+    """
+    Yield (path, body) from a JSON-lines request log. Each line is either
+    {"path": ..., "body": {...}} or a bare request body; bare bodies with a
+    "parameters" list are batch requests. Unparseable lines are skipped.
+    """
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if limit is not None and count >= limit:
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed request log line {number}")
+                continue
+            if not isinstance(entry, dict):
+                continue
+            if 'body' in entry:
+                request_path, body = entry.get('path', INTERPRET_PATH), entry['body']
+            else:
+                request_path = BATCH_PATH if isinstance(entry.get('parameters'), list) else INTERPRET_PATH
+                body = entry
+            if request_path not in WARMABLE_PATHS or not isinstance(body, dict):
+                continue
+            count += 1
+            yield request_path, body
+
+
+def _ranges(config, gender):
+    if gender == 'Female' and 'female' in config:
+        return config['female']
+    if 'male' in config:
+        return config['male']
+    return config
+
+
+def _sample_from_thresholds(thresholds, rng):
+    """One synthetic patient: lab values spread around each reference range (a few outside it)."""
+    gender = rng.choices(['Male', 'Female', 'Other'], weights=[48, 48, 4])[0]
+    profile = {
+        'patientAge': rng.randint(18, 90),
+        'patientGender': gender,
+        'diabetic': rng.random() < 0.12,
+        'pregnant': gender == 'Female' and rng.random() < 0.03,
+    }
+    labs = {}
+    for parameter, config in thresholds.items():
+        ranges = _ranges(config, gender)
+        if 'low' not in ranges or 'high' not in ranges:
+            continue
+        low, high = ranges['low'], ranges['high']
+        value = rng.gauss((low + high) / 2, (high - low) / 3)
+        floor = ranges.get('critical_low', 0) * 0.8
+        ceiling = ranges.get('critical_high', high * 2)
+        labs[parameter] = round(min(max(value, floor, 0), ceiling), 1)
+    return profile, labs
+
+
+def _status(value, ranges):
+    """The lowercase status the frontend reports for a value (low / normal / high)."""
+    if value < ranges['low']:
+        return 'low'
+    if value > ranges['high']:
+        return 'high'
+    return 'normal'
+
+
+def _frontend_profile(profile):
+    # The frontend sends booleans for the flags; 1 and True are different cache keys
+    fields = {k: profile[k] for k in FRONTEND_PROFILE_FIELDS if k in profile}
+    for flag in ('diabetic', 'pregnant'):
+        if flag in fields:
+            fields[flag] = bool(fields[flag])
+    return fields
+
+
+def synthetic_requests(count, seed=0, data_dir=DATA_DIR, options=None):
+    """
+    Yield `count` batch requests, one synthetic patient report each. Rows are sampled
+    from data/comprehensive_training.csv when it exists; otherwise values are drawn
+    around the reference ranges in data/clinical_thresholds.json.
+
+    Entries carry what the frontend would send for the same report: its profile fields,
+    a low / normal / high status from the reference ranges, and its explanation options
+    (`options`, FRONTEND_OPTIONS by default), so the warmed entries are the ones live
+    /interpret requests look up.
+    """
+    options = FRONTEND_OPTIONS if options is None else options
+    data_dir = Path(data_dir)
+    with open(data_dir / "clinical_thresholds.json", encoding="utf-8") as f:
+        thresholds = json.load(f)
+    training = data_dir / "comprehensive_training.csv"
+    if training.exists():
+        import pandas as pd
+        frame = pd.read_csv(training)
+        rows = frame.sample(n=min(count, len(frame)), random_state=seed).to_dict('records')
+        samples = []
+        for row in rows:
+            profile = {k: row[k] for k in PROFILE_COLUMNS if k in row}
+            labs = {k: v for k, v in row.items()
+                    if k not in PROFILE_COLUMNS and isinstance(v, (int, float)) and v == v}
+            samples.append((profile, labs))
+    else:
+        rng = random.Random(seed)
+        samples = (_sample_from_thresholds(thresholds, rng) for _ in range(count))
+
+    for profile, labs in samples:
+        profile = _frontend_profile(profile)
+        ranges = {p: _ranges(config, profile.get('patientGender')) for p, config in thresholds.items()}
+        parameters = [
+            {'parameter': p, 'value': labs[p], 'status': _status(labs[p], ranges[p])}
+            for p in thresholds if p in labs and 'low' in ranges[p] and 'high' in ranges[p]
+        ]
+        if parameters:
+            yield BATCH_PATH, {**profile, **options, 'otherParameters': labs, 'parameters': parameters}
+
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart (no limit when rate is falsy)."""
+
+    def __init__(self, rate=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = self._clock()
+            if self._next is not None and self._next > now:
+                self._sleep(self._next - now)
+                now = self._next
+            self._next = now + self.interval
+
+
+def warm_cache(requests, send, concurrency=2, rate=None, limiter=None):
+    """
+    Send every (path, body) through send(path, body) -> HTTP status, with at most
+    `concurrency` requests in flight and at most `rate` requests per second.
+    Returns {'sent', 'ok', 'errors', 'seconds'}.
+    """
+    limiter = limiter or RateLimiter(rate)
+    slots = threading.BoundedSemaphore(concurrency)
+    lock = threading.Lock()
+    stats = {'sent': 0, 'ok': 0, 'errors': 0}
+    started = time.monotonic()
+
+    def run(path, body):
+        try:
+            ok = send(path, body) == 200
+        except Exception as e:
+            logger.warning(f"Cache warm-up request to {path} failed: {e}")
+            ok = False
+        finally:
+            slots.release()
+        with lock:
+            stats['ok' if ok else 'errors'] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='cache-warm') as pool:
+        for path, body in requests:
+            slots.acquire()
+            limiter.wait()
+            stats['sent'] += 1
+            pool.submit(run, path, body)
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    return stats
+
+
+def app_sender(flask_app, token):
+    """send() that runs requests in-process through the Flask app (and its caches)."""
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def send(path, body):
+        return flask_app.test_client().post(path, json=body, headers=headers).status_code
+    return send
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-warm the XAI interpretation caches")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--log', help="JSON-lines request log to replay")
+    source.add_argument('--synthetic', type=int, metavar='N', help="Number of synthetic reports to send")
+    parser.add_argument('--limit', type=int, help="Replay at most this many logged requests")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--options', type=json.loads, default=None,
+                        help=f"Explanation options of synthetic requests as JSON (default: {json.dumps(FRONTEND_OPTIONS)})")
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=None, help="Requests per second (default: unlimited)")
+    args = parser.parse_args(argv)
+
+    import app as xai_app
+    if xai_app.CACHE_BACKEND.name in ('memory', 'none'):
+        logger.warning(f"XAI_CACHE_BACKEND={xai_app.CACHE_BACKEND.name}: nothing outlives this process")
+    xai_app.CACHE_BACKEND.start()
+    if not xai_app.CACHE_BACKEND.wait_until_ready(timeout=30):
+        logger.error(f"Cache backend '{xai_app.CACHE_BACKEND.name}' is not reachable")
+        return 1
+    xai_app.start_warmup(background=False)
+
+    if args.log:
+        requests = load_request_log(args.log, args.limit)
+    else:
+        requests = synthetic_requests(args.synthetic, args.seed, options=args.options)
+    stats = warm_cache(requests, app_sender(xai_app.app, xai_app.DEV_AUTH_TOKEN), args.concurrency, args.rate)
+    xai_app.INTERPRETATION_CACHE.flush()
+    print(json.dumps({**stats, 'interpretationCache': xai_app.INTERPRETATION_CACHE.stats()}, indent=2))
+    return 0 if stats['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
@@ -4,8 +4,14 @@ Provides immediate interpretations using clinical thresholds when ML models are
 Covers all 79 parameters from comprehensive medical reports.
 """
 import json
+import logging
 from pathlib import Path
 
+import numpy as np
+
+from risk_rules import RiskRules
+from threshold_engine import ThresholdEngine
+
 ROOT = Path(__file__).resolve().parent
 DATA_DIR = ROOT / "data"
 
@@ -18,10 +24,53 @@ def load_clinical_thresholds():
     return {}
 
 THRESHOLDS = load_clinical_thresholds()
+# Compiled once; edit data/clinical_thresholds.json and call reload_thresholds() (or restart)
+THRESHOLD_ENGINE = ThresholdEngine(THRESHOLDS)
+
+
+def reload_thresholds():
+    """Re-read clinical_thresholds.json and swap in a freshly compiled engine."""
+    global THRESHOLDS, THRESHOLD_ENGINE
+    thresholds = load_clinical_thresholds()
+    engine = ThresholdEngine(thresholds)
+    THRESHOLDS, THRESHOLD_ENGINE = thresholds, engine
+    return engine
+
+
+def classify_by_threshold(value, param_name, gender=None, age=None, pregnant=False, diabetic=False):
+    """
+    Classify parameter value based on clinical thresholds (data/clinical_thresholds.json),
+    including its pregnancy, age and diabetes adjustments.
+    
+    Args:
+        value: numeric value
+        param_name: parameter name (e.g., 'hemoglobin_g_dL')
+        gender: 'Male' or 'Female'
+        age: patient age
+        pregnant: boolean
+        diabetic: boolean
+    
+    Returns:
+        (status_code, status_label)
+        status_code: 0=Normal, 1=Low, 2=High, 3=Critical
+    """
+    return THRESHOLD_ENGINE.classify(value, param_name, gender, age, pregnant, diabetic)
+
+
+def classify_many(values, parameters, genders=None, ages=None, pregnant=None, diabetic=None):
+    """
+    Classify arrays of values in one call (see ThresholdEngine.classify_many).
+    Returns (status_codes, labels) as NumPy arrays.
+    """
+    engine = THRESHOLD_ENGINE
+    status_codes, label_ids = engine.classify_many(values, parameters, genders, ages, pregnant, diabetic)
+    return status_codes, np.asarray(engine.labels, dtype=object)[label_ids]
+
 
-def classify_by_threshold(value, param_name, gender=None, age=None, pregnant=False):
+def classify_by_threshold_legacy(value, param_name, gender=None, age=None, pregnant=False):
     """
-    Classify parameter value based on clinical thresholds.
+    Original hard-coded classification chain, superseded by the threshold engine.
+    Kept as the reference for its equivalence tests and benchmark.
     
     Args:
         value: numeric value
@@ -384,9 +433,54 @@ def classify_by_threshold(value, param_name, gender=None, age=None, pregnant=Fal
         return (0, 'Normal')
 
 
+# Risk assessment rules; edit data/risk_rules.json and call reload_risk_rules() (or restart)
+RISK_RULES_PATH = DATA_DIR / 'risk_rules.json'
+RISK_RULES = RiskRules.from_file(RISK_RULES_PATH)
+
+
+def reload_risk_rules():
+    """
+    Recompile risk_rules.json if it changed on disk (by mtime, confirmed by content hash)
+    and swap it in. A file that fails to compile keeps the current rules.
+
+    Returns:
+        the new RiskRules, or None when nothing changed
+    """
+    global RISK_RULES
+    current = RISK_RULES
+    try:
+        if RISK_RULES_PATH.stat().st_mtime == current.mtime:
+            return None
+        rules = RiskRules.from_file(RISK_RULES_PATH)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Keeping risk rules {current.version}: {e}")
+        return None
+    changed = rules.version != current.version
+    RISK_RULES = rules
+    if not changed:
+        return None
+    logging.info(f"Swapped risk rules: {current.version} -> {rules.version}")
+    return rules
+
+
 def calculate_risk_assessments(patient_data):
     """
-    Calculate comprehensive health risk assessments based on all parameters.
+    Calculate comprehensive health risk assessments based on all parameters,
+    using the compiled rules from data/risk_rules.json.
+    
+    Args:
+        patient_data: dict with all patient parameters
+    
+    Returns:
+        dict with risk assessments
+    """
+    return RISK_RULES.evaluate(patient_data, classify_by_threshold)
+
+
+def calculate_risk_assessments_legacy(patient_data):
+    """
+    Original hand-written risk assessments, superseded by data/risk_rules.json.
+    Kept as the reference for the rules' equivalence tests and benchmark.
     
     Args:
         patient_data: dict with all patient parameters
@@ -596,7 +690,9 @@ def calculate_risk_assessments(patient_data):
         if '_status' in param:
             continue
         if param in ['hemoglobin_g_dL', 'wbc_10e9_L', 'platelet_count', 'rbc_count']:
-            status_code, _ = classify_by_threshold(value, param, gender, age)
+            status_code, _ = classify_by_threshold(value, param, gender, age,
+                                                   patient_data.get('pregnant', False),
+                                                   patient_data.get('diabetic', False))
             if status_code == 3:
                 critical_count += 1
             elif status_code in [1, 2]:
@@ -0,0 +1,44 @@
+"""
+Cohort-scale risk assessments
+Columnar counterpart of clinical_rules_fallback.calculate_risk_assessments: takes a
+DataFrame or a dict of equal-length columns (one row per patient) and evaluates the
+current risk rules (data/risk_rules.json) for all rows with NumPy masks. The result
+holds state codes and factor bitmasks; prose is only built when a row is rendered, and
+render(i) returns exactly what calculate_risk_assessments returns for that patient.
+
+Missing columns, None and NaN all count as an absent field (0 for lab values, 'Male'
+for patientGender), as with the dict lookups of the scalar version.
+"""
+import clinical_rules_fallback
+
+
+def risk_columns():
+    """Every field the current rules read."""
+    return clinical_rules_fallback.RISK_RULES.inputs
+
+
+def columns_from_records(records, columns=None):
+    """
+    Struct-of-arrays view of a list of patient dicts: {column: [value or None, ...]}.
+    Lab values nested under 'otherParameters' (as the frontend sends them) are read
+    too; a top-level field of the same name wins, as it does for the scalar
+    calculate_risk_assessments.
+    """
+    others = [r.get('otherParameters') if isinstance(r.get('otherParameters'), dict) else {} for r in records]
+    return {
+        column: [record.get(column, other.get(column)) for other, record in zip(others, records)]
+        for column in (columns or risk_columns())
+    }
+
+
+def assess_cohort(patients):
+    """
+    Risk assessments (a risk_rules.RiskResults) for every row of `patients`: a DataFrame,
+    or a dict of equal-length columns keyed by field name (see columns_from_records).
+    """
+    return clinical_rules_fallback.RISK_RULES.evaluate_many(patients, clinical_rules_fallback.THRESHOLD_ENGINE)
+
+
+def codebook():
+    """Labels for the codes in RiskResults.to_compact()."""
+    return clinical_rules_fallback.RISK_RULES.codebook()
@@ -0,0 +1,121 @@
+"""
+Native tree explanations for the XAI service
+Exact TreeSHAP contributions straight from the LightGBM / XGBoost booster,
+without constructing a shap explainer.
+"""
+import numpy as np
+import pandas as pd
+
+# Explanation engines selectable per request ("explain" field)
+EXPLAIN_MODES = ('native', 'shap', 'none')
+
+# Baselines for the perturbation explainer: all zeros, or the training medians saved in the bundle
+PERTURBATION_BASELINES = ('zero', 'median')
+
+# How much explanation a request asks for ("explainLevel" or the legacy "shap" flag), cheapest first:
+#   none - status and confidence only
+#   topk - top feature importances
+#   full - plus the per-feature SHAP vector and individual contributions
+#   path - plus the decision path / raw tree contributions
+EXPLAIN_LEVELS = ('none', 'topk', 'full', 'path')
+
+
+def level_includes(level, required):
+    """True when explanation level `level` includes everything `required` does."""
+    return EXPLAIN_LEVELS.index(level) >= EXPLAIN_LEVELS.index(required)
+
+
+class NativeContributionsUnavailable(Exception):
+    """Raised when a model has no native contribution API (e.g. scikit-learn forests)."""
+
+
+def class_index_for(record, prediction):
+    """Position of an (original) predicted class in the model's probability/contribution output."""
+    if record.reverse_mapping:
+        for mapped, original in record.reverse_mapping.items():
+            if int(original) == int(prediction):
+                return int(mapped)
+    return int(prediction)
+
+
+def _split_contributions(raw, n_rows, n_feat):
+    """
+    Normalize booster contribution output to (n_rows, n_classes, n_feat + 1).
+    The last column of every block is the bias (expected value).
+    """
+    raw = np.asarray(raw, dtype=np.float64)
+    if raw.ndim == 3:
+        return raw
+    if raw.ndim == 2 and raw.shape[1] == n_feat + 1:
+        # Binary model: contributions are for the positive class; class 0 is the mirror image
+        return np.stack([-raw, raw], axis=1)
+    if raw.ndim == 2 and raw.shape[1] % (n_feat + 1) == 0:
+        # LightGBM multiclass: class blocks laid out side by side
+        return raw.reshape(n_rows, raw.shape[1] // (n_feat + 1), n_feat + 1)
+    raise ValueError(f"Unexpected contribution shape: {raw.shape}")
+
+
+def native_contributions(model, X):
+    """
+    Per-class TreeSHAP contributions computed by the booster itself.
+
+    Returns:
+        array of shape (n_rows, n_classes, n_features + 1); last column is the bias term
+    """
+    n_rows, n_feat = X.shape
+    try:
+        from lightgbm import LGBMModel
+        if isinstance(model, LGBMModel):
+            return _split_contributions(model.predict(X, pred_contrib=True), n_rows, n_feat)
+    except ImportError:
+        pass
+    if hasattr(model, 'get_booster'):
+        import xgboost as xgb
+        booster = model.get_booster()
+        dmatrix = xgb.DMatrix(np.asarray(X, dtype=np.float64), feature_names=booster.feature_names)
+        return _split_contributions(booster.predict(dmatrix, pred_contribs=True), n_rows, n_feat)
+    raise NativeContributionsUnavailable(f"{type(model).__name__} has no native contribution API")
+
+
+def top_feature_importances(feature_names, class_shap, top_k=5, threshold=0.01):
+    """Same feature_importances contract as the SHAP path: |impact| > threshold, largest first."""
+    importances = [
+        {
+            "feature": fname,
+            "impact": float(impact),
+            "direction": "increases" if impact > 0 else "decreases"
+        }
+        for fname, impact in zip(feature_names, class_shap)
+        if abs(impact) > threshold
+    ]
+    return sorted(importances, key=lambda x: abs(x['impact']), reverse=True)[:top_k]
+
+
+def perturbation_baseline(record, feature_names, kind='zero'):
+    """Baseline value per feature: zeros, or the bundle's training medians (zero where a median is missing)."""
+    if kind == 'median' and record.feature_medians:
+        return np.array([float(record.feature_medians.get(f, 0.0)) for f in feature_names])
+    return np.zeros(len(feature_names))
+
+
+def perturbation_contributions(model, X, class_index, baseline):
+    """
+    Change in the class probability when each feature alone is set to its baseline.
+
+    Row 0 of the (n_features + 1) perturbation matrix is the input itself and row i + 1
+    has feature i replaced by baseline[i]; the whole matrix is scored with a single
+    predict_proba call.
+
+    Returns:
+        array of shape (n_features,): proba(input) - proba(input with feature i at baseline)
+    """
+    row = np.asarray(X, dtype=np.float64)[0]
+    n_feat = row.shape[0]
+    matrix = np.repeat(row[None, :], n_feat + 1, axis=0)
+    idx = np.arange(n_feat)
+    matrix[idx + 1, idx] = baseline
+    # Keep column names so sklearn-style models can validate the feature order
+    if isinstance(X, pd.DataFrame):
+        matrix = pd.DataFrame(matrix, columns=X.columns)
+    proba = model.predict_proba(matrix)[:, class_index]
+    return proba[0] - proba[1:]
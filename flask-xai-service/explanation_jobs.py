@@ -0,0 +1,101 @@
+"""
+Background explanation jobs for the XAI service
+Runs SHAP / perturbation work off the request path in a bounded thread pool and
+keeps recent results in memory until clients fetch them.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExplanationJob:
+    """State of one explanation: 'pending', 'done' or 'error'."""
+    status: str = 'pending'
+    result: Any = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+    done_event: threading.Event = field(default_factory=threading.Event)
+
+
+class ExplanationJobs:
+    """
+    Bounded pool of explanation workers keyed by a deterministic job id.
+
+    The pool is created on first submit (after a prefork server has forked). Submitting
+    an id that is already pending or done is a no-op, so identical requests share one
+    job. When max_pending jobs are queued, submit() refuses and the caller computes the
+    explanation inline instead. Only the newest max_finished results are kept here;
+    on_done(job_id, result) is the hook for persisting them elsewhere.
+    """
+
+    def __init__(self, max_workers=2, max_pending=64, max_finished=1000, on_done=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.on_done = on_done
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, fn):
+        """Schedule fn() as job_id. Returns False when the queue is full."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != 'error':
+                return True
+            if self._pending >= self.max_pending:
+                logger.warning(f"Explanation queue full ({self._pending} pending), not scheduling {job_id[:12]}")
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='explain')
+            job = ExplanationJob()
+            self._jobs[job_id] = job
+            self._pending += 1
+        self._executor.submit(self._run, job_id, job, fn)
+        return True
+
+    def _run(self, job_id, job, fn):
+        try:
+            job.result = fn()
+            job.status = 'done'
+            if self.on_done is not None:
+                try:
+                    self.on_done(job_id, job.result)
+                except Exception as e:
+                    logger.warning(f"Could not persist explanation {job_id[:12]}: {e}")
+        except Exception as e:
+            logger.exception(f"Explanation job {job_id[:12]} failed")
+            job.error = str(e)
+            job.status = 'error'
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                self._pending -= 1
+                self._trim()
+            job.done_event.set()
+
+    def _trim(self):
+        # Forget the oldest finished jobs beyond max_finished (pending jobs are never dropped)
+        finished = [k for k, j in self._jobs.items() if j.status != 'pending']
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[key]
+
+    def get(self, job_id, wait=0):
+        """Return the ExplanationJob for job_id (None if unknown), waiting up to `wait` seconds for it to finish."""
+        job = self._jobs.get(job_id)
+        if job is not None and wait and job.status == 'pending':
+            job.done_event.wait(wait)
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {'pending': self._pending, 'stored': len(self._jobs), 'workers': self.max_workers}
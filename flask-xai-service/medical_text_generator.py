@@ -31,6 +31,7 @@ Output format matches parameterInterpretations.js structure:
   }
 }
 """
+import hashlib
 import json
 from pathlib import Path
 
@@ -623,7 +624,19 @@ TEMPLATES = {
     }
 }
 
-def generate_interpretation(parameter_name, value, prediction_status, confidence=0.9, feature_importances=None, patient_data=None):
+
+def compute_template_version():
+    """Short content hash of every template; changes whenever any template text changes."""
+    templates = {"legacy": TEMPLATES}
+    if USE_COMPREHENSIVE_TEMPLATES:
+        templates["comprehensive"] = COMPREHENSIVE_TEMPLATES
+    payload = json.dumps(templates, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+# Cached interpretations are tagged with this so template edits invalidate them
+TEMPLATE_VERSION = compute_template_version()
+
+def generate_interpretation(parameter_name, value, prediction_status, confidence=0.9, feature_importances=None, patient_data=None, risk_assessments=None):
     """
     Generate full medical interpretation for a parameter.
     
@@ -634,6 +647,7 @@ def generate_interpretation(parameter_name, value, prediction_status, confidence
         confidence: model confidence (0-1)
         feature_importances: list of dicts with feature contributions
         patient_data: dict with all patient parameters for risk assessment
+        risk_assessments: precomputed risk assessments (skips recomputing from patient_data)
     
     Returns:
         dict matching frontend contract with risk assessments
@@ -722,8 +736,10 @@ def generate_interpretation(parameter_name, value, prediction_status, confidence
             "diseaseConditions": template.get("disease_conditions", [])
         }
     
-    # Add risk assessments if patient_data provided
-    if patient_data and USE_CLINICAL_FALLBACK:
+    # Add risk assessments if precomputed or patient_data provided
+    if risk_assessments is not None:
+        output["riskAssessments"] = risk_assessments
+    elif patient_data and USE_CLINICAL_FALLBACK:
         try:
             output["riskAssessments"] = calculate_risk_assessments(patient_data)
         except Exception as e:
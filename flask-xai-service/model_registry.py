@@ -0,0 +1,160 @@
+"""
+Model registry for the XAI service
+Loads each models/<key>_model.joblib bundle exactly once and keeps its metadata
+"""
+from dataclasses import dataclass, replace
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import io
+import logging
+import threading
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelRecord:
+    """A loaded model bundle and the metadata saved alongside it by the training scripts."""
+    key: str
+    model: Any
+    model_type: Optional[str]
+    feature_names: Optional[List[str]]
+    reverse_mapping: Optional[Dict[int, int]]
+    original_classes: Optional[List[int]]
+    feature_medians: Optional[Dict[str, float]]
+    path: Path
+    file_hash: str
+    mtime: float
+
+    @property
+    def is_lightgbm(self):
+        return self.model_type == 'LightGBM'
+
+
+def load_model_record(key, path, raw=None, mtime=None):
+    """Read a bundle from disk once, hashing the same bytes that are unpickled."""
+    path = Path(path)
+    if raw is None:
+        mtime = path.stat().st_mtime
+        raw = path.read_bytes()
+    model_data = joblib.load(io.BytesIO(raw))
+
+    # Bundle could be just the model or a dict with model + mapping + feature_names
+    if isinstance(model_data, dict) and 'model' in model_data:
+        model = model_data['model']
+        meta = model_data
+    else:
+        model = model_data
+        meta = {}
+
+    return ModelRecord(
+        key=key,
+        model=model,
+        model_type=meta.get('model_type'),
+        feature_names=meta.get('feature_names'),
+        reverse_mapping=meta.get('reverse_mapping'),
+        original_classes=meta.get('original_classes'),
+        feature_medians=meta.get('feature_medians'),
+        path=path,
+        file_hash=sha256(raw).hexdigest(),
+        mtime=mtime,
+    )
+
+
+class ModelRegistry:
+    """Thread-safe, load-once cache of ModelRecords keyed by model file key."""
+
+    def __init__(self, models_dir):
+        self.models_dir = Path(models_dir)
+        self._records = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._reload_lock = threading.Lock()
+
+    def path_for(self, key):
+        return self.models_dir / f"{key}_model.joblib"
+
+    def available_keys(self):
+        """Model keys for every bundle present on disk."""
+        return sorted(p.name[:-len("_model.joblib")] for p in self.models_dir.glob("*_model.joblib"))
+
+    def loaded_keys(self):
+        return list(self._records.keys())
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """Return the ModelRecord for key, loading it on first use. None if no bundle exists."""
+        record = self._records.get(key)
+        if record is not None:
+            return record
+        # Per-key lock: concurrent first requests load a bundle once, different bundles load in parallel
+        with self._key_lock(key):
+            # Another thread may have loaded it while we waited
+            record = self._records.get(key)
+            if record is not None:
+                return record
+            path = self.path_for(key)
+            if not path.exists():
+                return None
+            record = load_model_record(key, path)
+            with self._lock:
+                self._records[key] = record
+            logger.info(f"Loaded model '{key}' ({record.model_type or 'unknown type'}, {record.file_hash[:12]})")
+            return record
+
+    def records(self):
+        """Snapshot of the currently loaded records."""
+        return list(self._records.values())
+
+    def current_hash(self, key):
+        """File hash of the version of key being served now; None if it isn't loaded."""
+        record = self._records.get(key)
+        return record.file_hash if record is not None else None
+
+    def reload_changed(self, warm=None):
+        """
+        Reload loaded bundles whose file changed on disk and swap them in atomically.
+
+        Changes are detected by mtime and confirmed by file hash. The new model is loaded
+        and passed to warm(record) outside the registry lock; only the final dict
+        assignment swaps it in. Requests that already hold the old record keep using it
+        until they finish. A bundle that fails to load or warm (e.g. still being written)
+        keeps the old version and is retried on the next call.
+
+        Returns:
+            list of (old_record, new_record) for every swapped model
+        """
+        swapped = []
+        with self._reload_lock:
+            for key, current in list(self._records.items()):
+                path = self.path_for(key)
+                try:
+                    mtime = path.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if mtime == current.mtime:
+                    continue
+                try:
+                    raw = path.read_bytes()
+                    if sha256(raw).hexdigest() == current.file_hash:
+                        # Touched but unchanged: remember the new mtime, keep the model
+                        with self._lock:
+                            self._records[key] = replace(current, mtime=mtime)
+                        continue
+                    record = load_model_record(key, path, raw=raw, mtime=mtime)
+                    if warm is not None:
+                        warm(record)
+                except Exception as e:
+                    logger.warning(f"Reload of model '{key}' failed, keeping {current.file_hash[:12]}: {e}")
+                    continue
+                with self._lock:
+                    self._records[key] = record
+                swapped.append((current, record))
+                logger.info(f"Swapped model '{key}': {current.file_hash[:12]} -> {record.file_hash[:12]}")
+        return swapped
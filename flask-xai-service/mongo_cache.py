@@ -1,13 +1,18 @@
 """
 MongoDB cache for XAI interpretations
-Handles caching of interpretation results to reduce computation
+Handles caching of interpretation results to reduce computation. The connection is
+opened lazily in a background thread and guarded by a circuit breaker, so an
+unreachable MongoDB never blocks startup or requests; calls just miss until it's back.
 """
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-from hashlib import sha256
-import json
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
+from datetime import datetime, timedelta, timezone
 import os
 import logging
+import threading
+import time
+
+from cache_codec import CacheCodecError, decode, encode
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,124 +22,339 @@ logger = logging.getLogger(__name__)
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = os.environ.get("XAI_CACHE_DB", "xai_cache_db")
 COLLECTION_NAME = os.environ.get("XAI_CACHE_COLLECTION", "interpretation_cache")
+# Entries expire this long after they were written (TTL index on createdAt)
+CACHE_TTL_SECONDS = int(os.environ.get("XAI_MONGO_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# Server selection / socket timeout for every MongoDB call
+MONGO_TIMEOUT_MS = int(os.environ.get("XAI_MONGO_TIMEOUT_MS", 2000))
+# Seconds between connection attempts while MongoDB is unreachable
+RECONNECT_INTERVAL_SECONDS = float(os.environ.get("XAI_MONGO_RECONNECT_SECONDS", 10))
+# After this many consecutive failed calls, skip MongoDB for the cooldown
+BREAKER_THRESHOLD = int(os.environ.get("XAI_MONGO_BREAKER_FAILURES", 3))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("XAI_MONGO_BREAKER_COOLDOWN_SECONDS", 30))
+# Store results as compressed, template-by-reference blobs (see cache_codec)
+COMPACT_ENTRIES = os.environ.get("XAI_COMPACT_CACHE_ENTRIES", "true").lower() == "true"
+
+
+class CacheUnavailable(ConnectionError):
+    """MongoDB is not connected yet or the breaker is open; nothing was written."""
+
+
+def ensure_indexes(coll):
+    """
+    Create the TTL index on createdAt (or update its expiry if it changed) and drop
+    entries written before entries carried a createdAt date; those can never expire.
+    """
+    try:
+        coll.create_index("createdAt", name="createdAt_ttl", expireAfterSeconds=CACHE_TTL_SECONDS)
+    except OperationFailure:
+        # Index exists with a different expireAfterSeconds
+        coll.database.command("collMod", coll.name,
+                              index={"name": "createdAt_ttl", "expireAfterSeconds": CACHE_TTL_SECONDS})
+    coll.create_index([("parameter", 1), ("modelVersion", 1)], name="parameter_modelVersion")
+    legacy = coll.delete_many({"createdAt": {"$exists": False}})
+    if legacy.deleted_count:
+        logger.info(f"Removed {legacy.deleted_count} legacy cache entries without createdAt")
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `threshold` failures in a row the breaker opens and allow() answers False for
+    `cooldown` seconds, so a degraded MongoDB costs a clock read instead of a timeout.
+    Once the cooldown passes a single trial call is let through (half-open): success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold=3, cooldown=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.trips = 0
+        self.skipped = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self.trial else 'open'
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and self._clock() - self.opened_at >= self.cooldown:
+                self.trial = True
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = self._clock()
+                self.trial = False
 
-# Initialize MongoDB client with connection pooling
-try:
-    client = MongoClient(
-        MONGO_URI,
-        serverSelectionTimeoutMS=5000,  # 5 second timeout
-        connectTimeoutMS=5000,
-        maxPoolSize=10
-    )
-    # Test connection
-    client.admin.command('ping')
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
-    # Create index on _id for faster lookups
-    collection.create_index("_id", unique=True)
-    MONGO_AVAILABLE = True
-    logger.info(f"✓ MongoDB connected successfully to {DB_NAME}.{COLLECTION_NAME}")
-except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-    logger.warning(f"⚠ MongoDB not available: {e}. Caching disabled.")
-    MONGO_AVAILABLE = False
-    client = None
-    db = None
-    collection = None
-except Exception as e:
-    logger.error(f"❌ MongoDB connection error: {e}. Caching disabled.")
-    MONGO_AVAILABLE = False
-    client = None
-    db = None
-    collection = None
-
-
-def make_cache_key(payload: dict) -> str:
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures, 'trips': self.trips, 'skipped': self.skipped}
+
+
+BREAKER = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+
+# Connection state. Nothing connects at import: the client is created on first use in a
+# background thread, in the process that uses it (never inherited across a fork).
+client = None
+collection = None
+_client_pid = None
+_connect_lock = threading.Lock()
+_connecting = False
+_last_attempt = None
+
+
+def _connect():
+    global client, collection, _client_pid, _connecting, _last_attempt
+    new_client = None
+    try:
+        new_client = MongoClient(
+            MONGO_URI,
+            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_TIMEOUT_MS,
+            maxPoolSize=10
+        )
+        # Test connection
+        new_client.admin.command('ping')
+        coll = new_client[DB_NAME][COLLECTION_NAME]
+        try:
+            ensure_indexes(coll)
+        except Exception as e:
+            logger.warning(f"⚠ Could not create cache indexes: {e}. Entries will not expire.")
+        client, collection, _client_pid = new_client, coll, os.getpid()
+        BREAKER.record_success()
+        logger.info(f"✓ MongoDB connected successfully to {DB_NAME}.{COLLECTION_NAME}")
+    except Exception as e:
+        if isinstance(e, (ConnectionFailure, ServerSelectionTimeoutError)):
+            logger.warning(f"⚠ MongoDB not available: {e}. Retrying in {RECONNECT_INTERVAL_SECONDS:g}s.")
+        else:
+            logger.error(f"❌ MongoDB connection error: {e}. Retrying in {RECONNECT_INTERVAL_SECONDS:g}s.")
+        if new_client is not None:
+            # Stop its background monitor threads
+            new_client.close()
+    finally:
+        with _connect_lock:
+            _connecting = False
+            _last_attempt = time.monotonic()
+
+
+def connect_in_background():
     """
-    Generate a cache key from payload.
-    Only uses relevant fields to avoid cache misses from extra metadata.
+    Start connecting unless a connection exists, an attempt is running, or the last
+    attempt failed less than RECONNECT_INTERVAL_SECONDS ago. Never blocks.
     """
-    # Extract only relevant fields for caching
-    cache_fields = {
-        'parameter': payload.get('parameter', ''),
-        'value': payload.get('value', 0),
-        'patientAge': payload.get('patientAge', 0),
-        'patientGender': payload.get('patientGender', ''),
-        'diabetic': payload.get('diabetic', False),
-        'pregnant': payload.get('pregnant', False),
+    global _connecting, client, collection, _client_pid
+    with _connect_lock:
+        if _client_pid is not None and _client_pid != os.getpid():
+            # Forked from a connected parent: pymongo clients are not fork-safe, start over
+            client, collection, _client_pid = None, None, None
+        if collection is not None or _connecting:
+            return
+        if _last_attempt is not None and time.monotonic() - _last_attempt < RECONNECT_INTERVAL_SECONDS:
+            return
+        _connecting = True
+    threading.Thread(target=_connect, name="mongo-connect", daemon=True).start()
+
+
+def _collection():
+    """The collection to use now, or None while (re)connecting or while the breaker is open."""
+    if collection is None or _client_pid != os.getpid():
+        connect_in_background()
+        return None
+    if not BREAKER.allow():
+        return None
+    return collection
+
+
+def is_available():
+    return collection is not None and _client_pid == os.getpid() and BREAKER.state == 'closed'
+
+
+def connection_stats():
+    return {
+        'connected': collection is not None and _client_pid == os.getpid(),
+        'connecting': _connecting,
+        'breaker': BREAKER.stats(),
     }
-    
-    # Add otherParameters if present
-    if 'otherParameters' in payload:
-        cache_fields['otherParameters'] = payload['otherParameters']
-    
-    payload_str = json.dumps(cache_fields, sort_keys=True)
-    return sha256(payload_str.encode("utf-8")).hexdigest()
 
 
-def get_cached_interpretation(payload: dict):
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _fresh_filter(key) -> dict:
+    # key is an _id or an _id condition such as {"$in": [...]}
+    # The TTL monitor only runs once a minute; never return an entry past its expiry
+    return {"_id": key, "createdAt": {"$gte": _now() - timedelta(seconds=CACHE_TTL_SECONDS)}}
+
+
+def _entry_fields(result: dict, meta: dict = None) -> dict:
+    """Document body: the result, its version tags and a real BSON date for the TTL index."""
+    fields = {"entry": encode(result)} if COMPACT_ENTRIES else {"result": result}
+    fields["createdAt"] = _now()
+    for name in ("parameter", "modelVersion", "templateVersion"):
+        if meta and meta.get(name) is not None:
+            fields[name] = meta[name]
+    return fields
+
+
+def _result(doc):
+    """The stored result of a cache document, or None if it can't be decoded here."""
+    if "entry" not in doc:
+        return doc.get("result")
+    try:
+        return decode(doc["entry"])
+    except (CacheCodecError, ValueError) as e:
+        logger.debug(f"Ignoring cache entry {str(doc.get('_id'))[:16]}: {e}")
+        return None
+
+
+def get_cached_interpretation(key: str):
     """
     Retrieve cached interpretation if available.
-    Returns None if not found or if MongoDB is unavailable.
+    key is the canonical request key (see app.interpretation_cache_key); it includes
+    the model and template versions, so entries from older versions never match.
+    Returns None if not found, expired, or if MongoDB is unavailable (not yet
+    connected or circuit breaker open).
     """
-    if not MONGO_AVAILABLE or collection is None:
+    coll = _collection()
+    if coll is None:
         return None
     
     try:
-        key = make_cache_key(payload)
-        doc = collection.find_one({"_id": key})
+        doc = coll.find_one(_fresh_filter(key))
+        BREAKER.record_success()
         if doc:
             logger.info(f"✓ Cache HIT for key: {key[:16]}...")
-            return doc.get("result")
+            return _result(doc)
         else:
             logger.debug(f"Cache MISS for key: {key[:16]}...")
             return None
     except Exception as e:
+        BREAKER.record_failure()
         logger.error(f"Error retrieving from cache: {e}")
         return None
 
 
-def set_cached_interpretation(payload: dict, result: dict):
+def get_cached_interpretations(keys):
+    """
+    Retrieve many cached interpretations in one round-trip.
+    Returns {key: result} for the keys found (empty if MongoDB is unavailable).
+    """
+    if not keys:
+        return {}
+    coll = _collection()
+    if coll is None:
+        return {}
+
+    try:
+        query = _fresh_filter({"$in": list(keys)})
+        docs = coll.find(query, {"result": 1, "entry": 1})
+        found = {doc["_id"]: result for doc in docs if (result := _result(doc)) is not None}
+        BREAKER.record_success()
+        logger.info(f"✓ Cache bulk lookup: {len(found)}/{len(keys)} hits")
+        return found
+    except Exception as e:
+        BREAKER.record_failure()
+        logger.error(f"Error retrieving from cache: {e}")
+        return {}
+
+
+def bulk_set_cached_interpretations(items):
     """
-    Store interpretation result in cache.
-    Silently fails if MongoDB is unavailable.
+    Store many (key, result, meta) entries in one unordered bulk_write round-trip.
+    Raises on failure, or CacheUnavailable when MongoDB can't be used right now, so
+    the write-behind queue can count the batch instead of treating it as flushed.
     """
-    if not MONGO_AVAILABLE or collection is None:
+    if not items:
         return
-    
+    coll = _collection()
+    if coll is None:
+        raise CacheUnavailable(f"MongoDB unavailable, {len(items)} cache entries not written")
     try:
-        key = make_cache_key(payload)
-        collection.update_one(
-            {"_id": key},
-            {"$set": {
-                "result": result,
-                "timestamp": {"$currentDate": {"lastModified": True}}
-            }},
-            upsert=True
-        )
-        logger.debug(f"✓ Cached result for key: {key[:16]}...")
+        coll.bulk_write([
+            UpdateOne({"_id": key}, {"$set": _entry_fields(result, meta)}, upsert=True)
+            for key, result, meta in items
+        ], ordered=False)
+    except Exception:
+        BREAKER.record_failure()
+        raise
+    BREAKER.record_success()
+    logger.debug(f"✓ Cached {len(items)} results in one bulk write")
+
+
+def invalidate_entries(parameter=None, model_version=None, older_than_seconds=None):
+    """
+    Delete the entries matching every given criterion (admin function).
+    A model version also matches report documents that include it.
+    Returns the number deleted, or None if MongoDB is unavailable.
+    """
+    query = {}
+    if parameter is not None:
+        query["parameter"] = parameter
+    if model_version is not None:
+        query["modelVersion"] = model_version
+    if older_than_seconds is not None:
+        query["createdAt"] = {"$lt": _now() - timedelta(seconds=older_than_seconds)}
+    coll = _collection()
+    if coll is None:
+        logger.warning("MongoDB not available, cannot invalidate cache entries")
+        return None
+
+    try:
+        result = coll.delete_many(query)
+        BREAKER.record_success()
+        logger.info(f"✓ Invalidated {result.deleted_count} cached entries matching {query}")
+        return result.deleted_count
     except Exception as e:
-        logger.error(f"Error storing in cache: {e}")
+        BREAKER.record_failure()
+        logger.error(f"Error invalidating cache entries: {e}")
+        return None
 
 
-def clear_cache():
-    """Clear all cached interpretations (admin function)"""
-    if not MONGO_AVAILABLE or collection is None:
-        logger.warning("MongoDB not available, cannot clear cache")
-        return False
-    
+def collection_stats():
+    """Entry count and data size of the cache collection ({} if MongoDB is unavailable)."""
+    coll = _collection()
+    if coll is None:
+        return {}
+
     try:
-        result = collection.delete_many({})
-        logger.info(f"✓ Cleared {result.deleted_count} cached interpretations")
-        return True
+        storage = next(coll.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+        BREAKER.record_success()
+        return {"entries": storage.get("count"), "bytes": storage.get("size")}
     except Exception as e:
-        logger.error(f"Error clearing cache: {e}")
-        return False
+        BREAKER.record_failure()
+        logger.error(f"Error reading cache collection stats: {e}")
+        return {}
 
 
 # Graceful shutdown
 def close_connection():
     """Close MongoDB connection"""
-    if client:
+    # A forked child must not close the client it inherited from its parent
+    if client and _client_pid == os.getpid():
         client.close()
         logger.info("MongoDB connection closed")
 
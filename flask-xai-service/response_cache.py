@@ -0,0 +1,108 @@
+"""
+In-process response cache for the XAI service
+Bounded, thread-safe LRU cache with TTL expiry that stores serialized response bytes
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of bytes values.
+
+    Bounded both by entry count and by total stored bytes; the least recently used
+    entries are evicted first. Expiry uses a monotonic clock, so wall-clock changes
+    never resurrect or prematurely expire entries. Expired entries are dropped when
+    looked up or when they reach the LRU end during eviction.
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=64 * 1024 * 1024, ttl_seconds=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if self._clock() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store bytes under key. Values larger than the whole byte budget are not cached."""
+        size = len(value)
+        if size > self.max_bytes:
+            return False
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                if self._clock() >= self._entries[oldest][1]:
+                    self.expirations += 1
+                else:
+                    self.evictions += 1
+                self._remove(oldest)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return count
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxEntries': self.max_entries,
+                'maxBytes': self.max_bytes,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,729 @@
+"""
+Declarative risk-assessment rules
+Compiles data/risk_rules.json into two evaluators that return exactly what the
+hand-written calculate_risk_assessments did:
+    evaluate(patient)      one patient dict -> risk dict; a Python function generated
+                           from the rules, so it runs like hand-written code
+    evaluate_many(columns) a DataFrame or dict of columns -> RiskResults of state
+                           codes and factor bitmasks, built from NumPy masks; prose is
+                           only produced by RiskResults.render()
+
+Rule file format
+    fields    defaults of patient fields that are missing (every other field defaults to 0)
+    counts    name -> {"parameters": [...], "status": [...]}: how many of the listed
+              parameters the patient has whose threshold status (clinical_thresholds.json,
+              adjusted for patientGender / patientAge / pregnant / diabetic) is in status
+    sections  name -> {
+        "define": {name: expression}     values computed before the section's rules
+        "state":  {name: initial value}  values the rules set
+        "rules":  [rule, ...]            applied in order
+        "output": {key: output}}         the section's result, in key order
+    rule      {"when": expression, "set": {state: value}, "factors": [template, ...]}
+              or {"first": [rule, ...]}, where only the first matching rule applies.
+              A set value may be a transition map {"from": "to", "*": "to"}: it changes
+              the state from its current value; values without an entry (and no "*")
+              are kept.
+    output    a state name | "factors" | {"value": json} | {"text": template}
+              | {"cases": [{"when": expression, "value": json}, ..., {"value": json}]}
+
+Expressions use Python syntax restricted to names, numbers, strings, comparisons,
+and / or / not, + - * / and `a if test else b`. Names resolve to the section's state,
+then its defines, then counts, then patient fields. Templates are str.format strings
+over the same names. In evaluate_many, None and NaN count as a missing field.
+"""
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from string import Formatter
+import ast
+import copy
+import json
+import keyword
+
+import numpy as np
+
+# Demographics passed to the threshold engine for counts
+DEMOGRAPHIC_FIELDS = ('patientGender', 'patientAge', 'pregnant', 'diabetic')
+
+_EXPRESSION_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare, ast.Eq, ast.NotEq, ast.Lt,
+    ast.LtE, ast.Gt, ast.GtE, ast.IfExp, ast.Name, ast.Load, ast.Constant,
+)
+_BINARY_OPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide}
+_COMPARE_OPS = {ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less, ast.LtE: np.less_equal,
+                ast.Gt: np.greater, ast.GtE: np.greater_equal}
+
+
+class RiskRulesError(ValueError):
+    """The rule file is malformed."""
+
+
+def _check_name(name, where):
+    # Names end up in the generated source of the scalar evaluator
+    if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name):
+        raise RiskRulesError(f"{where}: invalid name {name!r}")
+    return name
+
+
+def _parse_expression(text, where):
+    try:
+        tree = ast.parse(str(text), mode='eval')
+    except SyntaxError as e:
+        raise RiskRulesError(f"{where}: invalid expression {text!r}: {e.msg}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _EXPRESSION_NODES):
+            raise RiskRulesError(f"{where}: {type(node).__name__} is not allowed in {text!r}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str, bool)):
+            raise RiskRulesError(f"{where}: constant {node.value!r} is not allowed in {text!r}")
+    return tree
+
+
+def _template_names(template, where):
+    names = []
+    try:
+        parts = list(Formatter().parse(template))
+    except ValueError as e:
+        raise RiskRulesError(f"{where}: invalid template {template!r}: {e}") from None
+    for _, field, _, _ in parts:
+        if field is None:
+            continue
+        if not field.isidentifier() or keyword.iskeyword(field):
+            raise RiskRulesError(f"{where}: template fields must be plain names, got {{{field}}}")
+        names.append(field)
+    return names
+
+
+def _truthy(value):
+    if isinstance(value, np.ndarray):
+        return value if value.dtype == bool else value != 0
+    return bool(value)
+
+
+@dataclass
+class _Rule:
+    condition: ast.Expression
+    sets: dict          # state -> value or transition map
+    factors: list       # factor occurrence indices into _Section.factors
+
+
+@dataclass
+class _Section:
+    name: str
+    index: int
+    defines: dict       # name -> expression
+    state: dict         # name -> initial value
+    vocab: dict         # state name -> tuple of every value it can take
+    rules: list         # _Rule, or list of _Rule for a "first" group
+    factors: list       # factor templates, one per occurrence
+    output: list        # (key, kind, spec)
+
+    def resolve(self, name, counts):
+        if name in self.state:
+            return f"s{self.index}_{name}"
+        if name in self.defines:
+            return f"d{self.index}_{name}"
+        if name in counts:
+            return f"c_{name}"
+        return f"f_{name}"
+
+
+class RiskRules:
+    """A compiled rule file. Build with from_file() or RiskRules(document)."""
+
+    def __init__(self, document, version=None, mtime=None):
+        self.document = document
+        self.version = version or sha256(json.dumps(document, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self.mtime = mtime
+        self.field_defaults = dict(document.get('fields') or {})
+        self.counts = {}
+        for name, spec in (document.get('counts') or {}).items():
+            _check_name(name, "counts")
+            if not spec.get('parameters'):
+                raise RiskRulesError(f"counts.{name}: needs a parameters list")
+            parameters = tuple(_check_name(p, f"counts.{name}.parameters") for p in spec['parameters'])
+            self.counts[name] = (parameters, tuple(int(s) for s in spec.get('status', ())))
+        self.sections = [
+            self._parse_section(name, i, spec)
+            for i, (name, spec) in enumerate((document.get('sections') or {}).items())
+        ]
+        if not self.sections:
+            raise RiskRulesError("the rule file defines no sections")
+        self.inputs = self._collect_inputs()
+        self.source = self._scalar_source()
+        namespace = {'CONSTANTS': self._constants}
+        try:
+            code = compile(self.source, f"<risk rules {self.version}>", 'exec')
+        except (SyntaxError, ValueError) as e:
+            raise RiskRulesError(f"the rules do not compile: {e}") from None
+        exec(code, namespace)
+        self._evaluate = namespace['evaluate']
+
+    @classmethod
+    def from_file(cls, path):
+        path = Path(path)
+        raw = path.read_bytes()
+        try:
+            document = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise RiskRulesError(f"{path.name}: {e}") from None
+        return cls(document, version=sha256(raw).hexdigest()[:12], mtime=path.stat().st_mtime)
+
+    # Parsing
+
+    def _parse_section(self, name, index, spec):
+        where = f"sections.{name}"
+        section = _Section(
+            name=name, index=index,
+            defines={key: _parse_expression(expr, f"{where}.define.{key}")
+                     for key, expr in (spec.get('define') or {}).items()},
+            state=dict(spec.get('state') or {}),
+            vocab={}, rules=[], factors=[], output=[],
+        )
+        for key in list(section.defines) + list(section.state):
+            if _check_name(key, where) == 'factors':
+                raise RiskRulesError(f"{where}: invalid name {key!r}")
+        vocab = {key: [value] for key, value in section.state.items()}
+
+        def parse_rule(rule, rule_where):
+            if 'when' not in rule:
+                raise RiskRulesError(f"{rule_where}: a rule needs 'when'")
+            sets = dict(rule.get('set') or {})
+            for key, value in sets.items():
+                if key not in section.state:
+                    raise RiskRulesError(f"{rule_where}: '{key}' is not in the section state")
+                targets = value.values() if isinstance(value, dict) else [value]
+                for target in targets:
+                    if target not in vocab[key]:
+                        vocab[key].append(target)
+            factors = []
+            for template in rule.get('factors') or []:
+                _template_names(template, rule_where)
+                factors.append(len(section.factors))
+                section.factors.append(template)
+            return _Rule(_parse_expression(rule['when'], rule_where), sets, factors)
+
+        for i, rule in enumerate(spec.get('rules') or []):
+            rule_where = f"{where}.rules[{i}]"
+            if 'first' in rule:
+                section.rules.append([parse_rule(r, f"{rule_where}.first[{j}]") for j, r in enumerate(rule['first'])])
+            else:
+                section.rules.append(parse_rule(rule, rule_where))
+        section.vocab = {key: tuple(values) for key, values in vocab.items()}
+
+        for key, out in (spec.get('output') or {}).items():
+            out_where = f"{where}.output.{key}"
+            if out == 'factors':
+                section.output.append((key, 'factors', None))
+            elif isinstance(out, str):
+                if out not in section.state:
+                    raise RiskRulesError(f"{out_where}: '{out}' is not in the section state")
+                section.output.append((key, 'state', out))
+            elif isinstance(out, dict) and 'value' in out:
+                section.output.append((key, 'value', out['value']))
+            elif isinstance(out, dict) and 'text' in out:
+                _template_names(out['text'], out_where)
+                section.output.append((key, 'text', out['text']))
+            elif isinstance(out, dict) and 'cases' in out:
+                cases = []
+                for j, case in enumerate(out['cases']):
+                    condition = _parse_expression(case['when'], f"{out_where}.cases[{j}]") if 'when' in case else None
+                    cases.append((condition, case.get('value')))
+                section.output.append((key, 'cases', cases))
+            else:
+                raise RiskRulesError(f"{out_where}: unknown output {out!r}")
+        return section
+
+    def _section_rules(self, section):
+        for rule in section.rules:
+            yield from (rule if isinstance(rule, list) else [rule])
+
+    def _collect_inputs(self):
+        """Patient fields the rules read, in first-use order."""
+        fields = {}
+
+        def add_expression(tree, section):
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Name) and section.resolve(node.id, self.counts).startswith('f_'):
+                    fields.setdefault(node.id)
+
+        def add_template(template, section):
+            for name in _template_names(template, section.name):
+                if section.resolve(name, self.counts).startswith('f_'):
+                    fields.setdefault(name)
+
+        for section in self.sections:
+            for tree in section.defines.values():
+                add_expression(tree, section)
+            for rule in self._section_rules(section):
+                add_expression(rule.condition, section)
+            for template in section.factors:
+                add_template(template, section)
+            for _, kind, spec in section.output:
+                if kind == 'text':
+                    add_template(spec, section)
+                elif kind == 'cases':
+                    for condition, _ in spec:
+                        if condition is not None:
+                            add_expression(condition, section)
+        if self.counts:
+            for name in DEMOGRAPHIC_FIELDS:
+                fields.setdefault(name)
+            for parameters, _ in self.counts.values():
+                for name in parameters:
+                    fields.setdefault(name)
+        return tuple(fields)
+
+    def default(self, field):
+        return self.field_defaults.get(field, 0)
+
+    # Scalar evaluator: generated Python source
+
+    def _scalar_source(self):
+        self._constants = []
+
+        def constant(value, shared=False):
+            if isinstance(value, (str, int, float, bool)) or value is None:
+                return repr(value)
+            self._constants.append(value)
+            reference = f"CONSTANTS[{len(self._constants) - 1}]"
+            if shared:
+                return reference
+            # Results get their own copies, so callers may modify them
+            flat = all(isinstance(v, (str, int, float, bool)) or v is None
+                       for v in (value.values() if isinstance(value, dict) else value))
+            return f"{reference}.copy()" if flat else f"deepcopy({reference})"
+
+        def expression(tree, section):
+            class Rename(ast.NodeTransformer):
+                def visit_Name(self_, node):
+                    return ast.copy_location(ast.Name(id=section.resolve(node.id, self.counts), ctx=ast.Load()), node)
+            return ast.unparse(Rename().visit(copy.deepcopy(tree.body)))
+
+        def template(text, section):
+            names = dict.fromkeys(_template_names(text, section.name))
+            if not names:
+                return repr(text.replace('{{', '{').replace('}}', '}'))
+            arguments = ', '.join(f"{name}={section.resolve(name, self.counts)}" for name in names)
+            return f"{text!r}.format({arguments})"
+
+        lines = [
+            "from copy import deepcopy",
+            "",
+            "def evaluate(patient, classify):",
+            "    get = patient.get",
+        ]
+        lines += [f"    f_{name} = get({name!r}, {constant(self.default(name))})" for name in self.inputs]
+        if self.counts:
+            lines += [f"    c_{name} = 0" for name in self.counts]
+            parameters = dict.fromkeys(p for params, _ in self.counts.values() for p in params)
+            for parameter in parameters:
+                lines += [
+                    f"    if {parameter!r} in patient:",
+                    f"        status = classify(f_{parameter}, {parameter!r}, f_patientGender, f_patientAge, "
+                    f"f_pregnant, f_diabetic)[0]",
+                ]
+                for name, (params, statuses) in self.counts.items():
+                    if parameter in params:
+                        lines += [f"        if status in {statuses!r}:", f"            c_{name} += 1"]
+        lines.append("    result = {}")
+
+        for section in self.sections:
+            i = section.index
+            for name, tree in section.defines.items():
+                lines.append(f"    d{i}_{name} = {expression(tree, section)}")
+            for name, value in section.state.items():
+                lines.append(f"    s{i}_{name} = {constant(value)}")
+            lines.append(f"    factors{i} = []")
+
+            def emit(rule, keyword, indent='    '):
+                lines.append(f"{indent}{keyword} {expression(rule.condition, section)}:")
+                body = indent + '    '
+                for name, value in rule.sets.items():
+                    target = f"s{i}_{name}"
+                    if isinstance(value, dict):
+                        mapping = {k: v for k, v in value.items() if k != '*'}
+                        fallback = constant(value['*']) if '*' in value else target
+                        lines.append(f"{body}{target} = {constant(mapping, shared=True)}.get({target}, {fallback})")
+                    else:
+                        lines.append(f"{body}{target} = {constant(value)}")
+                for k in rule.factors:
+                    lines.append(f"{body}factors{i}.append({template(section.factors[k], section)})")
+                if not rule.sets and not rule.factors:
+                    lines.append(f"{body}pass")
+
+            for rule in section.rules:
+                if isinstance(rule, list):
+                    for j, member in enumerate(rule):
+                        emit(member, 'if' if j == 0 else 'elif')
+                else:
+                    emit(rule, 'if')
+
+            items = []
+            for key, kind, spec in section.output:
+                if kind == 'factors':
+                    value = f"factors{i}"
+                elif kind == 'state':
+                    value = f"s{i}_{spec}"
+                elif kind == 'value':
+                    value = constant(spec)
+                elif kind == 'text':
+                    value = template(spec, section)
+                else:
+                    value = 'None'
+                    for condition, case_value in reversed(spec):
+                        if condition is None:
+                            value = constant(case_value)
+                        else:
+                            value = f"({constant(case_value)} if {expression(condition, section)} else {value})"
+                items.append(f"{key!r}: {value}")
+            lines.append(f"    result[{section.name!r}] = {{{', '.join(items)}}}")
+        lines.append("    return result")
+        return "\n".join(lines) + "\n"
+
+    def evaluate(self, patient, classify):
+        """Risk dict for one patient; classify is classify_by_threshold (used by counts)."""
+        return self._evaluate(patient, classify)
+
+    # Vectorized evaluator: closures over NumPy arrays
+
+    def _vector_expression(self, tree, section):
+        counts = self.counts
+
+        def build(node):
+            if isinstance(node, ast.Constant):
+                value = node.value
+                return lambda env: value
+            if isinstance(node, ast.Name):
+                key = section.resolve(node.id, counts)
+                if key.startswith('s'):
+                    values = np.asarray(section.vocab[node.id], dtype=object)
+                    return lambda env: values[env[key]]
+                return lambda env: env[key]
+            if isinstance(node, ast.BoolOp):
+                operands = [build(v) for v in node.values]
+                combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+                return lambda env: combine.reduce([np.broadcast_to(_truthy(f(env)), (env['n'],)) for f in operands])
+            if isinstance(node, ast.UnaryOp):
+                operand = build(node.operand)
+                if isinstance(node.op, ast.Not):
+                    return lambda env: np.logical_not(_truthy(operand(env)))
+                if isinstance(node.op, ast.USub):
+                    return lambda env: np.negative(operand(env))
+                return operand
+            if isinstance(node, ast.BinOp):
+                left, right, op = build(node.left), build(node.right), _BINARY_OPS[type(node.op)]
+                return lambda env: op(left(env), right(env))
+            if isinstance(node, ast.IfExp):
+                test, body, orelse = build(node.test), build(node.body), build(node.orelse)
+                return lambda env: np.where(_truthy(test(env)), body(env), orelse(env))
+            if isinstance(node, ast.Compare):
+                return compare(node)
+            raise RiskRulesError(f"unsupported expression node {type(node).__name__}")
+
+        def compare(node):
+            # State compared with a constant: compare the codes
+            if (len(node.ops) == 1 and isinstance(node.ops[0], (ast.Eq, ast.NotEq))
+                    and isinstance(node.left, ast.Name) and isinstance(node.comparators[0], ast.Constant)
+                    and section.resolve(node.left.id, counts).startswith('s')):
+                key = section.resolve(node.left.id, counts)
+                vocab = section.vocab[node.left.id]
+                value = node.comparators[0].value
+                code = vocab.index(value) if value in vocab else -1
+                op = _COMPARE_OPS[type(node.ops[0])]
+                return lambda env: op(env[key], code)
+            operands = [build(node.left)] + [build(c) for c in node.comparators]
+            ops = [_COMPARE_OPS[type(op)] for op in node.ops]
+
+            def evaluate(env):
+                values = [f(env) for f in operands]
+                result = ops[0](values[0], values[1])
+                for op, left, right in zip(ops[1:], values[1:], values[2:]):
+                    result = result & op(left, right)
+                return result
+            return evaluate
+
+        return build(tree.body)
+
+    def _compiled_vector(self):
+        compiled = getattr(self, '_vector', None)
+        if compiled is not None:
+            return compiled
+        compiled = []
+        for section in self.sections:
+            rules = []
+            for rule in section.rules:
+                members = rule if isinstance(rule, list) else [rule]
+                group = []
+                for member in members:
+                    sets = []
+                    for name, value in member.sets.items():
+                        vocab = section.vocab[name]
+                        if isinstance(value, dict):
+                            fallback = value.get('*')
+                            table = np.array([
+                                vocab.index(value[v]) if v in value else
+                                vocab.index(fallback) if '*' in value else code
+                                for code, v in enumerate(vocab)
+                            ], dtype=np.int16)
+                            sets.append((f"s{section.index}_{name}", table))
+                        else:
+                            sets.append((f"s{section.index}_{name}", vocab.index(value)))
+                    group.append((self._vector_expression(member.condition, section), sets, member.factors))
+                rules.append((isinstance(rule, list), group))
+            outputs = []
+            for key, kind, spec in section.output:
+                if kind == 'cases':
+                    spec = [(self._vector_expression(c, section) if c is not None else None, v) for c, v in spec]
+                outputs.append((key, kind, spec))
+            defines = {f"d{section.index}_{name}": self._vector_expression(tree, section)
+                       for name, tree in section.defines.items()}
+            compiled.append((section, defines, rules, outputs))
+        self._vector = compiled
+        return compiled
+
+    def _columns(self, patients):
+        """(raw columns for rendering, evaluation arrays with defaults filled in, n)."""
+        if hasattr(patients, 'columns') and hasattr(patients, 'to_numpy'):
+            columns = {name: patients[name].to_numpy() for name in self.inputs if name in patients.columns}
+            n = len(patients)
+        else:
+            columns = {name: patients[name] for name in self.inputs if name in patients}
+            n = len(next(iter(patients.values()))) if len(patients) else 0
+        env = {'n': n}
+        raw_numbers = {}
+        for name in self.inputs:
+            default = self.default(name)
+            column = columns.get(name)
+            if isinstance(default, str):
+                values = np.full(n, default, dtype=object)
+                if column is not None:
+                    column = np.asarray(column, dtype=object)
+                    missing = np.array([v is None or (isinstance(v, float) and v != v) for v in column], dtype=bool)
+                    values = np.where(missing, default, column)
+                env[f"f_{name}"] = values
+                continue
+            numbers = _numeric(column, n)
+            raw_numbers[name] = numbers
+            env[f"f_{name}"] = np.where(np.isnan(numbers), float(default), numbers)
+        return columns, env, raw_numbers, n
+
+    def evaluate_many(self, patients, engine):
+        """
+        Risk assessments of every row of `patients` (a DataFrame or a dict of equal-length
+        columns keyed by field name); engine is the ThresholdEngine used by counts.
+        """
+        columns, env, raw_numbers, n = self._columns(patients)
+
+        counts = {}
+        if self.counts:
+            genders = engine.gender_codes(env['f_patientGender'])
+            pregnant, diabetic = _truthy(env['f_pregnant']), _truthy(env['f_diabetic'])
+            for name in self.counts:
+                counts[name] = np.zeros(n, dtype=np.int16)
+            parameters = dict.fromkeys(p for params, _ in self.counts.values() for p in params)
+            for parameter in parameters:
+                if parameter not in columns:
+                    continue
+                values = raw_numbers[parameter]
+                status, _ = engine.classify_many(values, parameter, genders, raw_numbers['patientAge'],
+                                                 pregnant, diabetic)
+                present = ~np.isnan(values)
+                for name, (params, statuses) in self.counts.items():
+                    if parameter in params:
+                        counts[name] += present & np.isin(status, statuses)
+            env.update({f"c_{name}": values for name, values in counts.items()})
+
+        state, factors, cases, defines = {}, {}, {}, {}
+        for section, section_defines, rules, outputs in self._compiled_vector():
+            for key, fn in section_defines.items():
+                env[key] = np.broadcast_to(fn(env), (n,))
+                defines[key] = env[key]
+            for name, value in section.state.items():
+                env[f"s{section.index}_{name}"] = np.full(n, section.vocab[name].index(value), dtype=np.int16)
+            bits = np.zeros(n, dtype=_bits_dtype(len(section.factors)))
+            for is_group, group in rules:
+                taken = np.zeros(n, dtype=bool) if is_group else None
+                for condition, sets, rule_factors in group:
+                    mask = np.broadcast_to(_truthy(condition(env)), (n,))
+                    if taken is not None:
+                        mask = mask & ~taken
+                        taken |= mask
+                    for key, value in sets:
+                        codes = env[key]
+                        env[key] = np.where(mask, value[codes] if isinstance(value, np.ndarray) else value, codes)
+                    for k in rule_factors:
+                        bits |= mask.astype(bits.dtype) << bits.dtype.type(k)
+            state[section.name] = {name: env[f"s{section.index}_{name}"] for name in section.state}
+            factors[section.name] = bits
+            for key, kind, spec in outputs:
+                if kind != 'cases':
+                    continue
+                index = np.full(n, -1, dtype=np.int8)
+                for j in reversed(range(len(spec))):
+                    condition = spec[j][0]
+                    match = np.ones(n, dtype=bool) if condition is None else np.broadcast_to(_truthy(condition(env)), (n,))
+                    index = np.where(match, j, index)
+                cases[(section.name, key)] = index.astype(np.int8)
+
+        return RiskResults(self, n, state, factors, counts, cases, defines,
+                           {name: columns.get(name) for name in self.inputs})
+
+    def codebook(self):
+        """Labels for the codes in RiskResults.to_compact()."""
+        return {
+            'state': {s.name: {name: list(vocab) for name, vocab in s.vocab.items()} for s in self.sections},
+            'factors': {s.name: list(s.factors) for s in self.sections},
+            'counts': list(self.counts),
+        }
+
+    def texts(self):
+        """Every fixed string a result can contain (state values, literal factors and outputs), in rule order."""
+        texts = []
+
+        def add(value):
+            if isinstance(value, str):
+                texts.append(value)
+            elif isinstance(value, dict):
+                for item in value.values():
+                    add(item)
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    add(item)
+
+        def add_template(template, section):
+            if not _template_names(template, section.name):
+                texts.append(template.replace('{{', '{').replace('}}', '}'))
+
+        for section in self.sections:
+            add(section.vocab)
+            for template in section.factors:
+                add_template(template, section)
+            for _, kind, spec in section.output:
+                if kind == 'value':
+                    add(spec)
+                elif kind == 'text':
+                    add_template(spec, section)
+                elif kind == 'cases':
+                    add([value for _, value in spec])
+        return list(dict.fromkeys(texts))
+
+
+def _numeric(column, n):
+    """float64 array of a column; NaN where the value is missing or not a number."""
+    if column is None:
+        return np.full(n, np.nan)
+    try:
+        return np.asarray(column, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.empty(n, dtype=np.float64)
+        for i, v in enumerate(column):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+        return out
+
+
+def _bits_dtype(count):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if count <= np.iinfo(dtype).bits:
+            return dtype
+    raise RiskRulesError(f"a section may list at most 64 factors, not {count}")
+
+
+def _fresh(value):
+    if isinstance(value, list):
+        return [_fresh(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _fresh(v) for k, v in value.items()}
+    return value
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+@dataclass
+class RiskResults:
+    """Cohort risk assessments as state codes (see RiskRules.codebook) and factor bitmasks."""
+    rules: RiskRules
+    n: int
+    # section -> state name -> int16 codes into the state's vocabulary
+    state: dict
+    # section -> bitmask over the section's factor templates
+    factors: dict
+    # count name -> int16 counts
+    counts: dict
+    # (section, output key) -> index of the matching case (-1: none)
+    cases: dict
+    # define key -> values, for templates that use them
+    defines: dict
+    # the input columns, kept to format factor text
+    columns: dict
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def levels(self):
+        """section -> codes of its first state value (its level, type or category)."""
+        return {section: next(iter(values.values())) for section, values in self.state.items() if values}
+
+    def _names(self, i):
+        """Every name a template or output of row i can refer to, keyed like the generated code."""
+        names = {}
+        for name, column in self.columns.items():
+            value = None if column is None else column[i]
+            names[f"f_{name}"] = self.rules.default(name) if _missing(value) else value
+        for name, values in self.counts.items():
+            names[f"c_{name}"] = int(values[i])
+        for key, values in self.defines.items():
+            names[key] = values[i]
+        for section in self.rules.sections:
+            for name, codes in self.state[section.name].items():
+                names[f"s{section.index}_{name}"] = section.vocab[name][codes[i]]
+        return names
+
+    def _format(self, template, section, names):
+        return template.format(**{
+            name: names[section.resolve(name, self.rules.counts)]
+            for name in _template_names(template, section.name)
+        })
+
+    def render(self, i):
+        """The risk dict of row i, as RiskRules.evaluate would return it."""
+        result = {}
+        names = self._names(i)
+        for section in self.rules.sections:
+            mask = int(self.factors[section.name][i])
+            out = {}
+            for key, kind, spec in section.output:
+                if kind == 'factors':
+                    out[key] = [self._format(template, section, names)
+                                for k, template in enumerate(section.factors) if mask >> k & 1]
+                elif kind == 'state':
+                    out[key] = names[f"s{section.index}_{spec}"]
+                elif kind == 'value':
+                    out[key] = _fresh(spec)
+                elif kind == 'text':
+                    out[key] = self._format(spec, section, names)
+                else:
+                    case = int(self.cases[(section.name, key)][i])
+                    out[key] = _fresh(spec[case][1]) if case >= 0 else None
+            result[section.name] = out
+        return result
+
+    def render_all(self, rows=None):
+        """render() for every row (or the given row indices)."""
+        return [self.render(i) for i in (range(self.n) if rows is None else rows)]
+
+    def to_compact(self):
+        """JSON-friendly codes: decode with RiskRules.codebook()."""
+        return {
+            'levels': {section: codes.tolist() for section, codes in self.levels.items()},
+            'state': {section: {name: codes.tolist() for name, codes in values.items()}
+                      for section, values in self.state.items()},
+            'factors': {section: masks.tolist() for section, masks in self.factors.items()},
+            'counts': {name: values.tolist() for name, values in self.counts.items()},
+        }
@@ -0,0 +1,79 @@
+"""
+Benchmark cohort risk screening (cohort_risk.assess_cohort) against calculate_risk_assessments
+Times the columnar assessments on a synthetic cohort and extrapolates the per-report
+scalar function (compiled rules and the hand-written legacy version) from a sample.
+
+Run: python scripts/benchmark_cohort_risk.py [--reports 100000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from clinical_rules_fallback import calculate_risk_assessments, calculate_risk_assessments_legacy
+from cohort_risk import assess_cohort
+
+
+def synthetic_cohort(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'patientAge': rng.integers(18, 90, n),
+        'patientGender': rng.choice(np.array(['Male', 'Female'], dtype=object), n),
+        'smoking': rng.random(n) < 0.2,
+        'pregnant': rng.random(n) < 0.02,
+        'diabetic': rng.random(n) < 0.1,
+        'neutrophil_lymphocyte_ratio': rng.gamma(4, 0.6, n),
+        'rdw_percent': rng.normal(13.5, 1.2, n).round(1),
+        'random_blood_sugar_mg_dL': rng.normal(120, 40, n).round(),
+        'hba1c_percent': rng.normal(5.6, 0.8, n).round(1),
+        'wbc_10e9_L': rng.normal(7.5, 2.5, n).round(1),
+        'neutrophils_percent': rng.normal(60, 10, n).round(1),
+        'crp_mg_L': rng.gamma(1.5, 3, n).round(1),
+        'esr_mm_hr': rng.gamma(2, 8, n).round(),
+        'hemoglobin_g_dL': rng.normal(13.5, 1.8, n).round(1),
+        'mcv_fL': rng.normal(88, 8, n).round(1),
+        'mch_pg': rng.normal(29, 3, n).round(1),
+        'ferritin_ng_mL': rng.gamma(2, 50, n).round(),
+        'platelet_count': rng.normal(260, 80, n).round(),
+        'hematocrit_percent': rng.normal(42, 5, n).round(1),
+        'rbc_count': rng.normal(4.8, 0.6, n).round(2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reports', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    cohort = synthetic_cohort(args.reports)
+    start = time.perf_counter()
+    risk = assess_cohort(cohort)
+    columnar = time.perf_counter() - start
+    high = int(np.count_nonzero(risk.levels['cardiovascularRisk'] == 2))
+    print(f"Columnar: {args.reports} reports in {columnar:.3f}s ({high} with high cardiovascular risk)")
+
+    sample = min(args.reports, 10_000)
+    rows = [{name: column[i].item() if hasattr(column[i], 'item') else column[i] for name, column in cohort.items()}
+            for i in range(sample)]
+    for label, function in [('Scalar', calculate_risk_assessments), ('Legacy', calculate_risk_assessments_legacy)]:
+        start = time.perf_counter()
+        for row in rows:
+            function(row)
+        scalar = (time.perf_counter() - start) * args.reports / sample
+        print(f"{label + ':':9} ~{scalar:.3f}s (extrapolated from {sample} reports, {scalar / columnar:.0f}x slower)")
+
+    start = time.perf_counter()
+    risk.render_all(range(sample))
+    render = time.perf_counter() - start
+    print(f"Render:   {sample} rows in {render:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Benchmark the table-driven threshold engine against the original if/elif chain
+Checks both give identical output on a random sample of values, then times them,
+along with the vectorized classify_many over the same sample.
+
+Run: python scripts/benchmark_thresholds.py [--samples 200000]
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from clinical_rules_fallback import THRESHOLDS, THRESHOLD_ENGINE, classify_by_threshold, classify_by_threshold_legacy
+
+
+def make_samples(n, seed=42):
+    """(value, parameter, gender) triples spread over 0 .. 1.5x each parameter's largest bound."""
+    rng = random.Random(seed)
+    params = list(THRESHOLDS)
+    samples = []
+    for _ in range(n):
+        param = rng.choice(params)
+        spec = THRESHOLDS[param]
+        spec = spec.get(rng.choice(['male', 'female']), spec)
+        bounds = [b.get('below', b.get('upTo', 0)) for b in spec.get('bands', [])] or \
+                 [spec.get(k, 0) for k in ('critical_low', 'low', 'high', 'critical_high')]
+        samples.append((round(rng.uniform(0, max(bounds) * 1.5 or 1), 2), param, rng.choice(['Male', 'Female'])))
+    return samples
+
+
+def time_it(fn, samples, repeat=5):
+    """Best of `repeat` passes over samples, so one noisy pass doesn't decide the comparison."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value, param, gender in samples:
+            fn(value, param, gender)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--samples', type=int, default=200_000)
+    args = parser.parse_args()
+
+    samples = make_samples(args.samples)
+    legacy_params = {p for p in THRESHOLDS if p not in ('neutrophils_abs', 'lymphocytes_abs')}
+    mismatches = [
+        s for s in samples
+        if s[1] in legacy_params and classify_by_threshold(*s) != classify_by_threshold_legacy(*s)
+    ]
+    print(f"Samples: {len(samples)}, mismatches: {len(mismatches)}")
+    for value, param, gender in mismatches[:10]:
+        print(f"  {param} {gender} {value}: engine {classify_by_threshold(value, param, gender)} "
+              f"!= legacy {classify_by_threshold_legacy(value, param, gender)}")
+
+    legacy = time_it(classify_by_threshold_legacy, samples)
+    engine = time_it(classify_by_threshold, samples)
+    direct = time_it(THRESHOLD_ENGINE.classify, samples)
+    per = 1e9 / len(samples)
+    print(f"Legacy chain: {legacy:.3f}s ({legacy * per:.0f} ns/call)")
+    print(f"Engine:       {engine:.3f}s ({engine * per:.0f} ns/call, {legacy / engine:.2f}x)")
+    print(f"  unwrapped:  {direct:.3f}s ({direct * per:.0f} ns/call, {legacy / direct:.2f}x)")
+
+    # Cohort callers code parameters and genders once; time the classification itself
+    values, params, genders = (list(column) for column in zip(*samples))
+    codes, gender_codes = THRESHOLD_ENGINE.parameter_codes(params), THRESHOLD_ENGINE.gender_codes(genders)
+    start = time.perf_counter()
+    status, label_ids = THRESHOLD_ENGINE.classify_many(values, codes, gender_codes)
+    many = time.perf_counter() - start
+    labels = [THRESHOLD_ENGINE.labels[i] for i in label_ids.tolist()]
+    vector_mismatches = sum(
+        (s, l) != classify_by_threshold(*sample) for s, l, sample in zip(status.tolist(), labels, samples))
+    print(f"classify_many: {many:.3f}s ({many * per:.0f} ns/value, {legacy / many:.1f}x), "
+          f"mismatches: {vector_mismatches}")
+    return 1 if mismatches or vector_mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
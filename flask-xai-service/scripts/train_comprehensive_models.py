@@ -280,7 +280,9 @@ def train_parameter_model(param_name, train_df, holdout_df, label_col):
         'model': model,
         'reverse_mapping': reverse_mapping,
         'original_classes': sorted(y_train.unique().tolist()),
-        'feature_names': feature_cols
+        'feature_names': feature_cols,
+        # Perturbation explainer baseline (XAI_PERTURBATION_BASELINE=median)
+        'feature_medians': {col: float(v) for col, v in X_train_median.fillna(0).items()}
     }
     joblib.dump(model_data, model_path, compress=3, protocol=4)
     print(f"[OK] Saved: {model_path.name}")
@@ -172,7 +172,9 @@ def train_lightgbm_model(param_name, label_col, training_df, holdout_df):
         'feature_names': feature_cols,
         'reverse_mapping': reverse_mapping,
         'original_classes': unique_classes,
-        'model_type': 'LightGBM'  # Mark as LightGBM for SHAP compatibility
+        'model_type': 'LightGBM',  # Mark as LightGBM for SHAP compatibility
+        # Perturbation explainer baseline (XAI_PERTURBATION_BASELINE=median)
+        'feature_medians': {col: float(v) for col, v in X_train_median.fillna(0).items()}
     }
     
     model_filename = f"{param_name.replace('_', '_').lower()}_model.joblib"
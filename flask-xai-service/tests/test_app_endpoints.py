@@ -0,0 +1,483 @@
+"""
+Endpoint tests for app.py using small throwaway models.
+Run: pytest tests/test_app_endpoints.py
+"""
+import json
+import os
+import shutil
+import pytest
+import numpy as np
+import pandas as pd
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+joblib = pytest.importorskip("joblib")
+lightgbm = pytest.importorskip("lightgbm")
+flask_app = pytest.importorskip("app")
+from model_registry import ModelRegistry
+from cache_backends import CacheBackend, MemoryBackend
+from risk_rules import RiskRules
+from cache_warmer import DATA_DIR, synthetic_requests
+
+AUTH = {"Authorization": f"Bearer {flask_app.DEV_AUTH_TOKEN}"}
+
+FEATURES = [
+    'patientAge', 'diabetic', 'pregnant', 'gender_Female', 'gender_Male',
+    'hemoglobin_g_dL', 'wbc_10e9_L', 'platelet_count', 'rdw_percent',
+    'neutrophils_percent', 'lymphocytes_percent', 'mcv_fL', 'nlr'
+]
+
+PROFILE = {
+    "patientAge": 40,
+    "patientGender": "Female",
+    "otherParameters": {"hemoglobin_g_dL": 11.0, "wbc_10e9_L": 7.0, "platelet_count": 250, "mcv_fL": 85},
+}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, len(FEATURES))) * 5 + 10
+    for target in ['hemoglobin_g_dL', 'mcv_fL']:
+        cols = [f for f in FEATURES if f != target]
+        Xs = X[:, [FEATURES.index(c) for c in cols]]
+        y = (Xs[:, 0] > 10).astype(int) + (Xs[:, 1] > 12).astype(int)
+        model = lightgbm.LGBMClassifier(n_estimators=10, verbose=-1).fit(Xs, y)
+        joblib.dump({
+            'model': model,
+            'feature_names': cols,
+            'reverse_mapping': None,
+            'original_classes': [0, 1, 2],
+            'model_type': 'LightGBM'
+        }, tmp_path / f"{target.lower()}_model.joblib")
+    monkeypatch.setattr(flask_app, "MODEL_REGISTRY", ModelRegistry(tmp_path))
+    monkeypatch.setattr(flask_app, "LOADED_EXPLAINERS", {})
+    monkeypatch.setattr(flask_app, "RESPONSE_CACHE", flask_app.ResponseCache())
+    monkeypatch.setattr(flask_app, "INTERPRETATION_CACHE",
+                        flask_app.TwoTierCache(l2_get=lambda key: None, l2_bulk_set=lambda items: None))
+    monkeypatch.setattr(flask_app, "CACHE_BACKEND", MemoryBackend())
+    monkeypatch.setattr(flask_app, "get_cached_explanation", lambda explanation_id: None)
+    monkeypatch.setattr(flask_app, "set_cached_explanation", lambda explanation_id, result: None)
+    monkeypatch.setattr(flask_app, "EXPLANATION_JOBS", flask_app.ExplanationJobs(max_workers=1))
+    return flask_app.app.test_client()
+
+
+def test_batch_matches_single_requests(client):
+    parameters = [
+        {"parameter": "Hemoglobin", "value": 11.0, "status": "low"},
+        {"parameter": "MCV", "value": 85},
+        {"parameter": "WBC Count", "value": 7.0},
+    ]
+    response = client.post("/api/v1/interpret/batch", json={**PROFILE, "parameters": parameters}, headers=AUTH)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 3
+    assert "overallHealthScore" in body["riskAssessments"]
+
+    for entry, item in zip(parameters, body["interpretations"]):
+        single = client.post("/api/v1/interpret", json={**PROFILE, **entry}, headers=AUTH).get_json()
+        assert single.pop("riskAssessments") == body["riskAssessments"]
+        assert item.pop("parameter") == entry["parameter"]
+        assert item == single
+
+
+def test_interpret_rejects_bodies_that_are_not_objects(client):
+    for body in ([1, 2], "text", None):
+        response = client.post("/api/v1/interpret", json=body, headers=AUTH)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+    response = client.post("/api/v1/interpret", data="not json", headers=AUTH)
+    assert response.status_code == 400
+
+
+def test_batch_requires_parameter_list(client):
+    response = client.post("/api/v1/interpret/batch", json=PROFILE, headers=AUTH)
+    assert response.status_code == 400
+    for body in ([PROFILE], "text"):
+        response = client.post("/api/v1/interpret/batch", json=body, headers=AUTH)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+
+def test_preprocess_batch_matches_preprocess_input():
+    records = [
+        PROFILE,
+        {"patientAge": 70, "patientGender": "Male", "diabetic": True, "region": "North",
+         "otherParameters": {"lymphocytes_abs": 2.0, "neutrophils_abs": 5.0}},
+        {"patientGender": "Other", "wbc_10e9_L": "n/a"},
+    ]
+    expected = [flask_app.preprocess_input(r) for r in records]
+    frame = flask_app.preprocess_batch(records)
+    assert list(frame.columns) == list(expected[0].keys())
+    for i, row in enumerate(expected):
+        assert frame.iloc[i].astype(float).tolist() == pytest.approx([float(v) for v in row.values()])
+
+
+def test_cohort_scoring_matches_single_predictions(client):
+    records = [
+        {**PROFILE, "patientAge": age, "otherParameters": {**PROFILE["otherParameters"], "wbc_10e9_L": wbc}}
+        for age, wbc in [(25, 4.0), (45, 9.0), (70, 15.0)]
+    ]
+    response = client.post("/api/v1/score/cohort",
+                           json={"records": records, "parameters": ["Hemoglobin", "WBC Count"]}, headers=AUTH)
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert results["WBC Count"]["source"] == "clinical_rules"
+    assert results["WBC Count"]["statuses"] == [0, 0, 2]
+
+    for i, record in enumerate(records):
+        single, _ = flask_app.interpret_parameter({**record, "parameter": "Hemoglobin", "value": 11.0})
+        status = results["Hemoglobin"]["statuses"][i]
+        assert single["explainability"]["modelPrediction"] == flask_app.STATUS_NAMES[status]
+        assert single["explainability"]["confidence"] == pytest.approx(results["Hemoglobin"]["confidences"][i], abs=1e-3)
+
+
+def test_cohort_explanations_reuse_explainers(client, tmp_path, monkeypatch):
+    xgboost = pytest.importorskip("xgboost")
+    bundle = joblib.load(tmp_path / "mcv_fl_model.joblib")
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(90, len(bundle['feature_names']))) * 5 + 10
+    bundle['model'] = xgboost.XGBClassifier(n_estimators=5, max_depth=2).fit(X, np.arange(90) % 3)
+    bundle['model_type'] = 'XGBoost'
+    joblib.dump(bundle, tmp_path / "mcv_fl_model.joblib")
+
+    built = []
+
+    class CountingTreeExplainer(flask_app.shap.TreeExplainer):
+        def __init__(self, model, *args, **kwargs):
+            built.append(model)
+            super().__init__(model, *args, **kwargs)
+
+    monkeypatch.setattr(flask_app.shap, "TreeExplainer", CountingTreeExplainer)
+    records = [{**PROFILE, "patientAge": age} for age in (25, 45, 70)]
+    body = {"records": records, "parameters": ["Hemoglobin", "MCV"], "explain": "shap"}
+    for _ in range(2):
+        results = client.post("/api/v1/score/cohort", json=body, headers=AUTH).get_json()["results"]
+        assert all(len(row) == 5 for row in results["MCV"]["explanations"])
+        assert all(len(row) == 5 for row in results["Hemoglobin"]["explanations"])
+    # One explainer for the LightGBM model, reused; XGBoost goes through pred_contribs
+    assert built == [flask_app.get_model('hemoglobin_g_dL').model]
+
+
+def test_cohort_rejects_bodies_that_are_not_objects(client):
+    for body in ([PROFILE], "text"):
+        response = client.post("/api/v1/score/cohort", json=body, headers=AUTH)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+
+def test_cohort_risk_screening(client):
+    records = [
+        {**PROFILE, "hemoglobin_g_dL": hb, "mcv_fL": mcv, "platelet_count": platelets}
+        for hb, mcv, platelets in [(9.0, 72.0, 420), (14.8, 90.0, 250), (11.0, 105.0, 90)]
+    ]
+    compact = client.post("/api/v1/score/cohort", json={"records": records, "parameters": [], "risk": True},
+                          headers=AUTH).get_json()["risk"]
+    text = client.post("/api/v1/score/cohort", json={"records": records, "parameters": [], "risk": "text"},
+                       headers=AUTH).get_json()["risk"]
+    # Labs nested under otherParameters count too; top-level fields win
+    expected = [flask_app.calculate_risk_assessments({**r["otherParameters"], **r}) for r in records]
+    assert text == expected
+    state = compact["codebook"]["state"]
+    assert [state["anemiaProfile"]["type"][code] for code in compact["levels"]["anemiaProfile"]] == \
+        [e["anemiaProfile"]["type"] for e in expected]
+    assert [state["thrombosisRisk"]["level"][code] for code in compact["levels"]["thrombosisRisk"]] == \
+        [e["thrombosisRisk"]["level"] for e in expected]
+
+
+def test_ready_reports_503_until_preload_finishes(client, monkeypatch):
+    monkeypatch.setattr(flask_app, "WARMUP_STATE", {'status': 'pending', 'models': {}, 'errors': {}, 'seconds': None})
+    monkeypatch.setattr(flask_app, "WARMUP_DONE", flask_app.threading.Event())
+    monkeypatch.setattr(flask_app, "start_warmup", lambda background=True: None)
+    assert client.get("/ready").status_code == 503
+
+    flask_app.preload_models(max_workers=2)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.get_json()["models"] == 2
+    assert {k[0]: v[0] for k, v in flask_app.LOADED_EXPLAINERS.items()} == {
+        'hemoglobin_g_dl': 'TreeExplainer_LightGBM',
+        'mcv_fl': 'TreeExplainer_LightGBM',
+    }
+
+
+def test_admin_reload_swaps_retrained_model(client, tmp_path):
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    old_key, old_meta = flask_app.interpretation_cache_entry(payload)
+    old = flask_app.get_model('hemoglobin_g_dL')
+    assert old_meta == {"parameter": "hemoglobin_g_dL", "modelVersion": old.file_hash,
+                        "templateVersion": flask_app.TEMPLATE_VERSION}
+    flask_app.warm_model(old)
+    assert flask_app.explainer_key(old) in flask_app.LOADED_EXPLAINERS
+
+    # Retrain: overwrite the bundle with a different model
+    bundle = joblib.load(old.path)
+    bundle['model'] = lightgbm.LGBMClassifier(n_estimators=3, verbose=-1).fit(
+        np.random.default_rng(1).normal(size=(60, len(old.feature_names))), np.arange(60) % 3)
+    joblib.dump(bundle, old.path)
+    os.utime(old.path, (old.mtime + 10, old.mtime + 10))
+
+    response = client.post("/api/v1/admin/models/reload", headers=AUTH)
+    assert response.status_code == 200
+    assert [r["model"] for r in response.get_json()["reloaded"]] == ["hemoglobin_g_dl"]
+    new = flask_app.get_model('hemoglobin_g_dL')
+    assert new.file_hash != old.file_hash
+    assert flask_app.explainer_key(old) not in flask_app.LOADED_EXPLAINERS
+    assert flask_app.explainer_key(new) in flask_app.LOADED_EXPLAINERS
+
+    # Entries cached for the old model version are never matched again
+    assert flask_app.interpretation_cache_key(payload) != old_key
+
+    # A request still holding the old record can't bring its explainer back
+    X = pd.DataFrame(np.zeros((1, len(old.feature_names))), columns=old.feature_names)
+    flask_app._explain_with_shap(old, X, 0)
+    assert flask_app.explainer_key(old) not in flask_app.LOADED_EXPLAINERS
+    assert len(flask_app.LOADED_EXPLAINERS) == 1
+
+    # Nothing changed since: a second reload is a no-op
+    assert client.post("/api/v1/admin/models/reload", headers=AUTH).get_json()["count"] == 0
+
+
+def test_admin_risk_rules_reload_changes_cache_keys(client, tmp_path, monkeypatch):
+    path = tmp_path / "risk_rules.json"
+    path.write_bytes(flask_app.clinical_rules_fallback.RISK_RULES_PATH.read_bytes())
+    monkeypatch.setattr(flask_app.clinical_rules_fallback, "RISK_RULES_PATH", path)
+    monkeypatch.setattr(flask_app.clinical_rules_fallback, "RISK_RULES", RiskRules.from_file(path))
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    old_key = flask_app.interpretation_cache_key(payload)
+
+    response = client.post("/api/v1/admin/risk-rules/reload", headers=AUTH).get_json()
+    assert response["reloaded"] is False
+
+    document = json.loads(path.read_text(encoding="utf-8"))
+    document["description"] += " (edited)"
+    path.write_text(json.dumps(document), encoding="utf-8")
+    os.utime(path, (path.stat().st_mtime + 10, path.stat().st_mtime + 10))
+    response = client.post("/api/v1/admin/risk-rules/reload", headers=AUTH).get_json()
+    assert response == {"reloaded": True, "version": flask_app.clinical_rules_fallback.RISK_RULES.version}
+    assert flask_app.interpretation_cache_key(payload) != old_key
+
+
+def test_native_explanations_match_shap(client):
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    shap_body, _ = flask_app.interpret_parameter({**payload, "explain": "shap"})
+    native_body, _ = flask_app.interpret_parameter({**payload, "explain": "native"})
+    assert native_body["explanation_method"] == "native"
+    assert native_body["shap_values"] == pytest.approx(shap_body["shap_values"], abs=1e-9)
+    assert native_body["explainability"]["featureImportances"] == shap_body["explainability"]["featureImportances"]
+
+    none_body, _ = flask_app.interpret_parameter({**payload, "explain": "none"})
+    assert none_body["explanation_method"] == "none"
+    assert none_body["shap_values"] is None
+    assert none_body["explainability"]["modelPrediction"] == native_body["explainability"]["modelPrediction"]
+
+
+def test_explanation_levels_skip_unrequested_work(client):
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    status_only, _ = flask_app.interpret_parameter({**payload, "shap": False})
+    assert status_only["explanation_level"] == "none"
+    assert status_only["shap_values"] is None
+    assert status_only["explainability"]["featureImportances"] == []
+    # Nothing was asked for, so no explainer was built
+    assert flask_app.LOADED_EXPLAINERS == {}
+
+    topk, _ = flask_app.interpret_parameter({**payload, "explainLevel": "topk", "explain": "native"})
+    assert topk["explainability"]["featureImportances"]
+    assert topk["shap_values"] is None and "decision_path" not in topk
+
+    full, _ = flask_app.interpret_parameter({**payload, "shap": True, "explain": "native"})
+    assert full["explanation_level"] == "full"
+    assert len(full["shap_values"]) == len(full["feature_names"])
+    assert "decision_path" not in full
+    assert full["explainability"]["featureImportances"] == topk["explainability"]["featureImportances"]
+
+    path, _ = flask_app.interpret_parameter({**payload, "explainLevel": "path", "explain": "native"})
+    assert set(path["decision_path"]["contributions"]) == set(path["feature_names"])
+    assert status_only["explainability"]["modelPrediction"] == path["explainability"]["modelPrediction"]
+
+
+def test_async_explanation_is_fetched_later(client):
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0, "shap": True}
+    response = client.post("/api/v1/interpret", json={**payload, "explainAsync": True}, headers=AUTH)
+    body = response.get_json()
+    explanation_id = body["explanation_id"]
+    assert body["explanation_url"] == f"/api/v1/explanations/{explanation_id}"
+    assert body["explanation_method"] == "pending"
+    assert body["explainability"]["featureImportances"] == []
+
+    fetched = client.get(f"/api/v1/explanations/{explanation_id}?wait=10", headers=AUTH)
+    assert fetched.status_code == 200
+    explanation = fetched.get_json()["explanation"]
+
+    sync = client.post("/api/v1/interpret", json=payload, headers=AUTH).get_json()
+    assert explanation["shap_values"] == pytest.approx(sync["shap_values"])
+    assert explanation["featureImportances"] == sync["explainability"]["featureImportances"]
+    assert explanation["shapExplanation"] == sync["explainability"]["shapExplanation"]
+
+    assert client.get("/api/v1/explanations/unknown", headers=AUTH).status_code == 404
+
+
+def test_failed_or_expired_explanations_are_resubmitted(client, monkeypatch):
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0, "shap": True, "explainAsync": True}
+    run_explanation_job = flask_app.run_explanation_job
+
+    def failing_job(*args):
+        raise RuntimeError("explainer crashed")
+
+    monkeypatch.setattr(flask_app, "run_explanation_job", failing_job)
+    explanation_id = client.post("/api/v1/interpret", json=payload, headers=AUTH).get_json()["explanation_id"]
+    failed = client.get(f"/api/v1/explanations/{explanation_id}?wait=10", headers=AUTH)
+    assert failed.status_code == 500
+
+    # The cached response carries a failed explanation_id: re-posting resubmits the job
+    monkeypatch.setattr(flask_app, "run_explanation_job", run_explanation_job)
+    assert client.post("/api/v1/interpret", json=payload, headers=AUTH).get_json()["explanation_id"] == explanation_id
+    assert client.get(f"/api/v1/explanations/{explanation_id}?wait=10", headers=AUTH).status_code == 200
+
+    # Same once the job has been trimmed from memory without being persisted
+    monkeypatch.setattr(flask_app, "EXPLANATION_JOBS", flask_app.ExplanationJobs(max_workers=1))
+    assert client.get(f"/api/v1/explanations/{explanation_id}", headers=AUTH).status_code == 404
+    batch = {**PROFILE, "shap": True, "explainAsync": True, "parameters": [{"parameter": "Hemoglobin", "value": 11.0}]}
+    client.post("/api/v1/interpret/batch", json=batch, headers=AUTH)
+    assert client.get(f"/api/v1/explanations/{explanation_id}?wait=10", headers=AUTH).status_code == 200
+
+
+def test_requests_preprocess_once(client, monkeypatch):
+    calls = []
+    preprocess_input = flask_app.preprocess_input
+    monkeypatch.setattr(flask_app, "preprocess_input", lambda data: calls.append(data) or preprocess_input(data))
+
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    for _ in range(2):
+        calls.clear()
+        assert client.post("/api/v1/interpret", json=payload, headers=AUTH).status_code == 200
+        assert len(calls) == 1
+    batch = {**PROFILE, "parameters": [{"parameter": "Hemoglobin", "value": 11.0}, {"parameter": "MCV", "value": 85}]}
+    calls.clear()
+    assert client.post("/api/v1/interpret/batch", json=batch, headers=AUTH).status_code == 200
+    assert len(calls) == 1
+
+
+def test_response_cache_serves_stored_bytes(client):
+    payload = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    first = client.post("/api/v1/interpret", json=payload, headers=AUTH)
+    second = client.post("/api/v1/interpret", json=payload, headers=AUTH)
+    assert second.get_data() == first.get_data()
+    assert second.mimetype == "application/json"
+
+    stats = client.get("/api/v1/admin/cache", headers=AUTH).get_json()["responseCache"]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == len(first.get_data())
+
+    # Errors are never cached
+    client.post("/api/v1/interpret/batch", json=PROFILE, headers=AUTH)
+    assert len(flask_app.RESPONSE_CACHE) == 1
+
+
+def test_cache_keys_only_depend_on_inputs_that_change_the_output(client):
+    key = flask_app.interpretation_cache_key
+    base = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0, "status": "low"}
+    # Key order, label spelling, unused labs and sub-precision noise don't matter
+    reordered = dict(reversed(list(base.items())))
+    assert key(reordered) == key(base)
+    assert key({**base, "parameter": "hemoglobin_g_dL"}) == key(base)
+    assert key({**base, "value": 11.0001}) == key(base)
+    unused = {**base, "otherParameters": {**PROFILE["otherParameters"], "ferritin_ng_mL": 12, "monocytes_percent": 9}}
+    assert key(unused) == key(base)
+    assert key({**base, "reference_range": "12 - 15"}) == key(base)
+
+    # Model features, status inputs and explanation options do
+    assert key({**base, "otherParameters": {**PROFILE["otherParameters"], "mcv_fL": 70}}) != key(base)
+    assert key({**base, "status": "high"}) != key(base)
+    abnormal = {**base, "status": "abnormal"}
+    assert key({**abnormal, "reference_range": "12 - 15"}) != key({**abnormal, "reference_range": "10 - 11"})
+    assert key({**base, "shap": False}) != key(base)
+    # Risk assessments read top-level fields
+    assert key({**base, "smoking": 1}) != key(base)
+
+
+def test_synthetic_warm_up_keys_match_frontend_requests(client, tmp_path):
+    shutil.copy(DATA_DIR / "clinical_thresholds.json", tmp_path)
+    _, body = next(synthetic_requests(1, seed=2, data_dir=tmp_path))
+    profile, requests_data = flask_app.split_batch_payload(body)
+    warmed = flask_app.batch_entry_keys(requests_data, flask_app.preprocess_input(profile))
+    for entry, (_, key, _) in zip(body["parameters"], warmed):
+        # What services/xaiService.js posts to /interpret for the same report
+        frontend = {
+            "parameter_name": entry["parameter"], "parameter": entry["parameter"], "value": entry["value"],
+            "status": entry["status"], "reference_range": "", "otherParameters": body["otherParameters"],
+            "patientAge": body["patientAge"], "patientGender": body["patientGender"],
+            "diabetic": body["diabetic"], "pregnant": body["pregnant"], "shap": True,
+        }
+        assert flask_app.interpretation_cache_key(frontend) == key, entry["parameter"]
+
+
+def test_report_scoped_document_serves_a_reopened_report(client, monkeypatch):
+    store, reads = {}, []
+
+    def get_many(keys):
+        reads.append(list(keys))
+        return {k: store[k] for k in keys if k in store}
+
+    def new_cache():
+        return flask_app.TwoTierCache(
+            l2_get=lambda key: reads.append([key]) or store.get(key),
+            l2_get_many=get_many,
+            l2_bulk_set=lambda items: store.update({key: value for key, value, meta in items})
+        )
+
+    monkeypatch.setattr(flask_app, "REPORT_CACHE_ENABLED", True)
+    monkeypatch.setattr(flask_app, "INTERPRETATION_CACHE", new_cache())
+    report = {**PROFILE, "parameters": [{"parameter": "Hemoglobin", "value": 11.0}, {"parameter": "MCV", "value": 85}]}
+    first = client.post("/api/v1/interpret/batch", json=report, headers=AUTH).get_json()
+    # Report document miss, then one bulk lookup for both entries
+    assert len(reads) == 2 and len(reads[1]) == 2
+    flask_app.INTERPRETATION_CACHE.flush()
+    assert sum(k.startswith("report:") for k in store) == 1 and len(store) == 3
+
+    # A fresh worker (empty in-process tiers) reopens the report with a single read
+    reads.clear()
+    monkeypatch.setattr(flask_app, "INTERPRETATION_CACHE", new_cache())
+    monkeypatch.setattr(flask_app, "RESPONSE_CACHE", flask_app.ResponseCache())
+    second = client.post("/api/v1/interpret/batch", json=report, headers=AUTH).get_json()
+    assert second == first
+    assert len(reads) == 1 and reads[0][0].startswith("report:")
+
+
+def test_cache_admin_reports_parameters_and_invalidates_selectively(client, monkeypatch):
+    backend = flask_app.CACHE_BACKEND
+    monkeypatch.setattr(flask_app, "INTERPRETATION_CACHE", flask_app.TwoTierCache(
+        l2_get=backend.get, l2_get_many=backend.get_many, l2_bulk_set=backend.set_many))
+    hemoglobin = {**PROFILE, "parameter": "Hemoglobin", "value": 11.0}
+    client.post("/api/v1/interpret", json=hemoglobin, headers=AUTH)
+    client.post("/api/v1/interpret/batch", headers=AUTH, json={
+        **PROFILE, "parameters": [{"parameter": "Hemoglobin", "value": 11.0}, {"parameter": "MCV", "value": 85}]})
+
+    stats = client.get("/api/v1/admin/cache?top=5", headers=AUTH).get_json()
+    assert [(p["label"], p["lookups"], p["misses"]) for p in stats["parameters"]] == [
+        ("mcv_fL", 1, 1), ("hemoglobin_g_dL", 2, 1)]
+    assert stats["interpretationCache"]["l1Hits"] == 1
+    flask_app.INTERPRETATION_CACHE.flush()
+    assert client.get("/api/v1/admin/cache", headers=AUTH).get_json()["backend"]["entries"] == 2
+
+    invalidate = "/api/v1/admin/cache/invalidate"
+    assert client.post(invalidate, json={}, headers=AUTH).status_code == 400
+    assert client.post(invalidate, json=["all"], headers=AUTH).get_json()["error"]
+    assert client.post(invalidate, json={"olderThanSeconds": "old"}, headers=AUTH).status_code == 400
+    assert client.post(invalidate, json={"all": True}).status_code == 401
+    response = client.post(invalidate, json={"olderThanSeconds": 3600}, headers=AUTH).get_json()
+    assert response["removed"] == 0 and response["interpretationCacheCleared"] == 2
+
+    assert client.post(invalidate, json={"parameter": "MCV"}, headers=AUTH).get_json()["removed"] == 1
+    model_version = flask_app.interpretation_cache_entry(hemoglobin)[1]["modelVersion"]
+    assert client.post(invalidate, json={"modelVersion": model_version}, headers=AUTH).get_json()["removed"] == 1
+    assert len(flask_app.RESPONSE_CACHE) == 0
+
+    # A backend that can't be reached (or the 'none' backend) is reported, not passed off as done
+    monkeypatch.setattr(flask_app, "CACHE_BACKEND", CacheBackend())
+    response = client.post(invalidate, json={"all": True}, headers=AUTH)
+    assert response.status_code == 503
+    assert response.get_json()["removed"] is None and "error" in response.get_json()
@@ -0,0 +1,90 @@
+"""
+Unit tests for cache_backends.py (memory and SQLite backends)
+Run: pytest tests/test_cache_backends.py
+"""
+import sqlite3
+import pytest
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from cache_backends import CacheBackend, MemoryBackend, SQLiteBackend, create_backend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(clock):
+        if request.param == "memory":
+            return MemoryBackend(ttl_seconds=60, clock=clock)
+        return SQLiteBackend(tmp_path / "cache.sqlite3", ttl_seconds=60, clock=clock)
+    return make
+
+
+def test_bulk_set_and_get(make_backend):
+    backend = make_backend(FakeClock())
+    meta = {"parameter": "hemoglobin_g_dL", "modelVersion": "abc", "templateVersion": "t1"}
+    backend.set_many([("k1", {"status": "Low"}, meta), ("k2", {"status": "High"}, None)])
+    backend.set("k3", {"riskAssessments": {}})
+    assert backend.get_many(["k1", "k2", "k3", "missing"]) == {
+        "k1": {"status": "Low"}, "k2": {"status": "High"}, "k3": {"riskAssessments": {}}}
+    assert backend.get("missing") is None
+    assert backend.stats()["entries"] == 3
+    assert backend.clear() == 3
+    assert backend.get("k1") is None
+
+
+def test_entries_expire_after_ttl(make_backend):
+    clock = FakeClock()
+    backend = make_backend(clock)
+    backend.set("k", {"status": "Low"})
+    clock.now += 59
+    assert backend.get("k") == {"status": "Low"}
+    clock.now += 2
+    assert backend.get("k") is None
+
+
+def test_invalidate_by_parameter_model_version_and_age(make_backend):
+    clock = FakeClock()
+    backend = make_backend(clock)
+    backend.set_many([
+        ("hb-old", {}, {"parameter": "hemoglobin_g_dL", "modelVersion": "m1"}),
+        ("report", {}, {"parameter": "report", "modelVersion": ["m1", "m2"]}),
+    ])
+    clock.now += 30
+    backend.set_many([
+        ("hb-new", {}, {"parameter": "hemoglobin_g_dL", "modelVersion": "m3"}),
+        ("wbc", {}, {"parameter": "wbc_10e9_L", "modelVersion": "m2"}),
+    ])
+    assert backend.invalidate(older_than_seconds=40) == 0
+    assert backend.invalidate(parameter="hemoglobin_g_dL", older_than_seconds=10) == 1
+    assert backend.invalidate(model_version="m2") == 2
+    assert backend.invalidate(model_version="m") == 0
+    assert list(backend.get_many(["hb-old", "report", "hb-new", "wbc"])) == ["hb-new"]
+
+
+def test_sqlite_is_shared_between_connections_and_uses_wal(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    writer, reader = SQLiteBackend(path), SQLiteBackend(path)
+    writer.set_many([(f"k{i}", {"i": i}, {"modelVersion": ["a", "b"]}) for i in range(1200)])
+    assert len(reader.get_many([f"k{i}" for i in range(1200)])) == 1200
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_create_backend_from_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv("XAI_SQLITE_CACHE_PATH", str(tmp_path / "env.sqlite3"))
+    assert isinstance(create_backend("sqlite"), SQLiteBackend)
+    monkeypatch.setenv("XAI_CACHE_BACKEND", "memory")
+    assert isinstance(create_backend(), MemoryBackend)
+    none = create_backend("none")
+    none.set("k", {})
+    assert type(none) is CacheBackend and none.get("k") is None
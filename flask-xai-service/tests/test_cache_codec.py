@@ -0,0 +1,57 @@
+"""
+Unit tests for cache_codec.py (compact, template-by-reference cache entries)
+Run: pytest tests/test_cache_codec.py
+"""
+import json
+import pytest
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from cache_codec import CODEC_VERSION, TEXT_TABLE, CacheCodecError, decode, encode
+from medical_text_generator import generate_interpretation
+from clinical_rules_fallback import RISK_RULES, calculate_risk_assessments
+
+
+def _interpretation():
+    patient = {"hemoglobin_g_dL": 9.1, "mcv_fL": 71, "wbc_10e9_L": 3.1, "platelet_count": 90, "gender": "Female"}
+    importances = [{"feature": "patientAge", "impact": 0.55, "direction": "increases"}]
+    result = generate_interpretation("hemoglobin_g_dL", 9.1, 1, 0.85, importances,
+                                     risk_assessments=calculate_risk_assessments(patient))
+    result["shap_values"] = [0.5538671722799098, -2.4847399214072974e-05, 0.0]
+    result["shap_error"] = None
+    return result
+
+
+def test_round_trip_is_exact_and_much_smaller():
+    document = _interpretation()
+    blob = encode(document)
+    assert decode(blob) == document
+    assert len(blob) * 2.5 < len(json.dumps(document).encode("utf-8"))
+
+
+def test_template_text_is_stored_by_reference():
+    document = _interpretation()
+    assert document["introduction"] in TEXT_TABLE
+    assert document["riskAssessments"]["anemiaProfile"]["recommendations"][0] in TEXT_TABLE
+
+
+def test_risk_rule_prose_is_interned():
+    texts = [text for text in RISK_RULES.texts() if len(text) > 8]
+    assert "Normal clotting profile" in texts
+    assert set(texts) <= set(TEXT_TABLE)
+
+
+def test_strings_that_look_like_references_survive():
+    document = {"a": "\x00" + "1", "b": "\x00\x00", "c": ["plain", 1.5, None, True]}
+    assert decode(encode(document)) == document
+
+
+def test_entries_from_another_version_are_rejected():
+    blob = encode({"status": "Low"})
+    with pytest.raises(CacheCodecError):
+        decode(bytes([CODEC_VERSION + 1]) + blob[1:])
+    with pytest.raises(CacheCodecError):
+        decode(blob[:1] + b"0" * 12 + blob[13:])
@@ -0,0 +1,23 @@
+"""
+Unit tests for cache_keys.py
+Run: pytest tests/test_cache_keys.py
+"""
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from cache_keys import canonical_json, hash_key, round_numbers
+
+
+def test_round_numbers_normalizes_nested_values():
+    assert round_numbers({"a": 11.0049, "b": [1.0, True, "x", None], "c": 7}, 2) == {
+        "a": 11.0, "b": [1, True, "x", None], "c": 7
+    }
+    assert round_numbers(11.0, 2) == round_numbers(11, 2)
+
+
+def test_hash_key_ignores_key_order():
+    assert canonical_json({"b": 1, "a": {"y": 2, "x": 1}}) == '{"a":{"x":1,"y":2},"b":1}'
+    assert hash_key({"a": 1, "b": 2}) == hash_key({"b": 2, "a": 1})
+    assert hash_key({"a": 1}) != hash_key({"a": 2})
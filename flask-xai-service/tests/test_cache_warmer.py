@@ -0,0 +1,84 @@
+"""
+Unit tests for cache_warmer.py
+Run: pytest tests/test_cache_warmer.py
+"""
+import json
+import shutil
+import threading
+import time
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from cache_warmer import (
+    BATCH_PATH, DATA_DIR, INTERPRET_PATH, RateLimiter, load_request_log, synthetic_requests, warm_cache
+)
+
+
+def test_request_log_accepts_wrapped_and_bare_bodies(tmp_path):
+    log = tmp_path / "requests.jsonl"
+    log.write_text("\n".join([
+        json.dumps({"path": INTERPRET_PATH, "body": {"parameter": "Hemoglobin", "value": 11}}),
+        json.dumps({"parameter": "WBC", "value": 7}),
+        json.dumps({"patientAge": 40, "parameters": [{"parameter": "MCV", "value": 85}]}),
+        "not json",
+        json.dumps({"path": "/api/v1/admin/cache/invalidate", "body": {"all": True}}),
+        "",
+        json.dumps({"parameter": "Platelets", "value": 250}),
+    ]))
+    replayed = list(load_request_log(log))
+    assert [path for path, _ in replayed] == [INTERPRET_PATH, INTERPRET_PATH, BATCH_PATH, INTERPRET_PATH]
+    assert len(list(load_request_log(log, limit=2))) == 2
+
+
+def test_synthetic_reports_cover_thresholded_parameters(tmp_path):
+    shutil.copy(DATA_DIR / "clinical_thresholds.json", tmp_path)
+    first = list(synthetic_requests(5, seed=1, data_dir=tmp_path))
+    assert first == list(synthetic_requests(5, seed=1, data_dir=tmp_path))
+    assert len(first) == 5
+    path, body = first[0]
+    assert path == BATCH_PATH
+    assert {p["parameter"] for p in body["parameters"]} >= {"hemoglobin_g_dL", "wbc_10e9_L", "platelet_count"}
+    assert body["patientGender"] in ("Male", "Female", "Other")
+    assert all(p["value"] >= 0 for p in body["parameters"])
+    assert {p["status"] for p in body["parameters"]} <= {"low", "normal", "high"}
+    assert body["shap"] is True and isinstance(body["diabetic"], bool)
+    assert "smoking" not in body
+    _, custom = next(synthetic_requests(1, seed=1, data_dir=tmp_path, options={"explainLevel": "topk"}))
+    assert custom["explainLevel"] == "topk" and "shap" not in custom
+
+
+def test_rate_limiter_spaces_requests():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(round(seconds, 6))
+        now[0] += seconds
+
+    limiter = RateLimiter(rate=4, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+    assert sleeps == [0.25, 0.25]
+
+
+def test_warm_cache_bounds_concurrency_and_counts_outcomes():
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def send(path, body):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        if body["i"] == 3:
+            raise RuntimeError("boom")
+        return 500 if body["i"] == 4 else 200
+
+    stats = warm_cache(((INTERPRET_PATH, {"i": i}) for i in range(10)), send, concurrency=2)
+    assert (stats["sent"], stats["ok"], stats["errors"]) == (10, 8, 2)
+    assert peak[0] <= 2
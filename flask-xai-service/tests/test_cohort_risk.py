@@ -0,0 +1,105 @@
+"""
+Unit tests for cohort_risk.py (equivalence with calculate_risk_assessments)
+Run: pytest tests/test_cohort_risk.py
+"""
+import random
+
+import numpy as np
+import pandas as pd
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from clinical_rules_fallback import calculate_risk_assessments
+from cohort_risk import assess_cohort, codebook, columns_from_records, risk_columns
+
+# Values on and around every boundary the assessments test
+PROBES = {
+    'patientAge': [25, 60, 61, 64, 65, 80],
+    'neutrophil_lymphocyte_ratio': [1.2, 3.5, 3.51, 6.789],
+    'rdw_percent': [12.0, 14.5, 14.6],
+    'random_blood_sugar_mg_dL': [90, 139.9, 140, 199, 200, 310],
+    'hba1c_percent': [5.0, 5.69, 5.7, 6.4, 6.5, 9.1],
+    'wbc_10e9_L': [2.0, 3.9, 4.0, 9.0, 9.1, 11.0, 11.5, 25.0],
+    'neutrophils_percent': [50, 70, 70.5, 85],
+    'crp_mg_L': [1, 10, 10.5],
+    'esr_mm_hr': [5, 30, 31],
+    'hemoglobin_g_dL': [5.0, 6.9, 7.0, 9.9, 10.0, 11.2, 11.9, 12.0, 13.4, 13.5, 16.0, 21.0],
+    'mcv_fL': [70, 79.9, 80, 100, 100.1],
+    'mch_pg': [27, 30],
+    'ferritin_ng_mL': [10, 29, 30, 120],
+    'platelet_count': [30, 100, 101, 130, 149, 150, 400, 401, 1200],
+    'hematocrit_percent': [35, 52, 52.5],
+    'rbc_count': [2.5, 4.2, 6.0, 7.5],
+    'smoking': [0, 1, True, False],
+    'pregnant': [0, 1, False],
+    'diabetic': [0, 1, True],
+    'patientGender': ['Male', 'Female', 'Other'],
+}
+
+
+def _records(n, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        # Each field present most of the time, like real reports
+        records.append({name: rng.choice(values) for name, values in PROBES.items() if rng.random() < 0.85})
+    return records
+
+
+def test_render_matches_calculate_risk_assessments():
+    records = _records(3000)
+    risk = assess_cohort(columns_from_records(records))
+    assert len(risk) == len(records)
+    for i, record in enumerate(records):
+        assert risk.render(i) == calculate_risk_assessments(record), record
+
+
+def test_nested_other_parameters():
+    records = _records(200, seed=5)
+    nested = [{'patientAge': r.get('patientAge'), 'otherParameters': r} for r in records]
+    risk = assess_cohort(columns_from_records(nested))
+    assert risk.render_all() == [calculate_risk_assessments(r) for r in records]
+
+    columns = columns_from_records([{'hemoglobin_g_dL': 8.0, 'otherParameters': {'hemoglobin_g_dL': 11.0, 'mcv_fL': 85}}])
+    assert columns['hemoglobin_g_dL'] == [8.0]
+    assert columns['mcv_fL'] == [85]
+
+
+def test_dataframe_input():
+    records = [
+        {'patientAge': 70, 'patientGender': 'Female', 'hemoglobin_g_dL': 9.5, 'mcv_fL': 75.0,
+         'ferritin_ng_mL': 12.0, 'platelet_count': 420.0, 'smoking': 1, 'rdw_percent': 15.2},
+        {'patientAge': 40, 'patientGender': 'Male', 'hemoglobin_g_dL': 14.5, 'mcv_fL': 90.0,
+         'ferritin_ng_mL': 80.0, 'platelet_count': 250.0, 'smoking': 0, 'rdw_percent': 13.0},
+    ]
+    risk = assess_cohort(pd.DataFrame(records))
+    assert risk.render_all() == [calculate_risk_assessments(r) for r in records]
+    assert risk.levels['anemiaProfile'].tolist() == [1, 0]
+    assert risk.factors['cardiovascularRisk'].tolist() == [0b1110, 0]
+
+
+def _row(risk, i):
+    return {name: column[i] for name, column in risk.columns.items() if column[i] is not None}
+
+
+def test_compact_codes_decode_with_the_codebook():
+    risk = assess_cohort(columns_from_records(_records(50, seed=3)))
+    compact = risk.to_compact()
+    book = codebook()
+    for i in range(50):
+        expected = calculate_risk_assessments(_row(risk, i))
+        assert book['state']['thrombosisRisk']['level'][compact['levels']['thrombosisRisk'][i]] == \
+            expected['thrombosisRisk']['level']
+        score = compact['state']['overallHealthScore']['score'][i]
+        assert book['state']['overallHealthScore']['score'][score] == expected['overallHealthScore']['score']
+        assert bin(compact['factors']['diabetesRisk'][i]).count('1') == len(expected['diabetesRisk']['factors'])
+
+
+def test_missing_columns_and_empty_cohorts():
+    risk = assess_cohort({'hemoglobin_g_dL': [np.nan, 15.0]})
+    assert risk.render(0) == calculate_risk_assessments({})
+    assert risk.render(1) == calculate_risk_assessments({'hemoglobin_g_dL': 15.0})
+    assert len(assess_cohort({name: [] for name in risk_columns()})) == 0
@@ -0,0 +1,52 @@
+"""
+Unit tests for explainability.py
+Run: pytest tests/test_explainability.py
+"""
+import pytest
+import numpy as np
+import pandas as pd
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+xgboost = pytest.importorskip("xgboost")
+from explainability import perturbation_baseline, perturbation_contributions
+from model_registry import ModelRecord
+
+
+def _xgb_record(feature_medians=None):
+    rng = np.random.default_rng(0)
+    names = [f"f{i}" for i in range(20)]
+    X = pd.DataFrame(rng.normal(size=(200, len(names))) * 3 + 5, columns=names)
+    y = (X["f0"] > 5).astype(int) + (X["f1"] > 6).astype(int)
+    model = xgboost.XGBClassifier(n_estimators=10, max_depth=3).fit(X, y)
+    record = ModelRecord(
+        key="test", model=model, model_type=None, feature_names=names, reverse_mapping=None,
+        original_classes=[0, 1, 2], feature_medians=feature_medians, path=Path("test"),
+        file_hash="", mtime=0.0
+    )
+    return record, X.iloc[[0]]
+
+
+def test_batched_perturbation_matches_one_call_per_feature():
+    record, X = _xgb_record()
+    model = record.model
+    baseline = perturbation_baseline(record, list(X.columns), 'zero')
+    expected = []
+    proba = model.predict_proba(X)[0]
+    for i in range(X.shape[1]):
+        X_perturbed = X.copy()
+        X_perturbed.iloc[0, i] = 0
+        expected.append(proba[2] - model.predict_proba(X_perturbed)[0][2])
+    assert perturbation_contributions(model, X, 2, baseline) == pytest.approx(expected, abs=1e-7)
+
+
+def test_median_baseline_uses_bundle_medians():
+    names = ["f0", "f1", "f2"]
+    record, _ = _xgb_record(feature_medians={"f0": 4.5, "f2": -1.0})
+    assert perturbation_baseline(record, names, 'median').tolist() == [4.5, 0.0, -1.0]
+    assert perturbation_baseline(record, names, 'zero').tolist() == [0.0, 0.0, 0.0]
+    record, _ = _xgb_record()
+    assert perturbation_baseline(record, names, 'median').tolist() == [0.0, 0.0, 0.0]
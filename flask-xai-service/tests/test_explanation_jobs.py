@@ -0,0 +1,57 @@
+"""
+Unit tests for explanation_jobs.py
+Run: pytest tests/test_explanation_jobs.py
+"""
+import threading
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from explanation_jobs import ExplanationJobs
+
+
+def test_identical_jobs_run_once_and_results_are_persisted():
+    stored = {}
+    calls = []
+    jobs = ExplanationJobs(max_workers=2, on_done=lambda job_id, result: stored.update({job_id: result}))
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        calls.append(1)
+        return {"ok": True}
+
+    assert jobs.submit("a", work)
+    assert jobs.submit("a", work)
+    assert jobs.get("a").status == "pending"
+    release.set()
+    assert jobs.get("a", wait=5).result == {"ok": True}
+    assert calls == [1]
+    assert stored == {"a": {"ok": True}}
+
+
+def test_full_queue_refuses_and_failed_jobs_report_errors():
+    jobs = ExplanationJobs(max_workers=1, max_pending=1)
+    release = threading.Event()
+    assert jobs.submit("slow", lambda: release.wait(5))
+    assert not jobs.submit("other", lambda: None)
+    release.set()
+    jobs.get("slow", wait=5)
+
+    def boom():
+        raise ValueError("no model")
+
+    assert jobs.submit("bad", boom)
+    job = jobs.get("bad", wait=5)
+    assert job.status == "error" and "no model" in job.error
+
+
+def test_only_newest_finished_jobs_are_kept():
+    jobs = ExplanationJobs(max_workers=1, max_finished=2)
+    for i in range(4):
+        jobs.submit(str(i), lambda i=i: i)
+        jobs.get(str(i), wait=5)
+    assert jobs.get("0") is None and jobs.get("1") is None
+    assert jobs.get("3").result == 3
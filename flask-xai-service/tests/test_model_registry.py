@@ -0,0 +1,48 @@
+"""
+Unit tests for model_registry.py
+Run: pytest tests/test_model_registry.py
+"""
+import pytest
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+joblib = pytest.importorskip("joblib")
+import model_registry
+from model_registry import ModelRegistry
+
+
+def _write_bundle(path, model="stub-model"):
+    joblib.dump({
+        'model': model,
+        'feature_names': ['patientAge', 'rbc_count'],
+        'reverse_mapping': {0: 0, 1: 2},
+        'original_classes': [0, 2],
+        'model_type': 'LightGBM'
+    }, path, compress=3)
+
+
+def test_record_metadata(tmp_path):
+    _write_bundle(tmp_path / "hba1c_percent_model.joblib")
+    record = ModelRegistry(tmp_path).get("hba1c_percent")
+    assert record.model == "stub-model"
+    assert record.is_lightgbm
+    assert record.feature_names == ['patientAge', 'rbc_count']
+    assert record.reverse_mapping == {0: 0, 1: 2}
+    assert record.original_classes == [0, 2]
+    assert len(record.file_hash) == 64
+    assert record.mtime == (tmp_path / "hba1c_percent_model.joblib").stat().st_mtime
+
+
+def test_bundle_loaded_once(tmp_path, monkeypatch):
+    _write_bundle(tmp_path / "esr_mm_hr_model.joblib")
+    calls = []
+    real_load = model_registry.joblib.load
+    monkeypatch.setattr(model_registry.joblib, "load", lambda f: calls.append(f) or real_load(f))
+    registry = ModelRegistry(tmp_path)
+    assert registry.get("esr_mm_hr") is registry.get("esr_mm_hr")
+    assert len(calls) == 1
+    assert registry.get("missing") is None
+    assert registry.available_keys() == ["esr_mm_hr"]
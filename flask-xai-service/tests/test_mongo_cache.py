@@ -0,0 +1,134 @@
+"""
+Unit tests for mongo_cache.py (against an in-memory stand-in for the collection)
+Run: pytest tests/test_mongo_cache.py
+"""
+from datetime import datetime
+import os
+import pytest
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+mongo_cache = pytest.importorskip("mongo_cache")
+
+
+class FakeCollection:
+    def __init__(self):
+        self.updates = []
+        self.queries = []
+
+    def bulk_write(self, requests, ordered=True):
+        self.updates.extend(requests)
+
+    def find_one(self, query):
+        self.queries.append(query)
+        return None
+
+
+class DownCollection:
+    def __init__(self):
+        self.calls = 0
+
+    def find_one(self, query):
+        self.calls += 1
+        raise ConnectionError("mongo down")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_collection(monkeypatch):
+    coll = FakeCollection()
+    monkeypatch.setattr(mongo_cache, "collection", coll)
+    monkeypatch.setattr(mongo_cache, "_client_pid", os.getpid())
+    monkeypatch.setattr(mongo_cache, "BREAKER", mongo_cache.CircuitBreaker())
+    return coll
+
+
+def test_entries_carry_versions_and_a_real_date(fake_collection):
+    meta = {"parameter": "hemoglobin_g_dL", "modelVersion": "abc", "templateVersion": "t1"}
+    mongo_cache.bulk_set_cached_interpretations([("k1", {"status": "Low"}, meta), ("k2", {}, None)])
+    first = fake_collection.updates[0]._doc["$set"]
+    assert mongo_cache._result(first) == {"status": "Low"}
+    assert isinstance(first["createdAt"], datetime)
+    assert (first["parameter"], first["modelVersion"], first["templateVersion"]) == ("hemoglobin_g_dL", "abc", "t1")
+    assert "timestamp" not in first
+    assert "modelVersion" not in fake_collection.updates[1]._doc["$set"]
+
+
+def test_lookups_skip_entries_past_their_ttl(fake_collection):
+    assert mongo_cache.get_cached_interpretation("k1") is None
+    query = fake_collection.queries[0]
+    assert query["_id"] == "k1"
+    assert isinstance(query["createdAt"]["$gte"], datetime)
+
+
+def test_breaker_opens_after_repeated_failures_and_retries_after_cooldown(monkeypatch):
+    clock = FakeClock()
+    coll = DownCollection()
+    monkeypatch.setattr(mongo_cache, "collection", coll)
+    monkeypatch.setattr(mongo_cache, "_client_pid", os.getpid())
+    monkeypatch.setattr(mongo_cache, "BREAKER", mongo_cache.CircuitBreaker(threshold=3, cooldown=30, clock=clock))
+
+    for _ in range(5):
+        assert mongo_cache.get_cached_interpretation("k") is None
+    assert coll.calls == 3
+    assert mongo_cache.BREAKER.state == "open"
+
+    clock.now = 31
+    assert mongo_cache.get_cached_interpretation("k") is None
+    assert coll.calls == 4  # one half-open trial, which failed
+    assert mongo_cache.get_cached_interpretation("k") is None
+    assert coll.calls == 4
+
+    clock.now = 62
+    monkeypatch.setattr(mongo_cache, "collection", FakeCollection())
+    mongo_cache.get_cached_interpretation("k")
+    assert mongo_cache.BREAKER.state == "closed"
+    assert mongo_cache.BREAKER.stats()["trips"] == 1
+
+
+def test_bulk_writes_raise_while_the_breaker_is_open(fake_collection, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(mongo_cache, "BREAKER", mongo_cache.CircuitBreaker(threshold=1, cooldown=30, clock=clock))
+    mongo_cache.BREAKER.record_failure()
+    assert mongo_cache.BREAKER.state == "open"
+    with pytest.raises(mongo_cache.CacheUnavailable):
+        mongo_cache.bulk_set_cached_interpretations([("k1", {"status": "Low"}, None)])
+    assert fake_collection.updates == []
+
+    # The write-behind queue counts the batch as failed, not flushed
+    from tiered_cache import TwoTierCache
+    cache = TwoTierCache(l2_get=lambda key: None, l2_bulk_set=mongo_cache.bulk_set_cached_interpretations)
+    cache.set("k1", {"status": "Low"})
+    cache.flush()
+    assert cache.stats()["writeErrors"] == 1
+    assert cache.stats()["writesFlushed"] == 0
+
+
+def test_no_connection_means_a_miss_without_blocking(monkeypatch):
+    started = []
+    monkeypatch.setattr(mongo_cache, "collection", None)
+    monkeypatch.setattr(mongo_cache, "_client_pid", None)
+    monkeypatch.setattr(mongo_cache, "connect_in_background", lambda: started.append(1))
+    assert mongo_cache.get_cached_interpretation("k") is None
+    assert mongo_cache.get_cached_interpretations(["k"]) == {}
+    assert started
+
+
+def test_client_inherited_across_fork_is_not_used(monkeypatch):
+    started = []
+    monkeypatch.setattr(mongo_cache, "collection", FakeCollection())
+    monkeypatch.setattr(mongo_cache, "_client_pid", os.getpid() + 1)
+    monkeypatch.setattr(mongo_cache, "connect_in_background", lambda: started.append(1))
+    assert mongo_cache.get_cached_interpretation("k") is None
+    assert mongo_cache.collection.queries == []
+    assert started
@@ -0,0 +1,52 @@
+"""
+Unit tests for response_cache.py
+Run: pytest tests/test_response_cache.py
+"""
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_by_entry_count():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"  # a is now most recently used
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget():
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"123")
+    assert "a" not in cache and len(cache) == 2
+    assert cache.stats()["bytes"] == 8
+    assert cache.set("huge", b"x" * 11) is False
+    assert "huge" not in cache
+
+
+def test_ttl_uses_the_given_clock():
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=5, clock=clock)
+    cache.set("a", b"1")
+    clock.now = 4.9
+    assert cache.get("a") == b"1"
+    clock.now = 5.0
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["entries"]) == (1, 1, 1, 0)
@@ -0,0 +1,128 @@
+"""
+Unit tests for risk_rules.py (rule compilation, equivalence with the hand-written assessments, reload)
+Run: pytest tests/test_risk_rules.py
+"""
+import json
+import os
+
+import pytest
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import clinical_rules_fallback
+from clinical_rules_fallback import (
+    THRESHOLD_ENGINE, calculate_risk_assessments, calculate_risk_assessments_legacy, classify_by_threshold,
+)
+from risk_rules import RiskRules, RiskRulesError
+from test_cohort_risk import _records
+
+
+def _section(**spec):
+    return {'sections': {'check': {'state': {'level': 'Normal'}, 'output': {'level': 'level', 'factors': 'factors'},
+                                   **spec}}}
+
+
+def test_rules_match_the_legacy_assessments():
+    for record in _records(5000, seed=7):
+        assert calculate_risk_assessments(record) == calculate_risk_assessments_legacy(record), record
+    assert calculate_risk_assessments({}) == calculate_risk_assessments_legacy({})
+
+
+def test_results_are_not_shared_between_calls():
+    first = calculate_risk_assessments({})
+    first['anemiaProfile']['recommendations'].append('changed')
+    first['thrombosisRisk']['factors'].append('changed')
+    assert calculate_risk_assessments({}) == calculate_risk_assessments_legacy({})
+
+
+def test_inputs_cover_every_field_the_rules_read():
+    inputs = set(clinical_rules_fallback.RISK_RULES.inputs)
+    assert {'patientAge', 'patientGender', 'pregnant', 'diabetic', 'smoking', 'hemoglobin_g_dL',
+            'wbc_10e9_L', 'rbc_count', 'hba1c_percent', 'crp_mg_L'} <= inputs
+    assert 'monocytes_percent' not in inputs
+
+
+def test_transition_maps_and_first_groups():
+    rules = RiskRules(_section(rules=[
+        {'first': [
+            {'when': 'x > 10', 'set': {'level': 'High'}, 'factors': ['x is {x}']},
+            {'when': 'x > 5', 'set': {'level': 'Low'}},
+        ]},
+        {'when': 'y > 0', 'set': {'level': {'Low': 'Moderate', 'Normal': 'Low'}}, 'factors': ['y']},
+    ]))
+    evaluate = lambda patient: rules.evaluate(patient, classify_by_threshold)['check']
+    assert evaluate({'x': 11}) == {'level': 'High', 'factors': ['x is 11']}
+    assert evaluate({'x': 11, 'y': 1}) == {'level': 'High', 'factors': ['x is 11', 'y']}
+    assert evaluate({'x': 6, 'y': 1}) == {'level': 'Moderate', 'factors': ['y']}
+    assert evaluate({'y': 1}) == {'level': 'Low', 'factors': ['y']}
+
+    results = rules.evaluate_many({'x': [11, 11, 6, None], 'y': [0, 1, 1, 1]}, THRESHOLD_ENGINE)
+    assert [results.render(i)['check'] for i in range(4)] == [
+        evaluate({'x': 11}), evaluate({'x': 11, 'y': 1}), evaluate({'x': 6, 'y': 1}), evaluate({'y': 1})]
+
+
+@pytest.mark.parametrize('rule, message', [
+    ({'when': '__import__("os")', 'set': {'level': 'High'}}, 'Call is not allowed'),
+    ({'when': 'x.real > 1', 'set': {'level': 'High'}}, 'Attribute is not allowed'),
+    ({'when': 'x >', 'set': {'level': 'High'}}, 'invalid expression'),
+    ({'when': 'x > 1', 'set': {'grade': 'High'}}, "'grade' is not in the section state"),
+    ({'when': 'x > 1', 'factors': ['{x.real}']}, 'template fields must be plain names'),
+    ({'when': 'x > 1', 'factors': ['{x']}, 'invalid template'),
+    ({'set': {'level': 'High'}}, "a rule needs 'when'"),
+])
+def test_invalid_rules_are_rejected(rule, message):
+    with pytest.raises(RiskRulesError, match=message):
+        RiskRules(_section(rules=[rule]))
+
+
+def test_names_cannot_inject_code(monkeypatch):
+    monkeypatch.delenv('RISK_RULES_INJECTED', raising=False)
+    name = "check\n    import os; os.environ['RISK_RULES_INJECTED'] = '1'"
+    document = _section(rules=[{'when': 'x > 1', 'set': {'level': 'High'}}])
+    document['sections'] = {name: document['sections']['check']}
+    rules = RiskRules(document)
+    assert rules.evaluate({'x': 2}, classify_by_threshold) == {name: {'level': 'High', 'factors': []}}
+    assert 'RISK_RULES_INJECTED' not in os.environ
+
+
+@pytest.mark.parametrize('counts, message', [
+    ({'abnormal': {'parameters': ['hemoglobin g/dL'], 'status': [1]}}, "invalid name 'hemoglobin g/dL'"),
+    ({'abnormal': {'parameters': ['class'], 'status': [1]}}, "invalid name 'class'"),
+    ({'not valid': {'parameters': ['hemoglobin_g_dL'], 'status': [1]}}, "invalid name 'not valid'"),
+])
+def test_invalid_count_names_are_rejected(counts, message):
+    with pytest.raises(RiskRulesError, match=message):
+        RiskRules({**_section(), 'counts': counts})
+
+
+def test_reload_swaps_changed_rules_and_keeps_them_on_errors(tmp_path, monkeypatch):
+    path = tmp_path / 'risk_rules.json'
+    document = json.loads(clinical_rules_fallback.RISK_RULES_PATH.read_text(encoding='utf-8'))
+    path.write_text(json.dumps(document), encoding='utf-8')
+    monkeypatch.setattr(clinical_rules_fallback, 'RISK_RULES_PATH', path)
+    monkeypatch.setattr(clinical_rules_fallback, 'RISK_RULES', RiskRules.from_file(path))
+    original = clinical_rules_fallback.RISK_RULES
+
+    # Unchanged file: nothing to do
+    assert clinical_rules_fallback.reload_risk_rules() is None
+
+    def rewrite(text, bump):
+        path.write_text(text, encoding='utf-8')
+        mtime = original.mtime + bump
+        os.utime(path, (mtime, mtime))
+
+    # A broken file keeps the current rules
+    rewrite('{"sections": {', 10)
+    assert clinical_rules_fallback.reload_risk_rules() is None
+    assert clinical_rules_fallback.RISK_RULES is original
+
+    document['sections']['thrombosisRisk']['rules'][0]['first'][0]['when'] = 'platelet_count > 450'
+    rewrite(json.dumps(document), 20)
+    new = clinical_rules_fallback.reload_risk_rules()
+    assert new is clinical_rules_fallback.RISK_RULES
+    assert new.version != original.version
+    assert calculate_risk_assessments({'platelet_count': 420})['thrombosisRisk']['level'] == 'Normal'
+    assert original.evaluate({'platelet_count': 420}, classify_by_threshold)['thrombosisRisk']['level'] == 'Moderate'
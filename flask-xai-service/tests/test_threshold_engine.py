@@ -0,0 +1,156 @@
+"""
+Unit tests for threshold_engine.py (equivalence with the original classification chain)
+Run: pytest tests/test_threshold_engine.py
+"""
+import math
+import numpy as np
+import pytest
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from threshold_engine import ThresholdEngine, compile_table
+from clinical_rules_fallback import THRESHOLDS, THRESHOLD_ENGINE, classify_by_threshold, classify_by_threshold_legacy, classify_many
+
+# Every parameter the hard-coded chain knew about
+LEGACY_PARAMETERS = (
+    'hemoglobin_g_dL', 'rbc_count', 'wbc_10e9_L', 'platelet_count', 'hematocrit_percent', 'mcv_fL',
+    'mch_pg', 'mchc_g_dL', 'rdw_percent', 'neutrophils_percent', 'lymphocytes_percent',
+    'monocytes_percent', 'eosinophils_percent', 'basophils_percent', 'random_blood_sugar_mg_dL',
+    'hba1c_percent', 'esr_mm_hr', 'crp_mg_L', 'serum_creatinine_mg_dL', 'serum_iron_mcg_dL',
+    'tibc_mcg_dL', 'transferrin_saturation_percent', 'ferritin_ng_mL', 'vitamin_b12_pg_mL',
+    'vitamin_d_ng_mL', 'tsh_mIU_L', 'cortisol_pm_mcg_dL',
+)
+
+
+def _numbers(spec, out):
+    for value in (spec.values() if isinstance(spec, dict) else spec):
+        if isinstance(value, (dict, list)):
+            _numbers(value, out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out.add(value)
+    return out
+
+
+def _probe_values(param):
+    values = set(np.round(np.linspace(0, 1100, 4401), 3).tolist()) | set(np.round(np.linspace(0, 12, 1201), 3).tolist())
+    for bound in _numbers(THRESHOLDS[param], set()):
+        values |= {bound, float(bound), math.nextafter(bound, -math.inf), math.nextafter(bound, math.inf),
+                   bound - 0.01, bound + 0.01, int(bound)}
+    return sorted(v for v in values if v >= 0)
+
+
+@pytest.mark.parametrize("param", LEGACY_PARAMETERS)
+def test_engine_matches_the_legacy_chain(param):
+    assert param in THRESHOLDS
+    for gender in ('Male', 'Female', 'Other', None):
+        for value in _probe_values(param) + [float('nan')]:
+            assert classify_by_threshold(value, param, gender) == classify_by_threshold_legacy(value, param, gender), \
+                (param, gender, value)
+
+
+def test_unknown_parameters_are_normal():
+    assert classify_by_threshold(123, 'no_such_parameter', 'Male') == (0, 'Normal')
+
+
+def test_custom_bands_and_inclusive_bounds():
+    table = compile_table({"bands": [
+        {"below": 4.0, "status": 1, "label": "Low"},
+        {"upTo": 5.7, "status": 0, "label": "Normal"},
+        {"status": 2, "label": "High"},
+    ]})
+    assert [table.classify(v) for v in (3.99, 4.0, 5.7, 5.7000001)] == [
+        (1, "Low"), (0, "Normal"), (0, "Normal"), (2, "High")]
+    assert table.classify(float('nan')) == (0, "Normal")
+
+
+def test_thresholds_are_validated():
+    with pytest.raises(ValueError):
+        compile_table({"bands": [{"below": 5, "status": 1, "label": "Low"}, {"below": 4, "status": 0, "label": "Normal"},
+                                 {"status": 2, "label": "High"}]})
+    with pytest.raises(ValueError):
+        compile_table({"bands": [{"below": 5, "status": 1, "label": "Low"}]})
+    engine = ThresholdEngine({"x": {"male": {"low": 10}, "female": {"low": 20}}})
+    assert engine.classify(15, "x", "Male") == (0, "Normal")
+    assert engine.classify(15, "x", "Female") == (1, "Low")
+
+
+def test_classify_many_matches_classify():
+    rng = np.random.default_rng(0)
+    params = list(THRESHOLDS) + ['no_such_parameter']
+    names = rng.choice(params, 5000)
+    genders = rng.choice(['Male', 'Female', 'Other'], 5000)
+    values = rng.uniform(0, 600, 5000)
+    values[::97] = np.nan
+    expected = [classify_by_threshold(v, p, g) for v, p, g in zip(values, names, genders)]
+
+    status, labels = classify_many(values, names, genders)
+    assert list(zip(status.tolist(), labels.tolist())) == expected
+
+    # Pre-coded parameters and genders give the same answer
+    codes = THRESHOLD_ENGINE.parameter_codes(names.tolist())
+    status, label_ids = THRESHOLD_ENGINE.classify_many(values, codes, THRESHOLD_ENGINE.gender_codes(genders))
+    assert [(s, THRESHOLD_ENGINE.labels[i]) for s, i in zip(status.tolist(), label_ids.tolist())] == expected
+
+
+def test_classify_many_single_parameter():
+    values = np.array([5.0, 13.5, 19.0, np.nan])
+    status, labels = classify_many(values, 'hemoglobin_g_dL', 'Male')
+    assert list(zip(status.tolist(), labels.tolist())) == [
+        classify_by_threshold(v, 'hemoglobin_g_dL', 'Male') for v in values]
+    status, labels = classify_many(values, 'no_such_parameter')
+    assert status.tolist() == [0] * 4 and set(labels) == {'Normal'}
+    assert classify_many([], 'hemoglobin_g_dL', [])[0].size == 0
+
+
+def test_demographic_adjustments_shift_the_bounds():
+    # Female hemoglobin: low 12.0, pregnant_adjustment -0.5, age_65_plus_adjustment -0.3
+    assert classify_by_threshold(11.6, 'hemoglobin_g_dL', 'Female') == (1, 'Low')
+    assert classify_by_threshold(11.6, 'hemoglobin_g_dL', 'Female', 30, pregnant=True) == (0, 'Normal')
+    assert classify_by_threshold(11.3, 'hemoglobin_g_dL', 'Female', 30, pregnant=True) == (1, 'Low')
+    assert classify_by_threshold(11.3, 'hemoglobin_g_dL', 'Female', 70, pregnant=True) == (0, 'Normal')
+    assert classify_by_threshold(13.3, 'hemoglobin_g_dL', 'Male', 64) == (1, 'Low')
+    assert classify_by_threshold(13.3, 'hemoglobin_g_dL', 'Male', 65) == (0, 'Normal')
+    # Pregnancy only adjusts female tables
+    assert classify_by_threshold(130, 'platelet_count', 'Female', pregnant=True) == (0, 'Normal')
+    assert classify_by_threshold(130, 'platelet_count', 'Male', pregnant=True) == (1, 'Low')
+    # WBC high 11.0, diabetic_shift 0.5
+    assert classify_by_threshold(11.3, 'wbc_10e9_L', 'Male', diabetic=True) == (0, 'Normal')
+    assert classify_by_threshold(11.3, 'wbc_10e9_L', 'Male', diabetic=False) == (2, 'High')
+    # Unparseable ages fall in the youngest band
+    assert classify_by_threshold(13.3, 'hemoglobin_g_dL', 'Male', 'unknown') == (1, 'Low')
+
+
+def test_adjusted_bands_and_buckets():
+    engine = ThresholdEngine({"x": {
+        "bands": [{"below": 10, "status": 1, "label": "Low"}, {"status": 0, "label": "Normal"}],
+        "age_40_plus_adjustment": 1, "age_80_plus_adjustment": 2, "diabetic_shift": -5,
+    }})
+    assert engine.age_cuts == (40, 80)
+    assert [engine.classify(10.5, "x", age=a)[0] for a in (39, 40, 79, 80)] == [0, 1, 1, 1]
+    assert [engine.classify(12.5, "x", age=a)[0] for a in (39, 40, 79, 80)] == [0, 0, 0, 1]
+    assert engine.classify(8.5, "x", age=90, diabetic=True) == (0, "Normal")
+    assert engine.classify(7.5, "x", age=90, diabetic=True) == (1, "Low")
+    # Buckets without any adjustment share one compiled table
+    assert len({id(t) for t in ThresholdEngine({"y": {"low": 1}}).bucket_tables["y"]}) == 2
+
+
+def test_classify_many_matches_classify_with_demographics():
+    rng = np.random.default_rng(1)
+    n = 5000
+    names = rng.choice(['hemoglobin_g_dL', 'platelet_count', 'wbc_10e9_L', 'rbc_count'], n)
+    genders = rng.choice(['Male', 'Female'], n)
+    ages = rng.uniform(18, 95, n)
+    ages[::53] = np.nan
+    pregnant = rng.random(n) < 0.3
+    diabetic = rng.random(n) < 0.3
+    values = np.concatenate([rng.uniform(0, 20, n // 2), rng.uniform(100, 500, n - n // 2)])
+    expected = [classify_by_threshold(*row) for row in zip(values, names, genders, ages, pregnant, diabetic)]
+
+    status, labels = classify_many(values, names, genders, ages, pregnant, diabetic)
+    assert list(zip(status.tolist(), labels.tolist())) == expected
+    status, labels = classify_many(values[:10], 'hemoglobin_g_dL', 'Female', 70, True, False)
+    assert list(zip(status.tolist(), labels.tolist())) == [
+        classify_by_threshold(v, 'hemoglobin_g_dL', 'Female', 70, True) for v in values[:10]]
@@ -0,0 +1,110 @@
+"""
+Unit tests for tiered_cache.py
+Run: pytest tests/test_tiered_cache.py
+"""
+import threading
+
+import sys
+from pathlib import Path
+# Add parent directory to sys.path for import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tiered_cache import TwoTierCache
+
+
+class FakeL2:
+    def __init__(self):
+        self.docs = {}
+        self.gets = 0
+        self.batches = []
+        self.meta = {}
+
+    def get(self, key):
+        self.gets += 1
+        return self.docs.get(key)
+
+    def get_many(self, keys):
+        self.gets += 1
+        return {k: self.docs[k] for k in keys if k in self.docs}
+
+    def bulk_set(self, items):
+        self.batches.append(len(items))
+        for key, value, meta in items:
+            self.docs[key] = value
+            self.meta[key] = meta
+
+
+def test_reads_fall_through_and_misses_are_cached_briefly():
+    l2 = FakeL2()
+    l2.docs["a"] = {"status": "Low"}
+    cache = TwoTierCache(l2.get, l2.bulk_set)
+    assert cache.get("a") == {"status": "Low"}
+    assert cache.get("a") == {"status": "Low"}
+    assert cache.get("missing") is None
+    assert cache.get("missing") is None
+    assert l2.gets == 2
+    stats = cache.stats()
+    assert (stats["l1Hits"], stats["l2Hits"], stats["l2Misses"], stats["negativeHits"]) == (1, 1, 1, 1)
+
+
+def test_writes_are_flushed_behind_in_batches():
+    l2 = FakeL2()
+    cache = TwoTierCache(l2.get, l2.bulk_set, batch_size=50)
+    value = {"status": "High", "riskAssessments": {}}
+    cache.set("k0", value, meta={"modelVersion": "abc"})
+    value.pop("riskAssessments")  # later mutation must not leak into either tier
+    for i in range(1, 10):
+        cache.set(f"k{i}", {"i": i})
+    assert cache.get("k0") == {"status": "High", "riskAssessments": {}}
+    cache.flush()
+    assert len(l2.docs) == 10 and sum(l2.batches) == 10
+    assert l2.docs["k0"] == {"status": "High", "riskAssessments": {}}
+    assert l2.meta["k0"] == {"modelVersion": "abc"} and l2.meta["k1"] is None
+    assert l2.gets == 0
+
+
+def test_full_queue_drops_writes_instead_of_blocking():
+    release = threading.Event()
+    l2 = FakeL2()
+
+    def slow_bulk_set(items):
+        release.wait(5)
+        l2.bulk_set(items)
+
+    cache = TwoTierCache(l2.get, slow_bulk_set, queue_size=2, batch_size=1)
+    results = [cache.set(f"k{i}", {"i": i}) for i in range(6)]
+    assert results.count(False) >= 3
+    assert cache.stats()["writesDropped"] == results.count(False)
+    # Dropped writes are still served from L1
+    assert cache.get("k5") == {"i": 5}
+    release.set()
+    cache.flush()
+
+
+def test_get_many_uses_one_l2_round_trip():
+    l2 = FakeL2()
+    l2.docs.update({"a": {"n": 1}, "b": {"n": 2}})
+    cache = TwoTierCache(l2.get, l2.bulk_set, l2_get_many=l2.get_many)
+    cache.set("c", {"n": 3})
+    assert cache.get_many(["a", "b", "c", "d", "a"]) == {"a": {"n": 1}, "b": {"n": 2}, "c": {"n": 3}}
+    assert l2.gets == 1
+    # Everything, including the miss, is now answered in-process
+    assert cache.get_many(["a", "b", "c", "d"]) == {"a": {"n": 1}, "b": {"n": 2}, "c": {"n": 3}}
+    assert l2.gets == 1
+    cache.flush()
+
+
+def test_lookups_are_counted_per_label():
+    l2 = FakeL2()
+    l2.docs["a"] = {"status": "Low"}
+    cache = TwoTierCache(l2.get, l2.bulk_set, l2_get_many=l2.get_many, max_labels=2)
+    cache.get("a", label="hb")
+    cache.get("b", label="hb")
+    cache.get_many(["a", "c"], labels={"a": "hb", "c": "wbc"})
+    cache.get("d", label="plt")  # over max_labels: not tracked
+    assert cache.label_stats() == [
+        {"label": "wbc", "lookups": 1, "hits": 0, "misses": 1, "missRate": 1.0},
+        {"label": "hb", "lookups": 3, "hits": 2, "misses": 1, "missRate": 0.3333},
+    ]
+    assert cache.label_stats(top=1)[0]["label"] == "wbc"
+    assert cache.stats()["l2HitRatio"] == 0.25
@@ -0,0 +1,352 @@
+"""
+Table-driven clinical threshold engine
+Compiles data/clinical_thresholds.json once into sorted boundary arrays per parameter
+and gender, so classifying a value is one dict lookup plus a bisect.
+
+A parameter is described either by the standard keys (checked in this order)
+    value <= critical_low -> (3, 'Critical Low')
+    value <  low          -> (1, 'Low')
+    value >  critical_high -> (3, 'Critical High')
+    value >  high         -> (2, 'High')
+    otherwise             -> (0, 'Normal')
+or by explicit ascending "bands" for custom labels, each {"below": x} (value < x),
+{"upTo": x} (value <= x) or unbounded (last band), with "status" and "label".
+Either form may be nested under "male" / "female"; any gender other than 'Male'
+uses the female table.
+
+Demographic adjustments shift every boundary of a parameter's table by a fixed amount:
+    pregnant_adjustment      pregnant patients (female tables only)
+    age_<N>_plus_adjustment  patients aged N or older
+    diabetic_shift           diabetic patients
+They add up, and are applied at load time to one table per (gender, age band,
+pregnant, diabetic) bucket, so classification costs the same with or without them.
+
+classify_many() classifies whole arrays with np.searchsorted over the same tables.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Tuple
+import json
+import math
+import re
+
+import numpy as np
+
+NORMAL = (0, 'Normal')
+# Gender codes used by classify_many
+MALE, FEMALE = 0, 1
+
+PREGNANT_ADJUSTMENT = 'pregnant_adjustment'
+DIABETIC_SHIFT = 'diabetic_shift'
+AGE_ADJUSTMENT = re.compile(r'^age_(\d+)_plus_adjustment$')
+_BOUNDS = ('critical_low', 'low', 'high', 'critical_high')
+
+
+@dataclass(frozen=True)
+class ThresholdTable:
+    """Sorted cut points and the (status_code, label) of each of the len(cuts) + 1 segments."""
+    cuts: Tuple[float, ...]
+    results: Tuple[Tuple[int, str], ...]
+    # Returned for NaN, which compares false against every boundary
+    default: Tuple[int, str] = NORMAL
+
+    def classify(self, value):
+        if value != value:
+            return self.default
+        return self.results[bisect_right(self.cuts, value)]
+
+
+def _cut(bound, value):
+    # Segments are [cut_i, cut_i+1) under bisect_right: a "<=" bound moves the cut just above it
+    return float(value) if bound == 'below' else math.nextafter(float(value), math.inf)
+
+
+def _standard_bands(spec):
+    bands = []
+    if 'critical_low' in spec:
+        bands.append({'upTo': spec['critical_low'], 'status': 3, 'label': 'Critical Low'})
+    if 'low' in spec:
+        bands.append({'below': spec['low'], 'status': 1, 'label': 'Low'})
+    if 'high' in spec:
+        bands.append({'upTo': spec['high'], 'status': 0, 'label': 'Normal'})
+        if 'critical_high' in spec:
+            bands.append({'upTo': spec['critical_high'], 'status': 2, 'label': 'High'})
+            bands.append({'status': 3, 'label': 'Critical High'})
+        else:
+            bands.append({'status': 2, 'label': 'High'})
+    elif 'critical_high' in spec:
+        bands.append({'upTo': spec['critical_high'], 'status': 0, 'label': 'Normal'})
+        bands.append({'status': 3, 'label': 'Critical High'})
+    else:
+        bands.append({'status': 0, 'label': 'Normal'})
+    return bands
+
+
+def shift_spec(spec, shift):
+    """Copy of a threshold spec with every boundary moved by shift."""
+    if not shift:
+        return spec
+    if 'bands' in spec:
+        bands = [
+            {**band, **{bound: round(band[bound] + shift, 6) for bound in ('below', 'upTo') if bound in band}}
+            for band in spec['bands']
+        ]
+        return {**spec, 'bands': bands}
+    return {**spec, **{key: round(spec[key] + shift, 6) for key in _BOUNDS if key in spec}}
+
+
+def compile_table(spec, name='parameter'):
+    """Compile one (gender-specific) threshold spec into a ThresholdTable."""
+    bands = spec['bands'] if 'bands' in spec else _standard_bands(spec)
+    cuts, results = [], []
+    for i, band in enumerate(bands):
+        results.append((int(band['status']), band['label']))
+        bound = 'below' if 'below' in band else 'upTo' if 'upTo' in band else None
+        if bound is None:
+            if i != len(bands) - 1:
+                raise ValueError(f"{name}: only the last band may be unbounded")
+            break
+        cut = _cut(bound, band[bound])
+        if cuts and cut <= cuts[-1]:
+            raise ValueError(f"{name}: band bounds must be ascending")
+        cuts.append(cut)
+    else:
+        raise ValueError(f"{name}: the last band must be unbounded")
+    default = next((result for result in results if result[0] == 0), NORMAL)
+    return ThresholdTable(tuple(cuts), tuple(results), default)
+
+
+class ThresholdEngine:
+    """
+    Compiled thresholds for every parameter in a clinical_thresholds.json document.
+
+    Every parameter has one table per demographic bucket (see bucket()); parameters
+    without adjustments share the same two gender tables across all buckets.
+
+    For the array API, parameters are coded by their position in `parameters` (-1 for
+    unknown) and genders as MALE / FEMALE; labels come back as indices into `labels`.
+    """
+
+    def __init__(self, thresholds):
+        self.thresholds = thresholds
+        # Lower edges of the age bands above the first, from every age_<N>_plus_adjustment
+        self.age_cuts = tuple(sorted({
+            int(match.group(1))
+            for config in thresholds.values() for key in _adjustment_keys(config)
+            if (match := AGE_ADJUSTMENT.match(key))
+        }))
+        self.bucket_count = 2 * (len(self.age_cuts) + 1) * 2 * 2
+        # parameter -> (male table, female table), unadjusted
+        self.tables = {}
+        # parameter -> table per bucket
+        self.bucket_tables = {}
+        for name, config in thresholds.items():
+            self.bucket_tables[name] = self._compile_buckets(name, config)
+            self.tables[name] = (self.bucket_tables[name][self.bucket('Male')],
+                                 self.bucket_tables[name][self.bucket('Female')])
+        self._compile_arrays()
+
+    def _compile_buckets(self, name, config):
+        if 'male' in config or 'female' in config:
+            specs = (config.get('male', config.get('female')), config.get('female', config.get('male')))
+            names = (f"{name}.male", f"{name}.female")
+        else:
+            specs, names = (config, config), (name, name)
+        age_bands = (0,) + self.age_cuts
+        compiled = {}
+        tables = []
+        for gender in (MALE, FEMALE):
+            spec = specs[gender]
+
+            def adjustment(key):
+                return spec.get(key, config.get(key, 0))
+
+            for age_band in age_bands:
+                age_shift = sum(adjustment(f"age_{cut}_plus_adjustment") for cut in self.age_cuts if cut <= age_band)
+                for pregnant in (False, True):
+                    for diabetic in (False, True):
+                        shift = age_shift
+                        if pregnant and gender == FEMALE:
+                            shift += adjustment(PREGNANT_ADJUSTMENT)
+                        if diabetic:
+                            shift += adjustment(DIABETIC_SHIFT)
+                        shift = round(shift, 6)
+                        key = (gender, shift)
+                        if key not in compiled:
+                            compiled[key] = compile_table(shift_spec(spec, shift), names[gender])
+                        tables.append(compiled[key])
+        return tuple(tables)
+
+    def _compile_arrays(self):
+        self.parameters = tuple(self.tables)
+        self.parameter_index = {name: i for i, name in enumerate(self.parameters)}
+        labels = {NORMAL[1]: 0}
+        for tables in self.bucket_tables.values():
+            for table in tables:
+                for _, label in table.results:
+                    labels.setdefault(label, len(labels))
+        self.labels = tuple(labels)
+        # Table id = bucket_count * parameter code + bucket
+        self._cuts, self._codes, self._label_ids, self._defaults = [], [], [], []
+        arrays = {}
+        for name in self.parameters:
+            for table in self.bucket_tables[name]:
+                if id(table) not in arrays:
+                    arrays[id(table)] = (
+                        np.array(table.cuts, dtype=np.float64),
+                        np.array([code for code, _ in table.results], dtype=np.int8),
+                        np.array([labels[label] for _, label in table.results], dtype=np.int16),
+                        (table.default[0], labels[table.default[1]]),
+                    )
+                cuts, codes, label_ids, default = arrays[id(table)]
+                self._cuts.append(cuts)
+                self._codes.append(codes)
+                self._label_ids.append(label_ids)
+                self._defaults.append(default)
+        self._table_id_dtype = np.int16 if len(self._cuts) < np.iinfo(np.int16).max else np.int32
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _age_band(self, age):
+        if not self.age_cuts or age is None:
+            return 0
+        if not isinstance(age, (int, float)):
+            try:
+                age = float(age)
+            except (TypeError, ValueError):
+                return 0
+        return bisect_right(self.age_cuts, age) if age == age else 0
+
+    def bucket(self, gender=None, age=None, pregnant=False, diabetic=False):
+        """Index of the demographic bucket; unknown or missing ages fall in the first age band."""
+        band = self._age_band(age) if age is not None else 0
+        if gender == 'Male':
+            return (band * 2 + bool(pregnant)) * 2 + bool(diabetic)
+        return ((len(self.age_cuts) + 1 + band) * 2 + bool(pregnant)) * 2 + bool(diabetic)
+
+    def table(self, param_name, gender=None, age=None, pregnant=False, diabetic=False):
+        tables = self.bucket_tables.get(param_name)
+        if tables is None:
+            return None
+        return tables[self.bucket(gender, age, pregnant, diabetic)]
+
+    def classify(self, value, param_name, gender=None, age=None, pregnant=False, diabetic=False):
+        """(status_code, status_label) for value; unknown parameters are Normal."""
+        if age is None and not pregnant and not diabetic:
+            tables = self.tables.get(param_name)
+            if tables is None:
+                return NORMAL
+            table = tables[0] if gender == 'Male' else tables[1]
+        else:
+            tables = self.bucket_tables.get(param_name)
+            if tables is None:
+                return NORMAL
+            # bucket(), inlined
+            band = self._age_band(age) if age is not None else 0
+            if gender != 'Male':
+                band += len(self.age_cuts) + 1
+            table = tables[band * 4 + (2 if pregnant else 0) + (1 if diabetic else 0)]
+        if value != value:
+            return table.default
+        return table.results[bisect_right(table.cuts, value)]
+
+    def parameter_codes(self, names):
+        """Array of parameter codes for names (-1 for parameters without thresholds)."""
+        index = self.parameter_index
+        return np.fromiter((index.get(name, -1) for name in names), dtype=np.int32, count=len(names))
+
+    @staticmethod
+    def gender_codes(genders):
+        """Array of gender codes: MALE for 'Male', FEMALE for anything else (as classify does)."""
+        return np.where(np.asarray(genders, dtype=object) == 'Male', MALE, FEMALE).astype(np.int8)
+
+    def buckets(self, genders=None, ages=None, pregnant=None, diabetic=None):
+        """
+        Vectorized bucket(). Each argument is None, a scalar or an array (genders as codes
+        or strings); returns a plain int when every argument is a scalar.
+        """
+        scalars = [arg is None or np.ndim(arg) == 0 for arg in (genders, ages, pregnant, diabetic)]
+        if all(scalars):
+            return self.bucket(genders, ages, bool(pregnant), bool(diabetic))
+
+        if scalars[0]:
+            gender = MALE if genders == 'Male' else FEMALE
+        else:
+            genders = np.asarray(genders)
+            gender = genders.astype(np.int32) if genders.dtype.kind in 'iub' else self.gender_codes(genders).astype(np.int32)
+
+        if scalars[1]:
+            age_band = self._age_band(ages)
+        else:
+            ages = np.asarray(ages, dtype=np.float64)
+            age_band = np.where(np.isnan(ages), 0, np.searchsorted(np.asarray(self.age_cuts, dtype=np.float64), ages, side='right'))
+
+        def flag(values):
+            return np.asarray(values).astype(bool).astype(np.int32) if values is not None else 0
+
+        return ((gender * (len(self.age_cuts) + 1) + age_band) * 2 + flag(pregnant)) * 2 + flag(diabetic)
+
+    def _classify_table(self, table_id, values, status, label_ids, idx=None):
+        segment = np.searchsorted(self._cuts[table_id], values, side='right')
+        codes, labels = self._codes[table_id][segment], self._label_ids[table_id][segment]
+        nan = np.isnan(values)
+        if nan.any():
+            codes[nan], labels[nan] = self._defaults[table_id]
+        if idx is None:
+            status[:], label_ids[:] = codes, labels
+        else:
+            status[idx], label_ids[idx] = codes, labels
+
+    def classify_many(self, values, parameters, genders=None, ages=None, pregnant=None, diabetic=None):
+        """
+        Vectorized classify().
+
+        values: array of numbers. parameters: one parameter name, or an array of
+        parameter codes (see parameter_codes) or names, one per value. genders: None
+        (female tables, like classify), one gender, or an array of gender codes or strings.
+        ages, pregnant, diabetic: None, one value, or an array, one per value.
+
+        Returns (status_codes int8, label_ids int16); labels[label_ids] gives the labels.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        n = values.size
+        status = np.zeros(n, dtype=np.int8)
+        label_ids = np.zeros(n, dtype=np.int16)
+        bucket = self.buckets(genders, ages, pregnant, diabetic)
+
+        if isinstance(parameters, str):
+            code = self.parameter_index.get(parameters, -1)
+            if code < 0:
+                return status, label_ids
+            if np.ndim(bucket) == 0:
+                self._classify_table(self.bucket_count * code + bucket, values, status, label_ids)
+                return status, label_ids
+            codes = np.full(n, code, dtype=np.int32)
+        else:
+            parameters = np.asarray(parameters)
+            codes = parameters.astype(np.int32) if parameters.dtype.kind in 'iu' else self.parameter_codes(parameters.tolist())
+
+        # Group rows by table (a radix sort on int16 ids) and run one searchsorted per table
+        table_ids = np.where(codes >= 0, self.bucket_count * codes + bucket, -1).astype(self._table_id_dtype)
+        order = np.argsort(table_ids, kind='stable')
+        sorted_ids = table_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if n else np.array([], dtype=np.intp)
+        ends = np.r_[starts[1:], n]
+        for start, end in zip(starts, ends):
+            table_id = sorted_ids[start]
+            if table_id < 0:
+                continue
+            idx = order[start:end]
+            self._classify_table(table_id, values[idx], status, label_ids, idx)
+        return status, label_ids
+
+
+def _adjustment_keys(config):
+    keys = set(config)
+    for gender in ('male', 'female'):
+        if isinstance(config.get(gender), dict):
+            keys |= set(config[gender])
+    return keys
@@ -0,0 +1,240 @@
+"""
+Two-tier cache for the XAI service
+In-process L1 (ResponseCache) in front of a persistent L2 (MongoDB), with
+write-behind persistence so L2 latency never reaches the request path.
+"""
+import json
+import logging
+import queue
+import threading
+
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# L1 marker for "known to be missing from L2"
+_NEGATIVE = b''
+
+
+class TwoTierCache:
+    """
+    JSON-document cache with an in-process L1 and a persistent L2.
+
+    Reads check L1 first and fall through to l2_get(key); L2 hits are promoted into L1
+    and L2 misses are remembered in L1 for negative_ttl seconds so repeated misses
+    don't round-trip to L2. Writes go to L1 immediately and onto a bounded queue that
+    a background thread drains, handing batches of (key, value, meta) to l2_bulk_set. When
+    the queue is full the L2 write is dropped and counted; requests never block on L2.
+
+    get_many() resolves a whole set of keys with one l2_get_many(keys) round-trip
+    (returning {key: value} for the keys found) for everything L1 can't answer.
+
+    Lookups may carry a label (e.g. the parameter); hits and misses are also counted
+    per label, for at most max_labels distinct labels.
+    """
+
+    def __init__(self, l2_get, l2_bulk_set, l1=None, negative_ttl=30,
+                 queue_size=1000, batch_size=100, flush_interval=0.5, l2_get_many=None, max_labels=256):
+        self.l1 = l1 if l1 is not None else ResponseCache()
+        self.l2_get = l2_get
+        self.l2_get_many = l2_get_many or (lambda keys: {k: v for k in keys if (v := l2_get(k)) is not None})
+        self.l2_bulk_set = l2_bulk_set
+        self.negative_ttl = negative_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_labels = max_labels
+        self._labels = {}  # label -> [hits, misses]
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.counters = {
+            'l1Hits': 0,
+            'l2Hits': 0,
+            'l2Misses': 0,
+            'negativeHits': 0,
+            'l2Errors': 0,
+            'writesQueued': 0,
+            'writesDropped': 0,
+            'writesFlushed': 0,
+            'writeBatches': 0,
+            'writeErrors': 0,
+        }
+
+    def _count(self, name, n=1):
+        with self._counter_lock:
+            self.counters[name] += n
+
+    def _count_label(self, label, hit):
+        if label is None:
+            return
+        with self._counter_lock:
+            counts = self._labels.get(label)
+            if counts is None:
+                if len(self._labels) >= self.max_labels:
+                    return
+                counts = self._labels[label] = [0, 0]
+            counts[0 if hit else 1] += 1
+
+    def get(self, key, label=None):
+        """Return a fresh copy of the cached document for key, or None."""
+        value = self._get(key)
+        self._count_label(label, value is not None)
+        return value
+
+    def _get(self, key):
+        body = self.l1.get(key)
+        if body == _NEGATIVE:
+            self._count('negativeHits')
+            return None
+        if body is not None:
+            self._count('l1Hits')
+            return json.loads(body)
+        try:
+            value = self.l2_get(key)
+        except Exception as e:
+            logger.warning(f"L2 cache lookup failed: {e}")
+            self._count('l2Errors')
+            return None
+        if value is None:
+            self._count('l2Misses')
+            self.l1.set(key, _NEGATIVE, ttl_seconds=self.negative_ttl)
+            return None
+        self._count('l2Hits')
+        self.l1.set(key, json.dumps(value).encode("utf-8"))
+        return value
+
+    def get_many(self, keys, labels=None):
+        """
+        Return {key: fresh copy} for every key found; at most one L2 round-trip.
+        labels optionally maps each key to its label.
+        """
+        keys = list(keys)
+        found = self._get_many(keys)
+        if labels:
+            for key in dict.fromkeys(keys):
+                self._count_label(labels.get(key), key in found)
+        return found
+
+    def _get_many(self, keys):
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            body = self.l1.get(key)
+            if body == _NEGATIVE:
+                self._count('negativeHits')
+            elif body is not None:
+                self._count('l1Hits')
+                found[key] = json.loads(body)
+            else:
+                missing.append(key)
+        if not missing:
+            return found
+        try:
+            values = self.l2_get_many(missing) or {}
+        except Exception as e:
+            logger.warning(f"L2 bulk cache lookup failed: {e}")
+            self._count('l2Errors')
+            return found
+        for key in missing:
+            value = values.get(key)
+            if value is None:
+                self._count('l2Misses')
+                self.l1.set(key, _NEGATIVE, ttl_seconds=self.negative_ttl)
+            else:
+                self._count('l2Hits')
+                self.l1.set(key, json.dumps(value).encode("utf-8"))
+                found[key] = value
+        return found
+
+    def set(self, key, value, meta=None):
+        """
+        Store value in L1 now and queue it for L2 with its metadata (e.g. version tags).
+        Returns False if the L2 write was dropped.
+        """
+        body = json.dumps(value).encode("utf-8")
+        self.l1.set(key, body)
+        self._ensure_writer()
+        try:
+            # Queue the serialized snapshot: callers may keep mutating value
+            self._queue.put_nowait((key, body, meta))
+        except queue.Full:
+            self._count('writesDropped')
+            return False
+        self._count('writesQueued')
+        return True
+
+    def delete(self, key):
+        self.l1.delete(key)
+
+    def clear_l1(self):
+        """Drop every in-process entry (e.g. after invalidating L2); returns the number dropped."""
+        return self.l1.clear()
+
+    def _ensure_writer(self):
+        # Started on first write, i.e. after a prefork server has forked
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name='cache-write-behind', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch):
+        # Last write per key wins; one bulk round-trip per batch
+        latest = {key: (body, meta) for key, body, meta in batch}
+        try:
+            self.l2_bulk_set([(key, json.loads(body), meta) for key, (body, meta) in latest.items()])
+            self._count('writesFlushed', len(latest))
+            self._count('writeBatches')
+        except Exception as e:
+            logger.warning(f"Write-behind flush of {len(latest)} cache entries failed: {e}")
+            self._count('writeErrors')
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued write has been handed to L2."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def stats(self):
+        with self._counter_lock:
+            counters = dict(self.counters)
+        l1 = self.l1.stats()
+        lookups = counters['l1Hits'] + counters['l2Hits'] + counters['l2Misses'] + counters['negativeHits']
+        l2_lookups = counters['l2Hits'] + counters['l2Misses']
+        return {
+            'l1': l1,
+            **counters,
+            'hitRatio': round((counters['l1Hits'] + counters['l2Hits']) / lookups, 4) if lookups else None,
+            'l2HitRatio': round(counters['l2Hits'] / l2_lookups, 4) if l2_lookups else None,
+            'queueDepth': self._queue.qsize(),
+        }
+
+    def label_stats(self, top=None):
+        """Per-label lookups, sorted by miss rate (then by lookups), highest first."""
+        with self._counter_lock:
+            labels = {label: tuple(counts) for label, counts in self._labels.items()}
+        rows = [
+            {'label': label, 'lookups': hits + misses, 'hits': hits, 'misses': misses,
+             'missRate': round(misses / (hits + misses), 4)}
+            for label, (hits, misses) in labels.items()
+        ]
+        rows.sort(key=lambda row: (row['missRate'], row['lookups']), reverse=True)
+        return rows[:top] if top else rows